@@ -68,6 +68,16 @@ class Usr:  # {{{
     PG_DATABASE = "ars_vincere"
     PG_HOST = "127.0.0.1"
 
+    # PostgreSQL connection pool size (one pool per event loop)
+    PG_POOL_MIN_SIZE = 1
+    PG_POOL_MAX_SIZE = 10
+
+    # Storage of market data bars:
+    # "postgres" - tables in schema 'data'
+    # "arrow" - local Arrow IPC files, read with memory map, see BAR_DIR
+    BAR_STORE = "postgres"
+    BAR_DIR = os.path.join(DATA, "bars")
+
 
 # }}}
 class Auto:  # {{{
@@ -79,6 +89,10 @@ class Auto:  # {{{
 
     # Run convert tasks after update market data
     CONVERT_MARKET_DATA: bool = True
+    CONVERT_WORKERS: int = os.cpu_count() or 1  # processes
+
+    # Check filters over big trade lists in a pool of processes
+    FILTER_WORKERS: int = os.cpu_count() or 1  # processes
 
     # Update user analytics
     UPDATE_ANALYTIC: bool = True
@@ -123,6 +137,12 @@ class Cfg:  # {{{
         VERY_BIG = 16
 
     # }}}
+    class Tester:  # {{{
+        # NOTE: если True - в тестере грузятся только 1М бары,
+        # старшие таймфреймы собираются из них на лету (BarStream2)
+        RESAMPLE_FROM_1M = False
+
+    # }}}
 
 
 # }}}
@@ -16,7 +16,7 @@ import pandas as pd
 from avin.core.chart import Chart
 from avin.core.event import Event
 from avin.core.timeframe import TimeFrame
-from avin.data import Data, DataType, Exchange, Instrument
+from avin.data import BarArray, DataType, Exchange, Instrument
 from avin.exceptions import AssetError
 from avin.keeper import Keeper
 from avin.utils import AsyncSignal, DateTime, logger, now
@@ -119,11 +119,33 @@ class Asset(Instrument, ABC):  # {{{
         else:
             raise TypeError(f"Invalid timeframe='{timeframe}'")
 
-        # request bars records
-        records = await Data.request(self, data_type, begin, end)
+        # request bars by batches, DataFrame is built from columns,
+        # without python object for every bar
+        frames = list()
+        async for bars in Keeper.stream(
+            BarArray,
+            instrument=self,
+            data_type=data_type,
+            begin=begin,
+            end=end,
+        ):
+            frame = pd.DataFrame(
+                {
+                    "dt": pd.to_datetime(bars.dt, utc=True),
+                    "open": bars.open,
+                    "high": bars.high,
+                    "low": bars.low,
+                    "close": bars.close,
+                    "volume": bars.vol,
+                }
+            )
+            frames.append(frame)
 
         # create & return DataFrame
-        df = pd.DataFrame([dict(r) for r in records])
+        if not frames:
+            return pd.DataFrame()
+
+        df = pd.concat(frames, ignore_index=True)
         return df
 
     # }}}
@@ -419,6 +441,18 @@ class AssetList:  # {{{
 
         assert False, "Bad arguments"
 
+    # }}}
+    async def selectFilter(self, f) -> AssetList:  # {{{
+        """Return new list of assets, that pass filter 'f'
+
+        Filter sees cached charts of assets, see Asset.cacheChart.
+        """
+        logger.debug(f"{self.__class__.__name__}.selectFilter()")
+
+        results = await f.acheckMany(self.__assets)
+        selected = [a for a, ok in zip(self.__assets, results) if ok]
+        return AssetList(f"{self.__name} {f.full_name}", selected)
+
     # }}}
 
     @classmethod  # fromRecord  # {{{
@@ -8,19 +8,33 @@
 
 from __future__ import annotations
 
-import bisect
-from datetime import UTC, datetime
+import asyncio
+from collections import OrderedDict
+from datetime import UTC, datetime, timedelta
 from typing import Optional
+from weakref import WeakKeyDictionary
+
+import numpy as np
 
 from avin.const import ONE_DAY
 from avin.core.bar import Bar
 from avin.core.timeframe import TimeFrame
-from avin.data import Instrument
+from avin.data import BarArray, Instrument
+from avin.data.bar import _BarsData
 from avin.keeper import Keeper
-from avin.utils import Signal, binary_search, find_left, logger
+from avin.utils import Signal, logger
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
 
 
 class Chart:
+    """График - исторические бары + реал тайм бар
+
+    Бары хранятся в колонках numpy (dt, open, high, low, close, vol),
+    объекты Bar создаются только по запросу: chart[i], getBars()...
+    Поиск по времени - searchsorted, экстремумы - max/min по срезу.
+    """
+
     DEFAULT_BARS_COUNT = 5000
     MAX_BARS_COUNT = None  # used in tester
 
@@ -28,7 +42,7 @@ class Chart:
         self,
         instrument: Instrument,
         timeframe: TimeFrame,
-        bars: list[Bar],
+        bars: list[Bar] | BarArray,
     ):
         logger.debug(f"{self.__class__.__name__}.__init__()")
 
@@ -39,11 +53,17 @@ class Chart:
         self.__instrument = instrument
         self.__timeframe = timeframe
 
-        for i in bars:
-            i.setChart(self)
-        self.__bars = bars
-
-        self.__head = len(self.__bars)  # index of HEAD bar
+        if not isinstance(bars, BarArray):
+            bars = BarArray.fromBars(bars)
+        self.__dt = bars.dt
+        self.__open = bars.open
+        self.__high = bars.high
+        self.__low = bars.low
+        self.__close = bars.close
+        self.__vol = bars.vol
+        self.__count = len(bars)  # arrays may have reserve capacity
+
+        self.__head = self.__count  # index of HEAD bar
         self.__now: Optional[Bar] = None  # realtime bar
 
         # signals
@@ -76,19 +96,19 @@ class Chart:
         index = self.__head - index
         if index < 0:
             return None
-        if index >= len(self.__bars):
+        if index >= self.__count:
             return None
 
-        return self.__bars[index]
+        return self.__bar(index)
 
     # }}}
     def __iter__(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.__iter__()")
-        return iter(self.__bars)
+        return iter(self.__bars(0, self.__count))
 
     # }}}
     def __len__(self):  # {{{
-        return len(self.__bars)
+        return self.__count
 
     # }}}
 
@@ -105,7 +125,10 @@ class Chart:
     @property  # first# {{{
     def first(self):
         """Возвращает самый старый исторический бар в графике"""
-        return self.__bars[0]
+        if self.__count == 0:
+            raise IndexError("chart is empty")
+
+        return self.__bar(0)
 
     # }}}
     @property  # last# {{{
@@ -114,8 +137,8 @@ class Chart:
         Возвращает самый новый исторический бар (относительно head!!!)
         """
         index = self.__head - 1
-        if 0 < index < len(self.__bars):
-            return self.__bars[index]
+        if 0 < index < self.__count:
+            return self.__bar(index)
         else:
             return None
 
@@ -136,16 +159,16 @@ class Chart:
         logger.debug(f"{self.__class__.__name__}.addNewHistoricalBar()")
 
         new_bar.setChart(self)
-        self.__bars.append(new_bar)
+        self.__append(new_bar)
 
         if (
             Chart.MAX_BARS_COUNT is not None
-            and len(self.__bars) > Chart.MAX_BARS_COUNT
+            and self.__count > Chart.MAX_BARS_COUNT
         ):
             mid = Chart.MAX_BARS_COUNT // 2
-            self.__bars = self.__bars[mid:]
+            self.__dropFirst(mid)
 
-        self.__head = len(self.__bars)
+        self.__head = self.__count
         self.new_bar.emit(self, new_bar)
 
     # }}}
@@ -161,10 +184,12 @@ class Chart:
     def getIndex(self, bar: Bar) -> int:  # {{{
         logger.debug(f"{self.__class__.__name__}.getIndex()")
 
-        bars = self.getBars()  # not ignored self.__head
-        index = binary_search(bars, bar.dt, lambda x: x.dt)
+        # not ignored self.__head
+        dt = self.__dt[: self.__head]
+        x = self.__toNumpy(bar.dt)
+        index = int(np.searchsorted(dt, x))
 
-        assert index is not None
+        assert index < len(dt) and dt[index] == x
         return index
 
     # }}}
@@ -183,21 +208,14 @@ class Chart:
         else:
             end_index = self.getIndex(end) + 1
 
-        return self.__bars[begin_index:end_index]
+        return self.__bars(begin_index, end_index)
 
     # }}}
     def getTodayBars(self) -> list[Bar]:  # {{{
         logger.debug(f"{self.__class__.__name__}.getTodayBars()")
 
-        if self.__now is None:
-            return list()
-
-        today = self.__now.dt.date()
-        i = self.__head
-        while i - 1 > 0 and self.__bars[i - 1].dt.date() == today:
-            i -= 1
-
-        return self.__bars[i : self.__head]
+        i, j = self.__todayRange()
+        return self.__bars(i, j)
 
     # }}}
     def getBarsOfYear(self, dt: datetime) -> list[Bar]:  # {{{
@@ -205,11 +223,8 @@ class Chart:
 
         logger.debug(f"{self.__class__.__name__}.getBarsOfYear()")
 
-        year = dt.year
-        i = bisect.bisect_left(self.__bars, year, key=lambda x: x.dt.year)
-        j = bisect.bisect_right(self.__bars, year, key=lambda x: x.dt.year)
-
-        return self.__bars[i:j]
+        i, j = self.__yearRange(dt)
+        return self.__bars(i, j)
 
     # }}}
     def getBarsOfMonth(self, dt: datetime) -> list[Bar]:  # {{{
@@ -220,12 +235,11 @@ class Chart:
         if self.__timeframe >= TimeFrame("M"):
             return []
 
-        year_bars = self.getBarsOfYear(dt)
-        month = dt.month
-        i = bisect.bisect_left(year_bars, month, key=lambda x: x.dt.month)
-        j = bisect.bisect_right(year_bars, month, key=lambda x: x.dt.month)
+        year = np.datetime64(f"{dt.year:04}", "M")
+        month = year + np.timedelta64(dt.month - 1, "M")
+        i, j = self.__range(month, month + np.timedelta64(1, "M"))
 
-        return year_bars[i:j]
+        return self.__bars(i, j)
 
     # }}}
     def getBarsOfWeek(self, dt: datetime) -> list[Bar]:  # {{{
@@ -236,16 +250,13 @@ class Chart:
         if self.__timeframe >= TimeFrame("W"):
             return []
 
-        year_bars = self.getBarsOfYear(dt)
-        week = dt.isocalendar()[1]
-        i = bisect.bisect_left(
-            year_bars, week, key=lambda x: x.dt.isocalendar()[1]
-        )
-        j = bisect.bisect_right(
-            year_bars, week, key=lambda x: x.dt.isocalendar()[1]
-        )
+        # week from monday, but only inside year of 'dt'
+        day = self.__toNumpy(dt).astype("datetime64[D]")
+        monday = day - np.timedelta64(dt.weekday(), "D")
+        i, j = self.__range(monday, monday + np.timedelta64(7, "D"))
+        year_i, year_j = self.__yearRange(dt)
 
-        return year_bars[i:j]
+        return self.__bars(max(i, year_i), min(j, year_j))
 
     # }}}
     def getBarsOfDay(self, dt: datetime) -> list[Bar]:  # {{{
@@ -256,11 +267,8 @@ class Chart:
         if self.__timeframe >= TimeFrame("D"):
             return []
 
-        day = dt.date()
-        i = bisect.bisect_left(self.__bars, day, key=lambda x: x.dt.date())
-        j = bisect.bisect_right(self.__bars, day, key=lambda x: x.dt.date())
-
-        return self.__bars[i:j]
+        i, j = self.__dayRange(dt)
+        return self.__bars(i, j)
 
     # }}}
     def getBarsOfHour(self, dt: datetime) -> list[Bar]:  # {{{
@@ -271,34 +279,25 @@ class Chart:
         if self.__timeframe >= TimeFrame("1H"):
             return []
 
-        bars_of_day = self.getBarsOfDay(dt)
-        hour = dt.hour
-        i = bisect.bisect_left(bars_of_day, hour, key=lambda x: x.dt.hour)
-        j = bisect.bisect_right(bars_of_day, hour, key=lambda x: x.dt.hour)
+        hour = self.__toNumpy(dt).astype("datetime64[h]")
+        i, j = self.__range(hour, hour + np.timedelta64(1, "h"))
 
-        return bars_of_day[i:j]
+        return self.__bars(i, j)
 
     # }}}
 
     def highestHigh(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.highestHigh()")
 
-        # using method getBars() instead of self.__bars
-        # because its return only [0, head] bars
-        bars = self.getBars()
-
-        bar = max(bars, key=lambda x: x.high)
-        return bar.high
+        # only [0, head] bars
+        return float(self.__high[: self.__head].max())
 
     # }}}
     def lowestLow(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.lowestLow()")
 
-        # using method getBars() instead of self.__bars
-        # because its return only [0, head] bars
-        bars = self.getBars()
-        bar = min(bars, key=lambda x: x.low)
-        return bar.low
+        # only [0, head] bars
+        return float(self.__low[: self.__head].min())
 
     # }}}
 
@@ -311,79 +310,71 @@ class Chart:
     def todayOpen(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.todayOpen()")
 
-        bars = self.getTodayBars()
-        if not bars:
+        i, j = self.__todayRange()
+        if i == j:
             return None
 
-        return bars[0].open
+        return float(self.__open[i])
 
     # }}}
     def todayHigh(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.todayHigh()")
 
-        bars = self.getTodayBars()
-        if not bars:
+        i, j = self.__todayRange()
+        if i == j:
             return None
 
-        bar = max(bars, key=lambda x: x.high)
-        return bar.high
+        return float(self.__high[i:j].max())
 
     # }}}
     def todayLow(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.todayLow()")
 
-        bars = self.getTodayBars()
-        if not bars:
+        i, j = self.__todayRange()
+        if i == j:
             return None
 
-        bar = min(bars, key=lambda x: x.low)
-        return bar.low
+        return float(self.__low[i:j].min())
 
     # }}}
     def yesterdayOpen(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.yesterdayOpen()")
 
-        yesterday = self.__now.dt - ONE_DAY
-        bars = self.getBarsOfDay(yesterday)
-        if not bars:
+        i, j = self.__yesterdayRange()
+        if i == j:
             return None
 
-        return bars[0].open
+        return float(self.__open[i])
 
     # }}}
     def yesterdayHigh(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.yesterdayHigh()")
 
-        yesterday = self.__now.dt - ONE_DAY
-        bars = self.getBarsOfDay(yesterday)
-        if not bars:
+        i, j = self.__yesterdayRange()
+        if i == j:
             return None
 
-        bar = max(bars, key=lambda x: x.high)
-        return bar.high
+        return float(self.__high[i:j].max())
 
     # }}}
     def yesterdayLow(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.yesterdayLow()")
 
-        yesterday = self.__now.dt - ONE_DAY
-        bars = self.getBarsOfDay(yesterday)
-        if not bars:
+        i, j = self.__yesterdayRange()
+        if i == j:
             return None
 
-        bar = min(bars, key=lambda x: x.low)
-        return bar.low
+        return float(self.__low[i:j].min())
 
     # }}}
     def yesterdayClose(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.yesterdayClose()")
 
-        yesterday = self.__now.dt - ONE_DAY
-        bars = self.getBarsOfDay(yesterday)
-        if not bars:
+        i, j = self.__yesterdayRange()
+        if i == j:
             return None
 
-        return bars[-1].close
+        return float(self.__close[j - 1])
 
     # }}}
 
@@ -393,11 +384,11 @@ class Chart:
 
         if index < 0:
             return False
-        if index > len(self.__bars):
+        if index > self.__count:
             return False
 
         self.__head = index
-        self.__now = self.__bars[self.__head]
+        self.__now = self.__bar(self.__head)
         return True
 
     # }}}
@@ -410,10 +401,12 @@ class Chart:
         logger.debug(f"{self.__class__.__name__}.setHeadDatetime()")
         assert isinstance(dt, datetime)
 
-        index = find_left(self.__bars, dt, lambda x: x.dt)
-        if index is not None:
-            self.__head = index
-            self.__now = self.__bars[index]
+        # index of bar with dt less or equal 'dt'
+        x = self.__toNumpy(dt)
+        index = int(np.searchsorted(self.__dt[: self.__count], x, "right"))
+        if index:
+            self.__head = index - 1
+            self.__now = self.__bar(self.__head)
             return True
         else:
             assert False
@@ -421,15 +414,15 @@ class Chart:
     # }}}
     def resetHead(self) -> None:  # {{{
         logger.debug(f"{self.__class__.__name__}.resetHead()")
-        self.__head = len(self.__bars)
+        self.__head = self.__count
         self.__now = None
 
     # }}}
     def nextHead(self) -> Bar | None:  # {{{
         logger.debug(f"{self.__class__.__name__}.nextHead()")
-        if self.__head < len(self.__bars) - 1:
+        if self.__head < self.__count - 1:
             self.__head += 1
-            self.__now = self.__bars[self.__head]
+            self.__now = self.__bar(self.__head)
             return self.__now
         else:
             return None
@@ -440,7 +433,7 @@ class Chart:
 
         if self.__head > 0:
             self.__head -= 1
-            self.__now = self.__bars[self.__head]
+            self.__now = self.__bar(self.__head)
             return self.__now
         else:
             return None
@@ -466,7 +459,7 @@ class Chart:
 
         # request bars
         bars = await Keeper.get(
-            Bar,
+            BarArray,
             instrument=instrument,
             timeframe=timeframe,
             begin=begin,
@@ -479,6 +472,131 @@ class Chart:
 
     # }}}
 
+    def __bar(self, index: int) -> Bar:  # {{{
+        """Create Bar view of bar with index 'index'"""
+
+        if not 0 <= index < self.__count:
+            raise IndexError(index)
+
+        bar = Bar(
+            self.__toDateTime(self.__dt[index]),
+            float(self.__open[index]),
+            float(self.__high[index]),
+            float(self.__low[index]),
+            float(self.__close[index]),
+            int(self.__vol[index]),
+            chart=self,
+        )
+        return bar
+
+    # }}}
+    def __bars(self, begin: int, end: int) -> list[Bar]:  # {{{
+        """Create list of Bar views for half open range [begin, end)"""
+
+        begin = max(begin, 0)
+        end = min(end, self.__count)
+        return [self.__bar(i) for i in range(begin, end)]
+
+    # }}}
+    def __append(self, bar: Bar) -> None:  # {{{
+        # grow arrays capacity twice, if it is over
+        if self.__count == len(self.__dt):
+            capacity = max(2 * self.__count, 64)
+            self.__dt = self.__grow(self.__dt, capacity)
+            self.__open = self.__grow(self.__open, capacity)
+            self.__high = self.__grow(self.__high, capacity)
+            self.__low = self.__grow(self.__low, capacity)
+            self.__close = self.__grow(self.__close, capacity)
+            self.__vol = self.__grow(self.__vol, capacity)
+
+        i = self.__count
+        self.__dt[i] = self.__toNumpy(bar.dt)
+        self.__open[i] = bar.open
+        self.__high[i] = bar.high
+        self.__low[i] = bar.low
+        self.__close[i] = bar.close
+        self.__vol[i] = bar.vol
+        self.__count += 1
+
+    # }}}
+    def __dropFirst(self, n: int) -> None:  # {{{
+        # shift bars to begin of arrays, capacity is saved
+        count = self.__count - n
+        for arr in (
+            self.__dt,
+            self.__open,
+            self.__high,
+            self.__low,
+            self.__close,
+            self.__vol,
+        ):
+            arr[:count] = arr[n : self.__count]
+        self.__count = count
+
+    # }}}
+    def __range(self, begin, end) -> tuple[int, int]:  # {{{
+        """Indexes [i, j) of bars with begin <= bar.dt < end"""
+
+        dt = self.__dt[: self.__count]
+        i = int(np.searchsorted(dt, begin, "left"))
+        j = int(np.searchsorted(dt, end, "left"))
+        return i, j
+
+    # }}}
+    def __yearRange(self, dt: datetime) -> tuple[int, int]:  # {{{
+        year = np.datetime64(f"{dt.year:04}", "Y")
+        return self.__range(year, year + np.timedelta64(1, "Y"))
+
+    # }}}
+    def __dayRange(self, dt: datetime) -> tuple[int, int]:  # {{{
+        day = self.__toNumpy(dt).astype("datetime64[D]")
+        return self.__range(day, day + np.timedelta64(1, "D"))
+
+    # }}}
+    def __todayRange(self) -> tuple[int, int]:  # {{{
+        """Indexes [i, head) of today bars before head"""
+
+        if self.__now is None:
+            return 0, 0
+
+        i, _ = self.__dayRange(self.__now.dt)
+        i = min(i, self.__head)
+        return i, self.__head
+
+    # }}}
+    def __yesterdayRange(self) -> tuple[int, int]:  # {{{
+        yesterday = self.__now.dt - ONE_DAY
+        if self.__timeframe >= TimeFrame("D"):
+            return 0, 0
+
+        return self.__dayRange(yesterday)
+
+    # }}}
+    @staticmethod  # __grow  # {{{
+    def __grow(arr: np.ndarray, capacity: int) -> np.ndarray:
+        new = np.empty(capacity, dtype=arr.dtype)
+        new[: len(arr)] = arr
+        return new
+
+    # }}}
+    @staticmethod  # __toNumpy  # {{{
+    def __toNumpy(dt: datetime) -> np.datetime64:
+        """Offset-aware datetime -> numpy datetime64[ns] in UTC"""
+
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(UTC).replace(tzinfo=None)
+        return np.datetime64(dt, "ns")
+
+    # }}}
+    @staticmethod  # __toDateTime  # {{{
+    def __toDateTime(dt: np.datetime64) -> datetime:
+        """Numpy datetime64[ns] in UTC -> offset-aware datetime"""
+
+        us = int(dt.astype("datetime64[us]").astype(np.int64))
+        return _EPOCH + timedelta(microseconds=us)
+
+    # }}}
+
     @classmethod  # __checkArgs  # {{{
     def __checkArgs(
         cls,
@@ -529,6 +647,8 @@ class Chart:
     def __checkBars(cls, bars):
         logger.debug(f"{cls.__name__}.__checkBars()")
 
+        if isinstance(bars, BarArray):
+            return
         if not isinstance(bars, list):
             logger.critical(f"Invalid bars={bars}")
             raise TypeError(bars)
@@ -569,5 +689,174 @@ class Chart:
     # }}}
 
 
+class _ChartCache:  # {{{
+    """Shared bars of (instrument, timeframe) for charts of trades
+
+    Trade.loadChart needs a window of bars before trade.dt, and windows
+    of trades of one asset overlap. The cache loads bars of a covering
+    period once, and every chart is created on a slice of cached
+    columns - numpy views, without copy and without request to db.
+
+    TradeList.prefetchCharts registers the period of its trades with
+    expect(), then the first miss of a timeframe loads bars for all
+    trades of the instrument at once.
+
+    Entry keeps _BarsData.version of its bars, after save or delete of
+    bars of (instrument, timeframe) the entry is loaded again.
+    """
+
+    MAX_SIZE = 16  # (instrument, timeframe) pairs in cache
+
+    # key -> begin, end, version, bars
+    __BARS: OrderedDict[tuple, tuple] = OrderedDict()
+    __EXPECTED: dict[str, tuple[datetime, datetime]] = dict()
+    __LOCKS: WeakKeyDictionary = WeakKeyDictionary()  # loop -> {key: Lock}
+
+    @classmethod  # chart  # {{{
+    async def chart(
+        cls,
+        instrument: Instrument,
+        timeframe: TimeFrame,
+        begin: datetime,
+        end: datetime,
+    ) -> Chart:
+        """Return chart with bars begin <= bar.dt < end, like Chart.load"""
+
+        logger.debug(f"{cls.__name__}.chart()")
+
+        key = (instrument.figi, str(timeframe))
+        version = _BarsData.version(instrument, timeframe.toDataType())
+        bars = cls.__find(key, begin, end, version)
+        if bars is None:
+            # NOTE: одновременные промахи по одному ключу (gather по
+            # трейдам) ждут одну загрузку, а не грузят каждый свою
+            async with cls.__lock(key):
+                bars = cls.__find(key, begin, end, version)
+                if bars is None:
+                    bars = await cls.__load(
+                        key, instrument, timeframe, begin, end, version
+                    )
+
+        i = int(np.searchsorted(bars.dt, _toNumpy(begin), "left"))
+        j = int(np.searchsorted(bars.dt, _toNumpy(end), "left"))
+        return Chart(instrument, timeframe, bars[i:j])
+
+    # }}}
+    @classmethod  # expect  # {{{
+    def expect(
+        cls, instrument: Instrument, first_dt: datetime, last_dt: datetime
+    ) -> None:
+        """Remember period of trades, whose charts will be requested"""
+
+        logger.debug(f"{cls.__name__}.expect()")
+
+        cls.__EXPECTED[instrument.figi] = (first_dt, last_dt)
+
+    # }}}
+    @classmethod  # clear  # {{{
+    def clear(cls) -> None:
+        logger.debug(f"{cls.__name__}.clear()")
+
+        cls.__BARS.clear()
+        cls.__EXPECTED.clear()
+
+    # }}}
+
+    @classmethod  # __find  # {{{
+    def __find(cls, key, begin, end, version) -> BarArray | None:
+        entry = cls.__BARS.get(key)
+        if entry is None:
+            return None
+
+        cached_begin, cached_end, cached_version, bars = entry
+        if cached_version != version:
+            return None
+        if not (cached_begin <= begin and end <= cached_end):
+            return None
+
+        cls.__BARS.move_to_end(key)  # LRU
+        return bars
+
+    # }}}
+    @classmethod  # __load  # {{{
+    async def __load(
+        cls, key, instrument, timeframe, begin, end, version
+    ) -> BarArray:
+        # period of all expected trades, every trade needs a window of
+        # the same length before its dt
+        expected = cls.__EXPECTED.get(instrument.figi)
+        if expected is not None:
+            first_dt, last_dt = expected
+            begin = min(begin, first_dt - (end - begin))
+            end = max(end, last_dt)
+
+        # period overlaps cached one - request only missing parts,
+        # if bars in db was not changed
+        entry = cls.__BARS.get(key)
+        if (
+            entry is not None
+            and entry[2] == version
+            and entry[0] <= end
+            and begin <= entry[1]
+        ):
+            cached_begin, cached_end, _, cached = entry
+            parts = [cached]
+            if begin < cached_begin:
+                left = await cls.__request(
+                    instrument, timeframe, begin, cached_begin
+                )
+                parts.insert(0, left)
+            if cached_end < end:
+                right = await cls.__request(
+                    instrument, timeframe, cached_end, end
+                )
+                parts.append(right)
+            bars = BarArray.concat(parts)
+            begin = min(begin, cached_begin)
+            end = max(end, cached_end)
+        else:
+            bars = await cls.__request(instrument, timeframe, begin, end)
+
+        cls.__BARS[key] = (begin, end, version, bars)
+        cls.__BARS.move_to_end(key)
+        while len(cls.__BARS) > cls.MAX_SIZE:
+            cls.__BARS.popitem(last=False)
+
+        return bars
+
+    # }}}
+    @classmethod  # __request  # {{{
+    async def __request(cls, instrument, timeframe, begin, end) -> BarArray:
+        bars = await Keeper.get(
+            BarArray,
+            instrument=instrument,
+            timeframe=timeframe,
+            begin=begin,
+            end=end,
+        )
+        return bars
+
+    # }}}
+    @classmethod  # __lock  # {{{
+    def __lock(cls, key) -> asyncio.Lock:
+        # NOTE: asyncio.Lock привязан к loop, а GUI запускает много
+        # разных loop - храним локи отдельно для каждого loop
+        loop = asyncio.get_running_loop()
+        locks = cls.__LOCKS.setdefault(loop, dict())
+        return locks.setdefault(key, asyncio.Lock())
+
+    # }}}
+
+
+# }}}
+def _toNumpy(dt: datetime) -> np.datetime64:  # {{{
+    """Offset-aware datetime -> numpy datetime64[ns] in UTC"""
+
+    return np.datetime64(dt.astimezone(UTC).replace(tzinfo=None), "ns")
+
+
+# }}}
+
+
 if __name__ == "__main__":
     ...
@@ -8,9 +8,16 @@
 
 from __future__ import annotations
 
-from avin.config import Usr
+import asyncio
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from avin.config import Auto, Usr
 from avin.core.chart import Chart
-from avin.core.trade import Trade
+from avin.core.trade import Trade, TradeList
+from avin.data.bar import _BarsData
+from avin.keeper import Keeper
 from avin.utils import Cmd, logger
 
 
@@ -45,6 +52,11 @@ class Filter:  # {{{
         self.__code = code
         self.__condition = self.__createCondition()
 
+    # }}}
+    @property  # code_hash  # {{{
+    def code_hash(self) -> str:
+        return hashlib.sha1(self.__code.encode()).hexdigest()
+
     # }}}
     @property  # filter_list  # {{{
     def filter_list(self):
@@ -96,6 +108,15 @@ class Filter:  # {{{
 
         return result
 
+    # }}}
+    async def acheckMany(self, items: list) -> list[bool]:  # {{{
+        """Check list of items, results of trades are memoized"""
+
+        logger.debug(f"{self.__class__.__name__}.acheckMany()")
+
+        results = await _FilterEngine.run([self], items)
+        return [row[0] for row in results]
+
     # }}}
 
     # @classmethod  # new  # {{{
@@ -380,6 +401,19 @@ class FilterList:  # {{{
 
     # }}}
 
+    async def acheckMany(self, items: list) -> list[list[bool]]:  # {{{
+        """Check items by filters of this list (without child lists)
+
+        Return results[i][j] - result of filter j for item i.
+        """
+
+        logger.debug(f"{self.__class__.__name__}.acheckMany()")
+
+        results = await _FilterEngine.run(self.__filters, items)
+        return results
+
+    # }}}
+
     @classmethod  # save  # {{{
     def save(cls, filter_list: FilterList) -> None:
         logger.debug(f"{cls.__name__}.save()")
@@ -442,6 +476,235 @@ class FilterList:  # {{{
     # }}}
 
 
+# }}}
+
+class _FilterEngine:  # {{{
+    """Check of filters over many items
+
+    Results of trades are memoized on disk, one json for one filter
+    code: 'usr/data/filter/<sha1 of code>.json', key of result is
+    '<trade_id>:<trade status>:<data version>'. Data version - counter
+    of changes of bars of the trade asset in database, every save or
+    delete of its bars (also inside of the same period) makes new keys.
+    Re-opening of the same test, or adding of one more filter, checks
+    only what is not in memo yet. Changed code of filter - new hash,
+    new memo.
+
+    Many trades are checked in a pool of processes: code of filters
+    is compiled once in every worker, worker loads trades by id and
+    their charts itself. Assets are checked in this process - their
+    charts live only here, and they are not memoized.
+    """
+
+    MIN_PROCESS_ITEMS = 500  # less trades - check in this process
+
+    @classmethod  # run  # {{{
+    async def run(
+        cls, filters: list[Filter], items: list, workers=None
+    ) -> list[list[bool]]:
+        """Return results[i][j] - filter j for item i"""
+
+        logger.debug(f"{cls.__name__}.run()")
+
+        workers = workers or Auto.FILTER_WORKERS
+
+        # results from memo
+        memos = [cls.__loadMemo(f) for f in filters]
+        versions = await cls.__dataVersions(items)
+        keys = [cls.__memoKey(i, versions) for i in items]
+        results = list()
+        missed = list()  # (item index, [filter indexes])
+        for i, key in enumerate(keys):
+            row = [None if key is None else m.get(key) for m in memos]
+            results.append(row)
+
+            indexes = [j for j, r in enumerate(row) if r is None]
+            if indexes:
+                missed.append((i, indexes))
+
+        # check missed
+        is_trades = all(keys[i] for i, _ in missed)
+        many = len(missed) >= cls.MIN_PROCESS_ITEMS
+        if workers > 1 and is_trades and many:
+            checked = await cls.__checkInProcesses(
+                filters, items, missed, workers
+            )
+        else:
+            checked = await cls.__checkHere(filters, items, missed)
+
+        # remember new results
+        changed = False
+        for (i, indexes), row in zip(missed, checked):
+            key = keys[i]
+            for j, result in zip(indexes, row):
+                results[i][j] = result
+                if key is not None:
+                    memos[j][key] = result
+                    changed = True
+
+        if changed:
+            for f, memo in zip(filters, memos):
+                cls.__saveMemo(f, memo)
+
+        return results
+
+    # }}}
+    @classmethod  # clearMemo  # {{{
+    def clearMemo(cls) -> None:
+        logger.debug(f"{cls.__name__}.clearMemo()")
+
+        dir_path = Cmd.path(Usr.DATA, "filter")
+        if Cmd.isExist(dir_path):
+            Cmd.deleteDir(dir_path)
+
+    # }}}
+
+    @classmethod  # __checkHere  # {{{
+    async def __checkHere(cls, filters, items, missed) -> list[list[bool]]:
+        async def check(i, indexes):
+            return [bool(await filters[j].acheck(items[i])) for j in indexes]
+
+        rows = await asyncio.gather(*[check(i, j) for i, j in missed])
+        return list(rows)
+
+    # }}}
+    @classmethod  # __checkInProcesses  # {{{
+    async def __checkInProcesses(
+        cls, filters, items, missed, workers
+    ) -> list[list[bool]]:
+        logger.info(f":: Check {len(missed)} trades, {workers} processes")
+
+        # tasks: (trade_id, filter indexes), split into chunks - some
+        # chunks for every worker, for balance of load
+        tasks = [(str(items[i].trade_id), indexes) for i, indexes in missed]
+        size = max(1, len(tasks) // (workers * 4))
+        chunks = [tasks[i : i + size] for i in range(0, len(tasks), size)]
+
+        # NOTE: spawn - в дочерний процесс не должны попасть
+        # event loop и пул соединений с БД родителя
+        codes = [(f.name, f.code) for f in filters]
+        loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(
+            workers,
+            mp_context=context,
+            initializer=_initFilterProcess,
+            initargs=(codes,),
+        ) as pool:
+            jobs = [
+                loop.run_in_executor(pool, _checkTradesProcess, chunk)
+                for chunk in chunks
+            ]
+            done = await asyncio.gather(*jobs)
+
+        checked = dict()
+        for part in done:
+            checked.update(part)
+
+        # trades not found in db (not saved) - check here
+        rows = list()
+        for i, indexes in missed:
+            row = checked.get(str(items[i].trade_id))
+            if row is None:
+                here = await cls.__checkHere(filters, items, [(i, indexes)])
+                row = here[0]
+            rows.append(row)
+
+        return rows
+
+    # }}}
+    @classmethod  # __dataVersions  # {{{
+    async def __dataVersions(cls, items) -> dict[str, str]:
+        """Return figi -> data version, for assets of trades in items"""
+
+        instruments = dict()
+        for item in items:
+            if isinstance(item, Trade):
+                instruments[item.instrument.figi] = item.instrument
+
+        versions = dict()
+        for figi, instrument in instruments.items():
+            version = await _BarsData.dataVersion(instrument)
+            versions[figi] = str(version)
+
+        return versions
+
+    # }}}
+    @classmethod  # __memoKey  # {{{
+    def __memoKey(cls, item, versions: dict[str, str]) -> str | None:
+        if not isinstance(item, Trade):
+            return None
+
+        version = versions[item.instrument.figi]
+        return f"{item.trade_id}:{item.status.name}:{version}"
+
+    # }}}
+    @classmethod  # __memoPath  # {{{
+    def __memoPath(cls, f: Filter) -> str:
+        return Cmd.path(Usr.DATA, "filter", f"{f.code_hash}.json")
+
+    # }}}
+    @classmethod  # __loadMemo  # {{{
+    def __loadMemo(cls, f: Filter) -> dict[str, bool]:
+        file_path = cls.__memoPath(f)
+        if not Cmd.isExist(file_path):
+            return dict()
+
+        return Cmd.loadJson(file_path)
+
+    # }}}
+    @classmethod  # __saveMemo  # {{{
+    def __saveMemo(cls, f: Filter, memo: dict[str, bool]) -> None:
+        Cmd.saveJson(memo, cls.__memoPath(f))
+
+    # }}}
+
+
+# }}}
+_PROCESS_FILTERS: list[Filter] = list()
+
+
+def _initFilterProcess(codes: list[tuple[str, str]]) -> None:  # {{{
+    """Initializer of worker process - compile filters once"""
+
+    global _PROCESS_FILTERS
+    _PROCESS_FILTERS = [Filter(name, code) for name, code in codes]
+
+
+# }}}
+def _checkTradesProcess(tasks: list) -> dict[str, list[bool]]:  # {{{
+    """Entry point of worker process for _FilterEngine"""
+
+    return asyncio.run(_checkTrades(tasks))
+
+
+# }}}
+async def _checkTrades(tasks: list) -> dict[str, list[bool]]:  # {{{
+    try:
+        ids = [trade_id for trade_id, _ in tasks]
+        trades = await Keeper.get(Trade, trade_id=ids)
+        trades = {str(i.trade_id): i for i in trades}
+
+        # charts of all trades of chunk - one request per timeframe
+        await TradeList("", list(trades.values())).prefetchCharts()
+
+        results = dict()
+        for trade_id, indexes in tasks:
+            trade = trades.get(trade_id)
+            if trade is None:
+                continue
+
+            results[trade_id] = [
+                bool(await _PROCESS_FILTERS[j].acheck(trade))
+                for j in indexes
+            ]
+
+        return results
+
+    finally:
+        await Keeper.close()
+
+
 # }}}
 
 
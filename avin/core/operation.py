@@ -93,10 +93,14 @@ class Operation:
 
     # }}}
     @classmethod  # fromRecord{{{
-    async def fromRecord(cls, record: asyncpg.Record) -> Operation:
+    async def fromRecord(
+        cls, record: asyncpg.Record, instrument: Optional[Instrument] = None
+    ) -> Operation:
         logger.debug(f"Operation.fromRecord({record})")
 
-        instrument = await Instrument.fromFigi(record["figi"])
+        # instrument may be passed, if already known
+        if instrument is None:
+            instrument = await Instrument.fromFigi(record["figi"])
 
         op = Operation(
             account_name=record["account"],
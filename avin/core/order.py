@@ -261,9 +261,16 @@ class Order(metaclass=abc.ABCMeta):  # {{{
     # }}}
 
     @classmethod  # fromRecord{{{
-    async def fromRecord(cls, record):
+    async def fromRecord(cls, record, instrument=None):
+        """Create order from record
+
+        instrument - optional, if already known, to avoid extra request
+        """
         logger.debug(f"Order.fromRecord({record})")
 
+        if instrument is None:
+            instrument = await Instrument.fromFigi(figi=record["figi"])
+
         methods = {
             "MARKET": Order.__marketOrderFromRecord,
             "LIMIT": Order.__limitOrderFromRecord,
@@ -272,7 +279,7 @@ class Order(metaclass=abc.ABCMeta):  # {{{
             "TAKE_PROFIT": Order.__takeProfitFromRecord,
         }
         method = methods[record["order_type"]]
-        order = await method(record)
+        order = await method(record, instrument)
         return order
 
     # }}}
@@ -306,10 +313,9 @@ class Order(metaclass=abc.ABCMeta):  # {{{
     # }}}
 
     @classmethod  # __marketOrderFromRecord{{{
-    async def __marketOrderFromRecord(cls, record):
+    async def __marketOrderFromRecord(cls, record, instrument):
         logger.debug(f"Order.__marketOrderFromRecord({record})")
 
-        instrument = await Instrument.fromFigi(figi=record["figi"])
         order = MarketOrder(
             account_name=record["account"],
             direction=Direction.fromStr(record["direction"]),
@@ -328,10 +334,9 @@ class Order(metaclass=abc.ABCMeta):  # {{{
 
     # }}}
     @classmethod  # __limitOrderFromRecord{{{
-    async def __limitOrderFromRecord(cls, record):
+    async def __limitOrderFromRecord(cls, record, instrument):
         logger.debug(f"Order.__limitOrderFromRecord({record})")
 
-        instrument = await Instrument.fromFigi(figi=record["figi"])
         order = LimitOrder(
             account_name=record["account"],
             direction=Direction.fromStr(record["direction"]),
@@ -351,10 +356,9 @@ class Order(metaclass=abc.ABCMeta):  # {{{
 
     # }}}
     @classmethod  # __stopOrderFromRecord{{{
-    async def __stopOrderFromRecord(cls, record):
+    async def __stopOrderFromRecord(cls, record, instrument):
         logger.debug(f"Order.__stopOrderFromRecord({record})")
 
-        instrument = await Instrument.fromFigi(figi=record["figi"])
         order = StopOrder(
             account_name=record["account"],
             direction=Direction.fromStr(record["direction"]),
@@ -375,10 +379,9 @@ class Order(metaclass=abc.ABCMeta):  # {{{
 
     # }}}
     @classmethod  # __stopLossFromRecord{{{
-    async def __stopLossFromRecord(cls, record):
+    async def __stopLossFromRecord(cls, record, instrument):
         logger.debug(f"Order.__stopLossFromRecord({record})")
 
-        instrument = await Instrument.fromFigi(figi=record["figi"])
         order = StopLoss(
             account_name=record["account"],
             direction=Direction.fromStr(record["direction"]),
@@ -399,10 +402,9 @@ class Order(metaclass=abc.ABCMeta):  # {{{
 
     # }}}
     @classmethod  # __takeProfitFromRecord{{{
-    async def __takeProfitFromRecord(cls, record):
+    async def __takeProfitFromRecord(cls, record, instrument):
         logger.debug(f"Order.__takeProfitFromRecord({record})")
 
-        instrument = await Instrument.fromFigi(figi=record["figi"])
         order = TakeProfit(
             account_name=record["account"],
             direction=Direction.fromStr(record["direction"]),
@@ -41,10 +41,6 @@ UStrategy = TypeVar("UStrategy")
 
 
 class Strategy(ABC):  # {{{
-    # signals
-    tradeOpened = AsyncSignal(Trade)
-    tradeClosed = AsyncSignal(Trade)
-
     # Abstract
     @abstractmethod  # __init__  # {{{
     def __init__(self, name: str, version: str):
@@ -54,6 +50,10 @@ class Strategy(ABC):  # {{{
         self.__account: Optional[Account] = None
         self.__active_trades: Optional[TradeList] = None
 
+        # signals, emited after onTradeOpened / onTradeClosed
+        self.tradeOpened = AsyncSignal(Trade)
+        self.tradeClosed = AsyncSignal(Trade)
+
     # }}}
     @abstractmethod  # timeframes  # {{{
     def timeframes(self) -> TimeFrameList:
@@ -682,6 +682,8 @@ class Strategy(ABC):  # {{{
     async def __connectTradeSignals(self, trade: Trade):  # {{{
         trade.opened.aconnect(self.onTradeOpened)
         trade.closed.aconnect(self.onTradeClosed)
+        trade.opened.aconnect(self.tradeOpened.aemit)
+        trade.closed.aconnect(self.tradeClosed.aemit)
 
     # }}}
     async def __createStopLossByPercent(  # {{{
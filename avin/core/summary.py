@@ -8,6 +8,9 @@
 
 from __future__ import annotations
 
+from weakref import WeakKeyDictionary
+
+import numpy as np
 import pandas as pd
 
 from avin.core.trade import Trade, TradeList
@@ -15,11 +18,19 @@ from avin.utils import logger
 
 
 class Summary:
+    """Summary of closed trades of TradeList
+
+    Results of trades are extracted once into numpy array, all metrics
+    are calculated vectorized from it. Calculated metrics are cached
+    for every TradeList and recalculated only when list changed (added
+    or removed trades, closed or blocked trade).
+    """
+
     def __init__(self, trade_list: TradeList):  # {{{
         logger.debug(f"{self.__class__.__name__}.__init__()")
 
         self.__trade_list = trade_list
-        self.__summary = self.__calculate(trade_list)
+        self.__summary = Summary.__calculate(trade_list)
 
     # }}}
     def __str__(self):  # {{{
@@ -29,14 +40,11 @@ class Summary:
 
     @property  # data_frame   # {{{
     def data_frame(self) -> pd.DataFrame:
-        full_df = pd.DataFrame([self.__summary])
-
+        rows = [self.__summary]
         for tl in self.__trade_list.childs:
-            child_summary = self.__calculate(tl)
-            child_df = pd.DataFrame([child_summary])
-            full_df = pd.concat([full_df, child_df], ignore_index=True)
+            rows.append(Summary.__calculate(tl))
 
-        return full_df
+        return pd.DataFrame(rows, columns=Summary.header())
 
     # }}}
     @property  # name   # {{{
@@ -126,7 +134,7 @@ class Summary:
 
         header = list()
         header.append("name")
-        for column_name in cls.__FUNCTIONS:
+        for column_name in cls.__COLUMNS:
             header.append(column_name)
 
         return header
@@ -136,260 +144,155 @@ class Summary:
     def percentProfitable(cls, trade_list: TradeList) -> float:
         logger.debug(f"{cls.__name__}.percentProfitable()")
 
-        results = Summary.__getResults(trade_list)
-        percent = Summary.__percentProfitable(results)
+        summary = cls.__calculate(trade_list)
+        return summary["%"]
 
-        return round(percent, 2)
+    # }}}
+    @classmethod  # clearCache  # {{{
+    def clearCache(cls) -> None:
+        logger.debug(f"{cls.__name__}.clearCache()")
+
+        cls.__CACHE.clear()
 
     # }}}
 
     @classmethod  # save  # {{{
     def save(cls, summary: Summary, file_path: str) -> None:
-        logger.debug(f"{self.__class__.__name__}.__save()")
+        logger.debug(f"{cls.__name__}.save()")
 
         df = summary.data_frame
         df.to_csv(file_path, sep=";")
 
     # }}}
 
-    def __calculate(self, trade_list: TradeList) -> dict:  # {{{
+    @classmethod  # __calculate  # {{{
+    def __calculate(cls, trade_list: TradeList) -> dict:
         has_parent = trade_list.parent_list is not None
 
         summary = dict()
         summary["name"] = (
             trade_list.subname if has_parent else trade_list.name
         )
-        results = Summary.__getResults(trade_list)
-
-        for column, function in Summary.__FUNCTIONS.items():
-            value = round(function(results), 2)
-            summary[column] = value
-
-        return summary
-
-    # }}}
-
-    @staticmethod  # __grossProfit# {{{
-    def __grossProfit(results: list) -> float:
-        """Возвращает валовую прибыль всех <results>"""
-
-        value = 0.0
-        for i in results:
-            if i > 0.0:
-                value += i
-        return value
-
-    # }}}
-    @staticmethod  # __grossLoss# {{{
-    def __grossLoss(results: list) -> float:
-        """Возвращает валовый убыток всех <results>"""
 
-        value = 0.0
-        for i in results:
-            if i < 0.0:
-                value += i
-        return value
+        # NOTE: версия списка меняется и когда трейд закрыт или
+        # заблокирован, а сам список не менялся - O(1) на проверку
+        version = trade_list.version
 
-    # }}}
-    @staticmethod  # __totalNetProfit# {{{
-    def __totalNetProfit(results: list) -> float:
-        """Чистая прибыль всех <results>"""
+        cached = cls.__CACHE.get(trade_list)
+        if cached is None or cached[0] != version:
+            trades = cls.__getTrades(trade_list)
+            results = np.fromiter(
+                (t.result() for t in trades), np.float64, len(trades)
+            )
+            cached = (version, cls.__metrics(results))
+            cls.__CACHE[trade_list] = cached
 
-        value = 0.0
-        for i in results:
-            value += i
-        return round(value, 2)
+        summary.update(cached[1])
+        return summary
 
     # }}}
-    @staticmethod  # __totalTrades# {{{
-    def __totalTrades(results: list) -> int:
-        """Общее количество трейдов"""
+    @staticmethod  # __getTrades# {{{
+    def __getTrades(tlist: TradeList) -> list[Trade]:
+        """Возвращает трейды, которые учитываются в summary
 
-        return len(results)
+        Учитываются только закрытые и незаблокированные трейды
+        """
 
-    # }}}
-    @staticmethod  # __winningTrades# {{{
-    def __winningTrades(results: list) -> int:
-        """Количество выигранных трейдов"""
-        value = 0
-        for i in results:
-            if i > 0.0:
-                value += 1
-        return value
+        return [
+            trade
+            for trade in tlist.trades
+            if trade.status == Trade.Status.CLOSED and not trade.isBlocked()
+        ]
 
     # }}}
-    @staticmethod  # __losingTrades# {{{
-    def __losingTrades(results: list) -> int:
-        """Количество проигранных трейдов"""
+    @staticmethod  # __metrics# {{{
+    def __metrics(results: np.ndarray) -> dict:
+        """Все метрики по массиву финансовых результатов трейдов"""
 
-        value = 0
-        for i in results:
-            if i < 0.0:
-                value += 1
-        return value
+        total = len(results)
+        win = results > 0.0
+        loss = results < 0.0
 
-    # }}}
-    @staticmethod  # __percentProfitable# {{{
-    def __percentProfitable(results: list) -> float:
-        """Процент выигрышей"""
+        win_count = int(np.count_nonzero(win))
+        loss_count = int(np.count_nonzero(loss))
+        gross_profit = float(results[win].sum())
+        gross_loss = float(results[loss].sum())
+        profit = round(float(results.sum()), 2)
 
-        win = Summary.__winningTrades(results)
-        total = Summary.__totalTrades(results)
         if total == 0:
-            return 0
-        else:
-            return win / total * 100
-
-    # }}}
-    @staticmethod  # __percentUnprofitable# {{{
-    def __percentUnprofitable(results: list) -> float:
-        """Процент проигрышей"""
-
-        loss = Summary.__losingTrades(results)
-        total = Summary.__totalTrades(results)
-        if total == 0:
-            return 0
-        else:
-            return loss / total * 100
-
-    # }}}
-    @staticmethod  # __largestWin# {{{
-    def __largestWin(results: list) -> float:
-        """Наибольший выигрыш"""
-
-        if len(results) == 0:
-            return 0.0
-        maximum = max(results)
-        return max(maximum, 0.0)
-
-    # }}}
-    @staticmethod  # __largestLoss# {{{
-    def __largestLoss(results: list) -> float:
-        """Наибольший проигрыш"""
-
-        if len(results) == 0:
-            return 0.0
-        minimum = min(results)
-        return min(minimum, 0.0)
-
-    # }}}
-    @staticmethod  # __averageWin# {{{
-    def __averageWin(results: list) -> float:
-        """Средний выигрыш"""
-
-        win_count = Summary.__winningTrades(results)
-        if win_count == 0:
-            return 0.0
-        else:
-            return Summary.__grossProfit(results) / win_count
-
-    # }}}
-    @staticmethod  # __averageLoss# {{{
-    def __averageLoss(results: list) -> float:
-        """Средний проигрыш"""
-
-        loss_count = Summary.__losingTrades(results)
-        if loss_count == 0:
-            return 0.0
-        else:
-            return Summary.__grossLoss(results) / loss_count
-
-    # }}}
-    @staticmethod  # __averageTrade# {{{
-    def __averageTrade(results: list) -> float:
-        """Средний результат трейда"""
-
-        count = Summary.__totalTrades(results)
-        if count == 0:
-            return 0
-        else:
-            return Summary.__totalNetProfit(results) / count
-
-    # }}}
-    @staticmethod  # __maxWinSeries# {{{
-    def __maxWinSeries(results: list) -> int:
-        """Максимальное количество последовательных выигрышей"""
-
-        value = 0
-        series = 0
-        for i in results:
-            if i >= 0.0:
-                series += 1
-            else:
-                series = 0
-            value = max(value, series)
-        return value
-
-    # }}}
-    @staticmethod  # __maxLossSeries# {{{
-    def __maxLossSeries(results: list) -> int:
-        """Максимальное количество последовательных проигрышей"""
-
-        value = 0
-        series = 0
-        for i in results:
-            if i < 0.0:
-                series += 1
-            else:
-                series = 0
-            value = max(value, series)
-        return value
-
-    # }}}
-    @staticmethod  # __ratio# {{{
-    def __ratio(results: list) -> float:
-        """Отношение среднего выигрыша к среднему проигрышу"""
-
-        # avg_loss = Summary.__averageLoss(results)
-        # if avg_loss == 0:
-        #     return 0.0
-        # else:
-        #     return abs(Summary.__averageWin(results) / avg_loss)
-
-        """Отношение общей прибыли к общему убытку"""
-        gross_loss = Summary.__grossLoss(results)
-        if gross_loss == 0:
-            return 100.0
+            percent = 0
+            avg = 0
+            max_win = 0.0
+            max_loss = 0.0
         else:
-            return abs(Summary.__grossProfit(results) / gross_loss)
-
-    # }}}
-    @staticmethod  # __getResults# {{{
-    def __getResults(tlist: TradeList) -> list[float]:
-        """Возвращает список финансовых результатов трейдов
-
-        Учитываются только закрытые трейды
+            percent = win_count / total * 100
+            avg = profit / total
+            max_win = max(float(results.max()), 0.0)
+            max_loss = min(float(results.min()), 0.0)
+
+        ratio = 100.0 if gross_loss == 0 else abs(gross_profit / gross_loss)
+        avg_win = gross_profit / win_count if win_count else 0.0
+        avg_loss = gross_loss / loss_count if loss_count else 0.0
+
+        metrics = {
+            "profit": profit,
+            "%": percent,
+            "trades": total,
+            "win": win_count,
+            "loss": loss_count,
+            "ratio": ratio,
+            "avg": avg,
+            "gross profit": gross_profit,
+            "gross loss": gross_loss,
+            "w-seq": Summary.__maxSeries(~loss),
+            "l-seq": Summary.__maxSeries(loss),
+            "avg win": avg_win,
+            "avg loss": avg_loss,
+            "max win": max_win,
+            "max loss": max_loss,
+        }
+        return {k: round(v, 2) for k, v in metrics.items()}
+
+    # }}}
+    @staticmethod  # __maxSeries# {{{
+    def __maxSeries(mask: np.ndarray) -> int:
+        """Максимальная длина серии True подряд
+
+        Run-length encoding: границы серий - точки, где меняется
+        значение маски, длина серии - разность конца и начала.
         """
 
-        results = list()
-        for trade in tlist.trades:
-            if trade.isBlocked():
-                continue
-            if trade.status == Trade.Status.CLOSED:
-                results.append(trade.result())
-
-        return results
+        if not mask.any():
+            return 0
 
-    # }}}
-    __FUNCTIONS = {  # {{{
-        # Column: Function
-        "profit": __totalNetProfit,
-        "%": __percentProfitable,
-        "trades": __totalTrades,
-        "win": __winningTrades,
-        "loss": __losingTrades,
-        "ratio": __ratio,
-        "avg": __averageTrade,
-        "gross profit": __grossProfit,
-        "gross loss": __grossLoss,
-        "w-seq": __maxWinSeries,
-        "l-seq": __maxLossSeries,
-        "avg win": __averageWin,
-        "avg loss": __averageLoss,
-        "max win": __largestWin,
-        "max loss": __largestLoss,
-    }
-    # }}}
+        padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+        edges = np.flatnonzero(np.diff(padded))
+        begins = edges[0::2]
+        ends = edges[1::2]
+
+        return int((ends - begins).max())
+
+    # }}}
+
+    __COLUMNS = (  # {{{
+        "profit",
+        "%",
+        "trades",
+        "win",
+        "loss",
+        "ratio",
+        "avg",
+        "gross profit",
+        "gross loss",
+        "w-seq",
+        "l-seq",
+        "avg win",
+        "avg loss",
+        "max win",
+        "max loss",
+    )
+    # }}}
+    __CACHE: WeakKeyDictionary[TradeList, tuple] = WeakKeyDictionary()
 
 
 if __name__ == "__main__":
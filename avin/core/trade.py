@@ -8,13 +8,16 @@
 
 from __future__ import annotations
 
+import asyncio
 import enum
+from collections import defaultdict
 from typing import Any, Optional, TypeVar
+from weakref import WeakSet
 
 from avin.config import Usr
 from avin.const import ONE_DAY
-from avin.core.asset import Asset, AssetList
-from avin.core.chart import Chart
+from avin.core.asset import Asset
+from avin.core.chart import Chart, _ChartCache
 from avin.core.direction import Direction
 from avin.core.id import Id
 from avin.core.operation import Operation
@@ -116,13 +119,14 @@ class Trade:  # {{{
         self.version = version
         self.type = trade_type
         self.instrument = instrument
-        self.status = status
+        self.__status = status
         self.trade_id = trade_id
         self.trade_list_name = trade_list_name
         self.orders = orders if orders else list()
         self.operations = operations if operations else list()
         self.info: dict[str, Any] = dict()
         self.__blocked = False
+        self.__indexes: WeakSet[_TradeIndex] = WeakSet()
 
         # signals
         self.opened = AsyncSignal(object)
@@ -195,6 +199,22 @@ info:       {Cmd.toJson(self.info, indent=4)}
 
     # }}}
 
+    @property  # status  # {{{
+    def status(self) -> Trade.Status:
+        return self.__status
+
+    @status.setter
+    def status(self, status: Trade.Status):
+        old_status = self.__status
+        self.__status = status
+
+        # indexes of trade lists with this trade
+        if status != old_status:
+            for index in self.__indexes:
+                index.update(self, old_status)
+
+    # }}}
+
     # @async_slot  #onOrderPosted # {{{
     async def onOrderPosted(self, order):
         assert order.trade_id == self.trade_id
@@ -261,12 +281,14 @@ info:       {Cmd.toJson(self.info, indent=4)}
             timeframe = TimeFrame(timeframe)
 
         if n is None:
-            n = 5000  # default bars count
+            n = Chart.DEFAULT_BARS_COUNT
 
         end = self.dt
         begin = self.dt - n * timeframe
 
-        chart = await Chart.load(self.instrument, timeframe, begin, end)
+        # NOTE: окна трейдов одного актива перекрываются - бары берутся
+        # из общего кеша, график - срез без копирования
+        chart = await _ChartCache.chart(self.instrument, timeframe, begin, end)
         chart.setHeadDatetime(self.dt)
         return chart
 
@@ -307,8 +329,24 @@ info:       {Cmd.toJson(self.info, indent=4)}
     def setBlocked(self, val: bool):  # {{{
         logger.debug(f"{self.__class__.__name__}.setBlocked()")
 
+        changed = val != self.__blocked
         self.__blocked = val
 
+        # summary of trade lists with this trade is changed
+        if changed:
+            for index in self.__indexes:
+                index.touch()
+
+    # }}}
+    def attachIndex(self, index: _TradeIndex) -> None:  # {{{
+        """Attach index of TradeList, it is updated on change of status"""
+
+        self.__indexes.add(index)
+
+    # }}}
+    def detachIndex(self, index: _TradeIndex) -> None:  # {{{
+        self.__indexes.discard(index)
+
     # }}}
     def lots(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.lots()")
@@ -609,25 +647,35 @@ info:       {Cmd.toJson(self.info, indent=4)}
     # }}}
 
     @classmethod  # fromRecord{{{
-    async def fromRecord(cls, record):
+    async def fromRecord(
+        cls, record, instrument=None, orders=None, operations=None
+    ):
+        """Create trade from record
+
+        Orders, operations and instrument may be passed if already
+        loaded (see Trade.fromRecords), else they are requested.
+        """
         logger.debug(f"{cls.__name__}.fromRecord()")
 
         trade_id = record["trade_id"]
 
         # request operations of trade
-        operations = await Keeper.get(
-            Operation,
-            trade_id=trade_id,
-        )
+        if operations is None:
+            operations = await Keeper.get(
+                Operation,
+                trade_id=trade_id,
+            )
 
         # request orders of trade
-        orders = await Keeper.get(
-            Order,
-            trade_id=trade_id,
-        )
+        if orders is None:
+            orders = await Keeper.get(
+                Order,
+                trade_id=trade_id,
+            )
 
         # request instrument
-        instrument = await Instrument.fromFigi(record["figi"])
+        if instrument is None:
+            instrument = await Instrument.fromFigi(record["figi"])
 
         # create trade
         trade = Trade(
@@ -648,10 +696,58 @@ info:       {Cmd.toJson(self.info, indent=4)}
 
         # connect signals of attached orders
         for order in trade.orders:
-            await trade.__connectOrderSignals(order)
+            trade.__connectOrderSignals(order)
 
         return trade
 
+    # }}}
+    @classmethod  # fromRecords  # {{{
+    async def fromRecords(cls, records) -> list[Trade]:
+        """Create trades from records
+
+        Unlike calling Trade.fromRecord for each record, it makes a fixed
+        number of requests for any count of trades: instruments, orders
+        and operations of all trades are requested together.
+        """
+        logger.debug(f"{cls.__name__}.fromRecords()")
+
+        if not records:
+            return list()
+
+        trade_ids = [record["trade_id"] for record in records]
+        figis = list({record["figi"] for record in records})
+
+        async with Keeper.connection():
+            instr_list = await Keeper.get(Instrument, figi=figis)
+            instruments = {i.figi: i for i in instr_list}
+            all_orders = await Keeper.get(
+                Order, trade_id=trade_ids, instruments=instruments
+            )
+            all_operations = await Keeper.get(
+                Operation, trade_id=trade_ids, instruments=instruments
+            )
+
+        # group by trade
+        orders = defaultdict(list)
+        for order in all_orders:
+            orders[str(order.trade_id)].append(order)
+        operations = defaultdict(list)
+        for operation in all_operations:
+            operations[str(operation.trade_id)].append(operation)
+
+        trades = list()
+        for record in records:
+            trade_id = record["trade_id"]
+            trade = await cls.fromRecord(
+                record,
+                instrument=instruments[record["figi"]],
+                orders=orders[trade_id],
+                operations=operations[trade_id],
+            )
+            trades.append(trade)
+
+        return trades
+
     # }}}
     @classmethod  # save  # {{{
     async def save(cls, trade: Trade) -> None:
@@ -714,6 +810,155 @@ info:       {Cmd.toJson(self.info, indent=4)}
     # }}}
 
 
+# }}}
+class _TradeIndex:  # {{{
+    """Secondary indexes of TradeList
+
+    Bucket of index - ordered set of trades (dict Trade -> None) by key:
+        ("status", Trade.Status)
+        ("strategy", name, version)
+        ("figi", figi)
+        ("year", year)
+        ("type", Trade.Type)
+        ("outcome", "win" | "loss")  - only closed trades
+
+    Index is updated in O(1) by add, remove, and by Trade itself, when
+    status of trade changed. Outcome needs trade.result(), so its
+    buckets are built on first request only. Selection of some keys
+    is an intersection of buckets, trades keep the order of list.
+
+    version - counter of all changes: add, remove, clear, status or
+    blocked flag of trade.
+    """
+
+    def __init__(self, trades: list[Trade]):  # {{{
+        self.__buckets: dict[tuple, dict[Trade, None]] = defaultdict(dict)
+        self.__order: dict[Trade, int] = dict()
+        self.__count = 0
+        self.__has_outcome = False
+        self.version = 0
+
+        for trade in trades:
+            self.add(trade)
+
+    # }}}
+
+    def add(self, trade: Trade) -> None:  # {{{
+        self.__order[trade] = self.__count
+        self.__count += 1
+
+        for key in self.__keys(trade):
+            self.__buckets[key][trade] = None
+        trade.attachIndex(self)
+        self.version += 1
+
+    # }}}
+    def remove(self, trade: Trade) -> None:  # {{{
+        self.__order.pop(trade, None)
+
+        for key in self.__keys(trade):
+            self.__discard(key, trade)
+        trade.detachIndex(self)
+        self.version += 1
+
+    # }}}
+    def clear(self) -> None:  # {{{
+        for trade in self.__order:
+            trade.detachIndex(self)
+
+        self.__buckets.clear()
+        self.__order.clear()
+        self.__has_outcome = False
+        self.version += 1
+
+    # }}}
+    def update(self, trade: Trade, old_status: Trade.Status) -> None:  # {{{
+        """Move trade to bucket of new status, called by Trade"""
+
+        closed = Trade.Status.CLOSED
+
+        self.__discard(("status", old_status), trade)
+        if self.__has_outcome and old_status == closed:
+            self.__discard(("outcome", "win"), trade)
+            self.__discard(("outcome", "loss"), trade)
+
+        self.__buckets[("status", trade.status)][trade] = None
+        if self.__has_outcome and trade.status == closed:
+            self.__buckets[self.__outcomeKey(trade)][trade] = None
+        self.version += 1
+
+    # }}}
+    def touch(self) -> None:  # {{{
+        """Trade changed without change of keys, called by Trade"""
+
+        self.version += 1
+
+    # }}}
+    def select(self, *keys: tuple) -> list[Trade]:  # {{{
+        if any(key[0] == "outcome" for key in keys):
+            self.__buildOutcome()
+
+        buckets = [self.__buckets.get(key, dict()) for key in keys]
+        buckets.sort(key=len)
+        smallest, others = buckets[0], buckets[1:]
+
+        selected = [t for t in smallest if all(t in b for b in others)]
+        selected.sort(key=self.__order.__getitem__)
+        return selected
+
+    # }}}
+    def keys(self, kind: str) -> list[tuple]:  # {{{
+        """Not empty keys of kind, in order of first trade in list
+
+        For kinds, which are not changed after add (strategy, figi,
+        year, type), the first trade of bucket is the first in list.
+        """
+
+        first = {
+            key: self.__order[next(iter(bucket))]
+            for key, bucket in self.__buckets.items()
+            if key[0] == kind and bucket
+        }
+        return sorted(first, key=first.__getitem__)
+
+    # }}}
+
+    def __keys(self, trade: Trade) -> list[tuple]:  # {{{
+        keys = [
+            ("status", trade.status),
+            ("strategy", trade.strategy, trade.version),
+            ("figi", trade.instrument.figi),
+            ("year", trade.dt.year),
+            ("type", trade.type),
+        ]
+        if self.__has_outcome and trade.status == Trade.Status.CLOSED:
+            keys.append(self.__outcomeKey(trade))
+
+        return keys
+
+    # }}}
+    def __outcomeKey(self, trade: Trade) -> tuple:  # {{{
+        return ("outcome", "win" if trade.isWin() else "loss")
+
+    # }}}
+    def __buildOutcome(self) -> None:  # {{{
+        if self.__has_outcome:
+            return
+
+        closed = self.__buckets.get(("status", Trade.Status.CLOSED), dict())
+        for trade in closed:
+            self.__buckets[self.__outcomeKey(trade)][trade] = None
+        self.__has_outcome = True
+
+    # }}}
+    def __discard(self, key: tuple, trade: Trade) -> None:  # {{{
+        bucket = self.__buckets.get(key)
+        if bucket is not None:
+            bucket.pop(trade, None)
+
+    # }}}
+
+
 # }}}
 class TradeList:  # {{{
     def __init__(  # {{{
@@ -726,7 +971,8 @@ class TradeList:  # {{{
         logger.debug(f"{self.__class__.__name__}.__init__()")
 
         self.__name = name
-        self.__trades = trades if trades else list()
+        self.__trades = list(trades) if trades else list()
+        self.__index = _TradeIndex(self.__trades)
         self.__parent_list = parent
         self.__subname = subname
         self.__childs: list[TradeList] = list()
@@ -768,8 +1014,10 @@ class TradeList:  # {{{
 
     # }}}
     @property  # trades  # {{{
-    def trades(self):
-        return self.__trades
+    def trades(self) -> tuple[Trade, ...]:
+        # NOTE: tuple - изменения только через add/remove/clear,
+        # иначе индекс и версия списка не узнают о них
+        return tuple(self.__trades)
 
     # }}}
     @property  # childs  # {{{
@@ -792,6 +1040,16 @@ class TradeList:  # {{{
     def owner(self) -> Test | Trader | None:
         return self.__owner
 
+    # }}}
+    @property  # version  # {{{
+    def version(self) -> int:
+        """Counter of changes of trades in list, used by Summary cache
+
+        Changed by add, remove, clear, and by trades of list - on change
+        of status or blocked flag.
+        """
+        return self.__index.version
+
     # }}}
 
     def add(self, trade: Trade) -> None:  # {{{
@@ -799,6 +1057,7 @@ class TradeList:  # {{{
 
         trade.trade_list_name = self.name
         self.__trades.append(trade)
+        self.__index.add(trade)
 
     # }}}
     def remove(self, trade: Trade) -> None:  # {{{
@@ -806,12 +1065,14 @@ class TradeList:  # {{{
 
         trade.trade_list_name = ""
         self.__trades.remove(trade)
+        self.__index.remove(trade)
 
     # }}}
     def clear(self) -> None:  # {{{
         logger.debug(f"{self.__class__.__name__}.clear()")
 
         self.__trades.clear()
+        self.__index.clear()
 
         # XXX:
         # тут глобально надо определить политику как взаимодействуют
@@ -885,15 +1146,60 @@ class TradeList:  # {{{
 
     # }}}
 
+    async def prefetchCharts(  # {{{
+        self, timeframe: Optional[TimeFrame | str] = None, n=None
+    ) -> None:
+        """Prepare charts of trades for Trade.loadChart
+
+        Period of trades of every asset is registered in chart cache,
+        then bars of a timeframe are loaded on the first Trade.loadChart,
+        once for all trades of the asset. If timeframe is given - bars
+        of this timeframe are loaded right now.
+        """
+        logger.debug(f"{self.__class__.__name__}.prefetchCharts()")
+
+        # period of trades of every instrument
+        periods: dict[str, list] = dict()
+        for trade in self.__trades:
+            period = periods.get(trade.instrument.figi)
+            if period is None:
+                periods[trade.instrument.figi] = [
+                    trade.instrument,
+                    trade.dt,
+                    trade.dt,
+                ]
+            else:
+                period[1] = min(period[1], trade.dt)
+                period[2] = max(period[2], trade.dt)
+
+        for instrument, first_dt, last_dt in periods.values():
+            _ChartCache.expect(instrument, first_dt, last_dt)
+
+        if timeframe is None:
+            return
+
+        if isinstance(timeframe, str):
+            timeframe = TimeFrame(timeframe)
+        if n is None:
+            n = Chart.DEFAULT_BARS_COUNT
+
+        await asyncio.gather(
+            *[
+                _ChartCache.chart(
+                    instrument, timeframe, first_dt - n * timeframe, last_dt
+                )
+                for instrument, first_dt, last_dt in periods.values()
+            ]
+        )
+
+    # }}}
     async def selectFilter(self, f) -> TradeList:  # {{{
         logger.debug(f"{self.__class__.__name__}.selectFilter()")
 
-        selected = list()
-        for trade in self.__trades:
-            result = await f.acheck(trade)
-            if result:
-                selected.append(trade)
+        await self.prefetchCharts()
+        results = await f.acheckMany(self.__trades)
 
+        selected = [t for t, ok in zip(self.__trades, results) if ok]
         child = self.createChild(selected, f.full_name)
         return child
 
@@ -903,8 +1209,12 @@ class TradeList:  # {{{
 
         child = self.createChild(self.__trades, filter_list.full_name)
 
-        for f in filter_list:
-            await child.selectFilter(f)
+        # all filters of list are checked at once
+        await self.prefetchCharts()
+        results = await filter_list.acheckMany(self.__trades)
+        for j, f in enumerate(filter_list):
+            selected = [t for t, r in zip(self.__trades, results) if r[j]]
+            child.createChild(selected, f.full_name)
 
         return child
 
@@ -912,14 +1222,10 @@ class TradeList:  # {{{
     async def anyOfFilterList(self, filter_list) -> TradeList:  # {{{
         logger.debug(f"{self.__class__.__name__}.anyOfFilterList()")
 
-        selected = list()
-        for trade in self:
-            for f in filter_list:
-                result = await f.acheck(trade)
-                if result:
-                    selected.append(trade)
-                    break
+        await self.prefetchCharts()
+        results = await filter_list.acheckMany(self.__trades)
 
+        selected = [t for t, r in zip(self.__trades, results) if any(r)]
         child = self.createChild(selected, f"{filter_list.full_name}")
         return child
 
@@ -944,14 +1250,58 @@ class TradeList:  # {{{
 
     # }}}
 
+    def select(  # {{{
+        self,
+        status: Optional[Trade.Status] = None,
+        strategy: Optional[tuple[str, str]] = None,
+        asset: Optional[Asset] = None,
+        year: Optional[int] = None,
+        trade_type: Optional[Trade.Type] = None,
+        outcome: Optional[str] = None,
+        subname: str = "",
+    ) -> TradeList:
+        """Select trades, which match all given conditions
+
+        Intersection of indexes, trades are not scanned.
+        strategy - (name, version), outcome - "win" | "loss"
+        """
+
+        logger.debug(f"{self.__class__.__name__}.select()")
+
+        keys = list()
+        names = list()
+        if status is not None:
+            keys.append(("status", status))
+            names.append(status.name)
+        if strategy is not None:
+            keys.append(("strategy", *strategy))
+            names.append("-".join(strategy))
+        if asset is not None:
+            keys.append(("figi", asset.figi))
+            names.append(asset.ticker)
+        if year is not None:
+            keys.append(("year", year))
+            names.append(str(year))
+        if trade_type is not None:
+            keys.append(("type", trade_type))
+            names.append(trade_type.name.lower())
+        if outcome is not None:
+            assert outcome in ("win", "loss")
+            keys.append(("outcome", outcome))
+            names.append(outcome)
+        assert keys, "no conditions for select"
+
+        selected = self.__index.select(*keys)
+        child = self.createChild(selected, subname or " ".join(names))
+        if asset is not None:
+            child.__asset = asset
+        return child
+
+    # }}}
     def selectStatus(self, status: Trade.Status) -> TradeList:  # {{{
         logger.debug(f"{self.__class__.__name__}.selectStatus()")
 
-        selected = list()
-        for trade in self.__trades:
-            if trade.status == status:
-                selected.append(trade)
-
+        selected = self.__index.select(("status", status))
         child = self.createChild(selected, status.name)
         return child
 
@@ -959,11 +1309,7 @@ class TradeList:  # {{{
     def selectStrategy(self, name: str, version: str) -> TradeList:  # {{{
         logger.debug(f"{self.__class__.__name__}.selectStrategy()")
 
-        selected = list()
-        for trade in self.__trades:
-            if trade.strategy == name and trade.version == version:
-                selected.append(trade)
-
+        selected = self.__index.select(("strategy", name, version))
         child = self.createChild(selected, f"{name}-{version}")
         return child
 
@@ -975,16 +1321,9 @@ class TradeList:  # {{{
         #     "strategy_name_1": ["v1", "v2", ...]
         #     "strategy_name_2": ["v1", "v2", ...]
         #     }
-        all_strategys: dict[str, list[str]] = dict()
-        for trade in self.__trades:
-            name = trade.strategy
-            version = trade.version
-
-            if name not in all_strategys:
-                all_strategys[name] = list()
-
-            if version not in all_strategys[name]:
-                all_strategys[name].append(version)
+        all_strategys: dict[str, list[str]] = defaultdict(list)
+        for _, name, version in self.__index.keys("strategy"):
+            all_strategys[name].append(version)
 
         all_childs = list()
         for name, versions in all_strategys.items():
@@ -998,11 +1337,7 @@ class TradeList:  # {{{
     def selectLong(self) -> TradeList:  # {{{
         logger.debug(f"{self.__class__.__name__}.selectLong()")
 
-        selected = list()
-        for trade in self.__trades:
-            if trade.isLong():
-                selected.append(trade)
-
+        selected = self.__index.select(("type", Trade.Type.LONG))
         child = self.createChild(selected, "long")
         return child
 
@@ -1010,11 +1345,7 @@ class TradeList:  # {{{
     def selectShort(self) -> TradeList:  # {{{
         logger.debug(f"{self.__class__.__name__}.selectShort()")
 
-        selected = list()
-        for trade in self.__trades:
-            if trade.isShort():
-                selected.append(trade)
-
+        selected = self.__index.select(("type", Trade.Type.SHORT))
         child = self.createChild(selected, "short")
         return child
 
@@ -1022,13 +1353,8 @@ class TradeList:  # {{{
     def selectWin(self) -> TradeList:  # {{{
         logger.debug(f"{self.__class__.__name__}.selectWin()")
 
-        selected = list()
-        for trade in self.__trades:
-            if trade.status != Trade.Status.CLOSED:  # skip not closed
-                continue
-            if trade.isWin():
-                selected.append(trade)
-
+        # only closed trades are in outcome index
+        selected = self.__index.select(("outcome", "win"))
         child = self.createChild(selected, "win")
         return child
 
@@ -1036,13 +1362,8 @@ class TradeList:  # {{{
     def selectLoss(self) -> TradeList:  # {{{
         logger.debug(f"{self.__class__.__name__}.selectLoss()")
 
-        selected = list()
-        for trade in self.__trades:
-            if trade.status != Trade.Status.CLOSED:  # skip not closed
-                continue
-            if trade.isLoss():
-                selected.append(trade)
-
+        # only closed trades are in outcome index
+        selected = self.__index.select(("outcome", "loss"))
         child = self.createChild(selected, "loss")
         return child
 
@@ -1050,11 +1371,7 @@ class TradeList:  # {{{
     def selectAsset(self, asset: Asset) -> TradeList:  # {{{
         logger.debug(f"{self.__class__.__name__}.selectAsset()")
 
-        selected = list()
-        for trade in self.__trades:
-            if trade.instrument.figi == asset.figi:
-                selected.append(trade)
-
+        selected = self.__index.select(("figi", asset.figi))
         child = self.createChild(selected, asset.ticker)
         child.__asset = asset
         return child
@@ -1063,16 +1380,12 @@ class TradeList:  # {{{
     def selectAssets(self) -> list[TradeList]:  # {{{
         logger.debug(f"{self.__class__.__name__}.collectAssetList()")
 
-        asset_list = AssetList(name="")
-        for i in self.__trades:
-            instrument = i.instrument
-            asset = Asset.fromInstrument(instrument)
-            if asset not in asset_list:
-                asset_list.add(asset)
-
         all_childs = list()
-        for asset in asset_list:
-            child = self.selectAsset(asset)
+        for key in self.__index.keys("figi"):
+            trades = self.__index.select(key)
+            asset = Asset.fromInstrument(trades[0].instrument)
+            child = self.createChild(trades, asset.ticker)
+            child.__asset = asset
             all_childs.append(child)
 
         return all_childs
@@ -1081,11 +1394,7 @@ class TradeList:  # {{{
     def selectYear(self, year):  # {{{
         logger.debug(f"{self.__class__.__name__}.selectYear()")
 
-        selected = list()
-        for trade in self.__trades:
-            if trade.dt.year == year:
-                selected.append(trade)
-
+        selected = self.__index.select(("year", year))
         child = self.createChild(selected, str(year))
         return child
 
@@ -1096,8 +1405,8 @@ class TradeList:  # {{{
         logger.debug(f"{cls.__name__}.fromRecord()")
 
         tlist = TradeList(name)
-        for i in records:
-            trade = await Trade.fromRecord(i)
+        trades = await Trade.fromRecords(records)
+        for trade in trades:
             tlist.add(trade)
 
         return tlist
@@ -7,6 +7,7 @@
 # ============================================================================
 
 from avin.data._data import Data
+from avin.data.bar import BarArray
 from avin.data.convert_task import ConvertTask, ConvertTaskList
 from avin.data.data_info import DataInfo, DataInfoList
 from avin.data.data_source import DataSource
@@ -16,6 +17,7 @@ from avin.data.instrument import Instrument
 
 __all__ = (
     "Data",
+    "BarArray",
     "ConvertTask",
     "ConvertTaskList",
     "DataInfo",
@@ -127,6 +127,31 @@ class Data:
 
         await _DataManager.download(source, instrument, data_type, year)
 
+    # }}}
+    @classmethod  # verify  # {{{
+    async def verify(
+        cls,
+        source: DataSource,
+        instrument: Instrument,
+        data_type: DataType,
+    ) -> list[tuple[datetime, datetime]]:
+        """Find gaps of downloaded data and download them again
+
+        Return list of redownloaded intervals [begin, end).
+        """
+        logger.debug(f"{cls.__name__}.verify()")
+
+        check = cls.__checkArgs(
+            source=source,
+            instrument=instrument,
+            data_type=data_type,
+        )
+        if not check:
+            return list()
+
+        gaps = await _DataManager.verify(source, instrument, data_type)
+        return gaps
+
     # }}}
     @classmethod  # convert  # {{{
     async def convert(cls, task: ConvertTask) -> None:
@@ -8,10 +8,13 @@
 
 from __future__ import annotations
 
+import hashlib
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import UTC, datetime, timedelta
 from typing import Optional
 
+import numpy as np
+
 from avin.config import Usr
 from avin.data.data_source import DataSource
 from avin.data.data_type import DataType
@@ -19,6 +22,8 @@ from avin.data.instrument import Instrument
 from avin.keeper import Keeper
 from avin.utils import logger
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
 
 @dataclass  # _Bar# {{{
 class _Bar:
@@ -55,8 +60,145 @@ class _Bar:
     # }}}
 
 
+# }}}
+class BarArray:  # {{{
+    """Bars as columns of numpy arrays
+
+    dt    - datetime64[ns], UTC
+    open, high, low, close - float64
+    vol   - int64
+
+    Request from db: Keeper.get(BarArray, instrument=, timeframe=, ...)
+    """
+
+    def __init__(  # {{{
+        self,
+        dt: np.ndarray,
+        open: np.ndarray,
+        high: np.ndarray,
+        low: np.ndarray,
+        close: np.ndarray,
+        vol: np.ndarray,
+    ):
+        assert len(dt) == len(open) == len(high) == len(low) == len(close)
+        assert len(dt) == len(vol)
+
+        self.dt = dt
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.vol = vol
+
+    # }}}
+    def __len__(self):  # {{{
+        return len(self.dt)
+
+    # }}}
+    def __getitem__(  # {{{
+        self, key: int | slice | np.ndarray
+    ) -> _Bar | BarArray:
+        # slice, bool mask or array of indexes -> BarArray
+        if isinstance(key, (slice, np.ndarray)):
+            return BarArray(
+                self.dt[key],
+                self.open[key],
+                self.high[key],
+                self.low[key],
+                self.close[key],
+                self.vol[key],
+            )
+
+        return _Bar(
+            self.datetime(key),
+            float(self.open[key]),
+            float(self.high[key]),
+            float(self.low[key]),
+            float(self.close[key]),
+            int(self.vol[key]),
+        )
+
+    # }}}
+    def __iter__(self):  # {{{
+        for i in range(len(self)):
+            yield self[i]
+
+    # }}}
+    def datetime(self, i: int) -> datetime:  # {{{
+        """Return dt of bar 'i' as offset-aware python datetime"""
+
+        us = int(self.dt[i].astype("datetime64[us]").astype(np.int64))
+        return _EPOCH + timedelta(microseconds=us)
+
+    # }}}
+    def checksum(self) -> str:  # {{{
+        """Return sha1 of bars columns, for compare of bars data"""
+
+        sha = hashlib.sha1()
+        sha.update(self.dt.astype("datetime64[ns]").astype(np.int64).data)
+        for column in (self.open, self.high, self.low, self.close):
+            sha.update(np.ascontiguousarray(column, np.float64).data)
+        sha.update(np.ascontiguousarray(self.vol, np.int64).data)
+
+        return sha.hexdigest()
+
+    # }}}
+    @classmethod  # empty  # {{{
+    def empty(cls) -> BarArray:
+        return cls(
+            np.empty(0, dtype="datetime64[ns]"),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=np.int64),
+        )
+
+    # }}}
+    @classmethod  # concat  # {{{
+    def concat(cls, arrays: list[BarArray]) -> BarArray:
+        arrays = [i for i in arrays if len(i)]
+        if not arrays:
+            return cls.empty()
+        if len(arrays) == 1:
+            return arrays[0]
+
+        return cls(
+            np.concatenate([i.dt for i in arrays]),
+            np.concatenate([i.open for i in arrays]),
+            np.concatenate([i.high for i in arrays]),
+            np.concatenate([i.low for i in arrays]),
+            np.concatenate([i.close for i in arrays]),
+            np.concatenate([i.vol for i in arrays]),
+        )
+
+    # }}}
+    @classmethod  # fromBars  # {{{
+    def fromBars(cls, bars: list[_Bar]) -> BarArray:
+        """Create columns from list of bars (for tests and small data)"""
+
+        dt = np.array(
+            [b.dt.replace(tzinfo=None) - b.dt.utcoffset() for b in bars],
+            dtype="datetime64[ns]",
+        )
+        return cls(
+            dt,
+            np.array([b.open for b in bars], dtype=np.float64),
+            np.array([b.high for b in bars], dtype=np.float64),
+            np.array([b.low for b in bars], dtype=np.float64),
+            np.array([b.close for b in bars], dtype=np.float64),
+            np.array([b.vol for b in bars], dtype=np.int64),
+        )
+
+    # }}}
+
+
 # }}}
 class _BarsData:  # {{{
+    # (figi, data_type) -> version, it changes on every save and delete,
+    # caches of bars (_ChartCache) drop entries with other version
+    __VERSIONS: dict[tuple[str, DataType], int] = dict()
+
     def __init__(  # {{{
         self,
         source: DataSource,
@@ -107,6 +249,7 @@ class _BarsData:  # {{{
         logger.debug(f"{cls.__name__}.save({data.instrument.ticker})")
 
         await Keeper.add(data)
+        cls.changed(data.instrument, data.type)
 
     # }}}
     @classmethod  # load  # {{{
@@ -164,6 +307,35 @@ class _BarsData:  # {{{
             begin=begin,
             end=end,
         )
+        cls.changed(instrument, data_type)
+
+    # }}}
+    @classmethod  # version  # {{{
+    def version(cls, instrument: Instrument, data_type: DataType) -> int:
+        return cls.__VERSIONS.get((instrument.figi, data_type), 0)
+
+    # }}}
+    @classmethod  # changed  # {{{
+    def changed(cls, instrument: Instrument, data_type: DataType) -> None:
+        """Mark bars of instrument-data_type as changed in database"""
+
+        key = (instrument.figi, data_type)
+        cls.__VERSIONS[key] = cls.__VERSIONS.get(key, 0) + 1
+
+    # }}}
+    @classmethod  # dataVersion  # {{{
+    async def dataVersion(
+        cls, instrument: Instrument, data_type: Optional[DataType] = None
+    ) -> int:
+        """Return counter of changes of bars, kept in database
+
+        Unlike version() it is the same in all processes and after
+        restart. Sum over all data types if data_type is None.
+        """
+
+        return await Keeper.get(
+            _BarsData, instrument=instrument, data_type=data_type
+        )
 
     # }}}
 
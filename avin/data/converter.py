@@ -0,0 +1,174 @@
+#!/usr/bin/env  python3
+# ============================================================================
+# URL:          http://arsvincere.com
+# AUTHOR:       Alex Avin
+# E-MAIL:       mr.alexavin@gmail.com
+# LICENSE:      GNU GPLv3
+# ============================================================================
+
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Optional
+
+import numpy as np
+
+from avin.data.bar import BarArray
+from avin.data.data_type import DataType
+from avin.utils import logger
+
+
+class _Converter:  # {{{
+    """Vectorized conversion of bars into bigger timeframe
+
+    1M -> 5M, 10M, 1H, D  and  D -> W, M.
+
+    Bars are grouped in buckets:
+    - small timeframes: by period, counted from midnight UTC of the
+      first bar date;
+    - W: by weeks from Monday;
+    - M: by calendar months.
+    The converted bar has dt of bucket begin (but not before midnight
+    of the first bar date), open of the first bar, max high, min low,
+    close of the last bar and sum of volumes. Empty buckets are
+    skipped.
+
+    Input may be pushed by chunks (for example one year of 1M bars),
+    then memory depends only on the chunk size. The last bucket of
+    chunk may continue in the next chunk, so its bars are kept until
+    the next push() or finish().
+
+        converter = _Converter(in_type, out_type)
+        for chunk in chunks:
+            out = converter.push(chunk)  # complete converted bars
+        out = converter.finish()  # the last bar
+    """
+
+    def __init__(self, in_type: DataType, out_type: DataType):  # {{{
+        logger.debug(f"{self.__class__.__name__}.__init__()")
+
+        if out_type.toTimeDelta() <= timedelta(days=1):
+            self.__period = np.timedelta64(out_type.toTimeDelta())
+            self.__period = self.__period.astype("timedelta64[ns]")
+        else:
+            assert in_type.toTimeDelta() == timedelta(days=1)
+            assert out_type.value in ("W", "M")
+            self.__period = None
+
+        self.__in_type = in_type
+        self.__out_type = out_type
+        self.__origin: Optional[np.datetime64] = None
+        self.__tail = BarArray.empty()
+
+    # }}}
+    def push(self, bars: BarArray) -> BarArray:  # {{{
+        """Add next chunk of bars, return complete converted bars
+
+        Bars must be sorted by dt, and go after previous chunk.
+        """
+
+        if len(bars) == 0:
+            return BarArray.empty()
+
+        # midnight of the first bar date - begin of the first bucket
+        if self.__origin is None:
+            day = bars.dt[0].astype("datetime64[D]")
+            self.__origin = day.astype("datetime64[ns]")
+
+        bars = BarArray.concat([self.__tail, bars])
+        keys = self.__keys(bars.dt)
+
+        # bars of the last bucket may continue in next chunk - keep it
+        last = int(np.searchsorted(keys, keys[-1], side="left"))
+        self.__tail = bars[last:]
+
+        return self.__join(bars[:last], keys[:last])
+
+    # }}}
+    def finish(self) -> BarArray:  # {{{
+        """Return the last converted bar, kept by push()"""
+
+        bars = self.__tail
+        self.__tail = BarArray.empty()
+        if len(bars) == 0:
+            return bars
+
+        return self.__join(bars, self.__keys(bars.dt))
+
+    # }}}
+
+    @classmethod  # convert  # {{{
+    def convert(
+        cls,
+        bars: BarArray,
+        in_type: DataType,
+        out_type: DataType,
+    ) -> BarArray:
+        """Convert all bars at once"""
+
+        logger.debug(f"{cls.__name__}.convert()")
+
+        converter = cls(in_type, out_type)
+        head = converter.push(bars)
+        tail = converter.finish()
+
+        return BarArray.concat([head, tail])
+
+    # }}}
+
+    def __keys(self, dt: np.ndarray) -> np.ndarray:  # {{{
+        """Return number of bucket for every bar, int64, not decreasing"""
+
+        if self.__period is not None:
+            return (dt - self.__origin) // self.__period
+
+        days = dt.astype("datetime64[D]").astype(np.int64)
+        if self.__out_type.value == "W":
+            # 1970-01-01 is Thursday, (days + 3) % 7 == 0 for Monday
+            return days - (days + 3) % 7
+
+        # "M": months since 1970-01
+        return dt.astype("datetime64[M]").astype(np.int64)
+
+    # }}}
+    def __begins(self, keys: np.ndarray) -> np.ndarray:  # {{{
+        """Return begin datetime64[ns] of buckets"""
+
+        if self.__period is not None:
+            return self.__origin + keys * self.__period
+
+        if self.__out_type.value == "W":
+            begins = keys.astype("datetime64[D]")
+        else:
+            begins = keys.astype("datetime64[M]").astype("datetime64[D]")
+
+        # first bucket begins not before the first bar date
+        begins = begins.astype("datetime64[ns]")
+        return np.maximum(begins, self.__origin)
+
+    # }}}
+    def __join(self, bars: BarArray, keys: np.ndarray) -> BarArray:  # {{{
+        if len(bars) == 0:
+            return BarArray.empty()
+
+        starts = np.flatnonzero(np.diff(keys)) + 1
+        starts = np.concatenate(([0], starts))
+        ends = np.append(starts[1:], len(bars)) - 1
+
+        return BarArray(
+            self.__begins(keys[starts]),
+            bars.open[starts],
+            np.maximum.reduceat(bars.high, starts),
+            np.minimum.reduceat(bars.low, starts),
+            bars.close[ends],
+            np.add.reduceat(bars.vol, starts),
+        )
+
+    # }}}
+
+
+# }}}
+
+
+if __name__ == "__main__":
+    ...
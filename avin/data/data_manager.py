@@ -8,15 +8,26 @@
 
 from __future__ import annotations
 
+import asyncio
+import multiprocessing
+import time
+import weakref
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import UTC, date, datetime, timedelta
+from typing import Optional
+
+import numpy as np
 
 from avin.config import Auto, Usr
-from avin.const import DAY_BEGIN, DAY_END, WeekDays
-from avin.data.bar import _Bar, _BarsData
+from avin.const import DAY_BEGIN
+from avin.data.bar import BarArray, _Bar, _BarsData
 from avin.data.convert_task import ConvertTaskList
+from avin.data.converter import _Converter
 from avin.data.data_info import DataInfo, DataInfoList
 from avin.data.data_source import DataSource
 from avin.data.data_type import DataType
+from avin.data.download_manifest import _DownloadManifest
 from avin.data.instrument import Instrument
 from avin.data.source_moex import _MoexData
 from avin.data.source_tinkoff import _TinkoffData
@@ -28,16 +39,14 @@ class _DataManager:
     __AUTO_UPDATE = Auto.UPDATE_MARKET_DATA
     __LAST_UPDATE_FILE = Cmd.path(Usr.DATA, "last_update")
     __DATA_IS_UP_TO_DATE = None
+    __CONVERT_BATCH = 500_000  # bars
+    __DOWNLOAD_CONCURRENCY = 4  # intervals
 
-    class VoidBar:  # {{{
-        """Utility class for data conversion"""
-
-        def __init__(self, dt: datetime):  # {{{
-            self.dt = dt
-
-        # }}}
-
-    # }}}
+    # NOTE: asyncio.Lock привязан к loop, а тесты и процессы конвертации
+    # запускают разные loop через asyncio.run - храним локи по loop
+    __SAVE_LOCKS: weakref.WeakKeyDictionary[
+        asyncio.AbstractEventLoop, dict[tuple[str, str], asyncio.Lock]
+    ] = weakref.WeakKeyDictionary()
 
     @classmethod  # cacheInstrumentsInfo  # {{{
     async def cacheInstrumentsInfo(cls) -> None:
@@ -108,23 +117,75 @@ class _DataManager:
     # }}}
     @classmethod  # download  # {{{
     async def download(cls, source, instr, data_type, year) -> None:
+        """Download year, or all availible years if year is None
+
+        Intervals already recorded in download manifest are skipped, so
+        an interrupted download resumes from missing intervals.
+        """
         logger.debug(f"{cls.__name__}.download()")
-        # NOTE:
-        # пока грузим все исторические данные только с MOEX
-        assert source == DataSource.MOEX
 
-        # download one year
-        if year is not None:
-            await _MoexData.download(instr, data_type, year)
-            return
+        if year is None:
+            first_dt = await cls.firstDateTime(source, instr, data_type)
+            years = range(first_dt.year, date.today().year + 1)
+        else:
+            years = [year]
 
-        # year is None -> download all availible
-        first_dt = cls.firstDateTime(source, instr, data_type)
-        year = first_dt.year
-        last_year = date.today().year
-        while year <= last_year:
-            await _MoexData.download(instr, data_type, year)
-            year += 1
+        manifest = _DownloadManifest.load(source, instr, data_type)
+        intervals = list()
+        for y in years:
+            intervals += cls.__downloadIntervals(source, data_type, y)
+        missing = [i for i in intervals if not manifest.isDone(*i)]
+
+        logger.info(
+            f":: Download {instr.ticker}-{data_type.value} "
+            f"{len(missing)}/{len(intervals)} intervals"
+        )
+        await cls.__fetchIntervals(manifest, missing)
+
+    # }}}
+    @classmethod  # verify  # {{{
+    async def verify(
+        cls, source, instr, data_type
+    ) -> list[tuple[datetime, datetime]]:
+        """Find gaps of downloaded data and download them again
+
+        Gap is an interval absent in download manifest, or interval
+        which bars in database differ from downloaded (count or
+        checksum). Return list of redownloaded intervals.
+        """
+        logger.debug(f"{cls.__name__}.verify()")
+        logger.info(f":: Verify {instr.ticker}-{data_type.value}")
+
+        first_dt = await cls.firstDateTime(source, instr, data_type)
+        years = range(first_dt.year, date.today().year + 1)
+        manifest = _DownloadManifest.load(source, instr, data_type)
+
+        gaps = list()
+        for year in years:
+            for begin, end in cls.__downloadIntervals(source, data_type, year):
+                record = manifest.find(begin, end)
+                if record is None:
+                    gaps.append((begin, end))
+                    continue
+
+                bars = await Keeper.get(
+                    BarArray,
+                    instrument=instr,
+                    data_type=data_type,
+                    begin=begin,
+                    end=end,
+                )
+                if (
+                    len(bars) != record["count"]
+                    or bars.checksum() != record["checksum"]
+                ):
+                    logger.warning(f"   - broken {begin.date()} {end.date()}")
+                    gaps.append((begin, end))
+
+        logger.info(f"   - found {len(gaps)} gaps")
+        await cls.__fetchIntervals(manifest, gaps)
+
+        return gaps
 
     # }}}
     @classmethod  # convert  # {{{
@@ -132,31 +193,140 @@ class _DataManager:
         logger.debug(f"{cls.__name__}.convert()")
         logger.info(f":: Convert {instr.ticker}-{in_type} -> {out_type}")
 
+        await cls.convertGroup(instr, in_type, [out_type])
+
+    # }}}
+    @classmethod  # convertGroup  # {{{
+    async def convertGroup(
+        cls, instr, in_type, out_types: list
+    ) -> list[tuple[str, float, Optional[str]]]:
+        """Convert one input into some timeframes
+
+        Input is loaded by chunks once, every chunk goes to converters
+        of all out_types. Return (task, seconds, error) for every
+        out_type, seconds - time of convert and save of this task.
+        """
+        logger.debug(f"{cls.__name__}.convertGroup()")
+
+        tasks = [f"{instr.ticker}-{in_type} -> {i}" for i in out_types]
+
         # check availible input data
-        data_info = await DataInfo.load(instr, in_type)
-        if data_info is None:
+        in_info = await DataInfo.load(instr, in_type)
+        if in_info is None:
             logger.error(f"Convert error: no data {instr}-{in_type}")
-            return
+            return [(task, 0.0, "no input data") for task in tasks]
+
+        # check availible converted data, every out_type from its own
+        # last converted bar, or from first availible input bar
+        begins = list()
+        for out_type in out_types:
+            out_info = await DataInfo.load(instr, out_type)
+            if not out_info:
+                begins.append(in_info.first_dt)
+            else:
+                begins.append(out_info.last_dt)
+        end = datetime.combine(date.today(), DAY_BEGIN, UTC)  # to today
+
+        # NOTE: грузим и конвертируем батчами через курсор на сервере,
+        # чтобы память не зависела от длины истории, годы 1М баров
+        # целиком в память не лезут. Следующий батч качается, пока
+        # конвертируется текущий
+        converters = [_Converter(in_type, i) for i in out_types]
+        starts = [np.datetime64(i.replace(tzinfo=None), "ns") for i in begins]
+        seconds = [0.0] * len(out_types)
+        async for in_bars in Keeper.stream(
+            BarArray,
+            batch=cls.__CONVERT_BATCH,
+            instrument=instr,
+            data_type=in_type,
+            begin=min(begins),
+            end=end,
+        ):
+            for i, converter in enumerate(converters):
+                timer = time.perf_counter()
+                first = int(np.searchsorted(in_bars.dt, starts[i]))
+                out_bars = converter.push(in_bars[first:])
+                await cls.__saveConverted(instr, out_types[i], out_bars)
+                seconds[i] += time.perf_counter() - timer
+
+        for i, converter in enumerate(converters):
+            timer = time.perf_counter()
+            out_bars = converter.finish()
+            await cls.__saveConverted(instr, out_types[i], out_bars)
+            seconds[i] += time.perf_counter() - timer
+
+        return [(task, sec, None) for task, sec in zip(tasks, seconds)]
 
-        # check availible converted data
-        data_info = await DataInfo.load(instr, out_type)
-        if not data_info:
-            begin = None  # select from first availible
-            end = datetime.combine(date.today(), DAY_BEGIN, UTC)  # to today
-        else:
-            begin = data_info.last_dt  # select from last converted
-            end = datetime.combine(date.today(), DAY_BEGIN, UTC)  # to today
+    # }}}
+    @classmethod  # convertAll  # {{{
+    async def convertAll(
+        cls, clist: ConvertTaskList, workers: Optional[int] = None
+    ) -> None:
+        """Run convert tasks in a pool of processes
 
-        # load in_type data
-        in_data = await _BarsData.load(instr, in_type, begin, end)
+        Tasks with the same input (instrument, in_type) are grouped,
+        the input is loaded once per group. Group, whose input is made
+        by other group of the same instrument (1M -> D, D -> W), waits
+        for it: groups run in waves, groups of one wave - in parallel.
+        A failed group does not stop the others.
 
-        # convert bars
-        converter = cls.__choseConverter(out_type)
-        out_bars = converter(in_data.bars, in_type, out_type)
+        workers - count of processes, default Auto.CONVERT_WORKERS
+        """
+        logger.info(f":: Convert {clist}")
 
-        # save converted data
-        data = _BarsData(DataSource.CONVERT, instr, out_type, out_bars)
-        await _BarsData.save(data)
+        workers = workers or Auto.CONVERT_WORKERS
+
+        # group tasks by input
+        groups: dict[tuple[str, str], list[str]] = defaultdict(list)
+        for task in clist:
+            key = (task.instrument.figi, str(task.in_type))
+            groups[key].append(str(task.out_type))
+
+        begin = time.perf_counter()
+        results = list()
+        if workers <= 1:
+            for wave in _convertWaves(groups):
+                for figi, in_type in wave:
+                    out_types = groups[(figi, in_type)]
+                    timing = await _convertGroup(figi, in_type, out_types)
+                    results.append(timing)
+        else:
+            # NOTE: spawn - в дочерний процесс не должны попасть
+            # event loop и пул соединений с БД родителя
+            loop = asyncio.get_running_loop()
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(workers, mp_context=context) as pool:
+                for wave in _convertWaves(groups):
+                    jobs = [
+                        loop.run_in_executor(
+                            pool,
+                            _convertProcess,
+                            figi,
+                            in_type,
+                            groups[(figi, in_type)],
+                        )
+                        for figi, in_type in wave
+                    ]
+                    results.extend(await asyncio.gather(*jobs))
+
+        # in pool bars are saved by other processes, caches of this
+        # process must see, that they changed
+        for task in clist:
+            _BarsData.changed(task.instrument, task.out_type)
+
+        # report
+        for task_timing in results:
+            for task, seconds, error in task_timing:
+                if error is None:
+                    logger.info(f"   - {task} {seconds:.2f} sec")
+                else:
+                    logger.error(f"   - {task} failed, {error}")
+
+        seconds = time.perf_counter() - begin
+        logger.info(
+            f"   {len(clist)} tasks in {len(groups)} groups, "
+            f"{workers} workers, {seconds:.2f} sec"
+        )
 
     # }}}
     @classmethod  # delete  # {{{
@@ -183,20 +353,29 @@ class _DataManager:
     # }}}
     @classmethod  # updateAll  # {{{
     async def updateAll(cls) -> None:
+        """Update all market data, then run convert tasks
+
+        Nodes are updated concurrently, every data source limits its
+        own requests by MAX_CONCURRENT_REQUESTS and
+        MAX_REQUESTS_PER_SEC. While one node waits for network, bars
+        of other nodes are saved. A failed node is reported and does
+        not stop the others.
+        """
         logger.info(":: Update all market data")
 
         # update
+        begin = time.perf_counter()
         data_info = await DataInfoList.load()  # load all
-        for node in data_info:
-            await cls.__update(node)
+        nodes = [i for i in data_info if i.source != DataSource.CONVERT]
+        results = await asyncio.gather(*[cls.__update(i) for i in nodes])
+        cls.__updateReport(results, time.perf_counter() - begin)
 
         # convert timeframes
         if not Auto.CONVERT_MARKET_DATA:
             return
 
         clist = await ConvertTaskList.load("convert_list")
-        for task in clist:
-            await cls.convert(task.instrument, task.in_type, task.out_type)
+        await cls.convertAll(clist)
 
         # save last update datetime
         dt = now().isoformat()
@@ -258,191 +437,279 @@ class _DataManager:
         cls.__DATA_IS_UP_TO_DATE = True
 
     # }}}
-    @classmethod  # __fillVoid  # {{{
-    def __fillVoid(cls, bars: list[_Bar], data_type: DataType) -> list[_Bar]:
-        logger.debug(f"{cls.__name__}.__fillVoid()")
-
-        time = datetime.combine(bars[0].dt.date(), DAY_BEGIN)
-        end = datetime.combine(bars[-1].dt.date(), DAY_END)
-        step = data_type.toTimeDelta()
-
-        i = 0
-        filled = list()
-        while time <= end:
-            if i < len(bars) and time == bars[i].dt:
-                filled.append(bars[i])
-                i += 1
-            else:
-                filled.append(cls.VoidBar(time))
-            time += step
+    @classmethod  # __downloadIntervals  # {{{
+    def __downloadIntervals(
+        cls, source, data_type, year
+    ) -> list[tuple[datetime, datetime]]:
+        """Split year into intervals, that are downloaded as a whole
+
+        Tinkoff give archive of year, MOEX intraday bars are downloaded
+        by months, other by years. The last interval ends today.
+        """
+        logger.debug(f"{cls.__name__}.__downloadIntervals()")
 
-        return filled
+        today = datetime.combine(date.today(), DAY_BEGIN, UTC)
+        intraday = data_type.toTimeDelta() < timedelta(days=1)
+        if source == DataSource.MOEX and intraday:
+            begins = [datetime(year, m, 1, tzinfo=UTC) for m in range(1, 13)]
+        else:
+            begins = [datetime(year, 1, 1, tzinfo=UTC)]
+        begins.append(datetime(year + 1, 1, 1, tzinfo=UTC))
 
-    # }}}
-    @classmethod  # __removeVoid  # {{{
-    def __removeVoid(cls, bars: list) -> list:
-        logger.debug(f"{cls.__name__}.__removeVoid()")
-
-        i = 0
-        while i < len(bars):
-            if isinstance(bars[i], cls.VoidBar):
-                bars.pop(i)
-            else:
-                i += 1
+        intervals = list()
+        for begin, end in zip(begins, begins[1:]):
+            if begin >= today:
+                break
+            intervals.append((begin, min(end, today)))
 
-        return bars
+        return intervals
 
     # }}}
-    @classmethod  # __choseConverter  # {{{
-    def __choseConverter(cls, out_type: DataType) -> Callable:
-        logger.debug(f"{cls.__name__}.__choseConverter()")
+    @classmethod  # __fetchIntervals  # {{{
+    async def __fetchIntervals(cls, manifest, intervals) -> None:
+        logger.debug(f"{cls.__name__}.__fetchIntervals()")
 
-        if out_type.toTimeDelta() <= timedelta(days=1):
-            conv = cls.__convertSmallTimeFrame
-        elif out_type.value == "W":
-            conv = cls.__convertWeekTimeFrame
-        elif out_type.value == "M":
-            conv = cls.__convertMonthTimeFrame
+        semaphore = asyncio.Semaphore(cls.__DOWNLOAD_CONCURRENCY)
 
-        return conv
+        async def fetch(begin, end):
+            async with semaphore:
+                await cls.__fetchInterval(manifest, begin, end)
 
-    # }}}
-    @classmethod  # __convertSmallTimeFrame  # {{{
-    def __convertSmallTimeFrame(cls, bars, in_type, out_type):
-        logger.debug(f"{cls.__name__}.__convertSmallTimeFrame()")
-
-        bars = cls.__fillVoid(bars, in_type)
-        period = out_type.toTimeDelta()
-
-        converted = list()
-        i = 0
-        while i < len(bars):
-            first = i
-            last = i
-            while last < len(bars):
-                time_dif = bars[last].dt - bars[first].dt
-                if time_dif < period:
-                    last += 1
-                else:
-                    break
-
-            new_bar = cls.__join(bars[first:last])
-            if new_bar is not None:
-                converted.append(new_bar)
+        results = await asyncio.gather(
+            *[fetch(b, e) for b, e in intervals], return_exceptions=True
+        )
 
-            i = last
+        # NOTE: неудачный интервал не попал в манифест, при следующем
+        # запуске download он будет скачан снова
+        for (begin, end), result in zip(intervals, results):
+            if isinstance(result, Exception):
+                logger.error(
+                    f"   - failed {begin.date()} {end.date()}, "
+                    f"{type(result).__name__}: {result}"
+                )
 
-        return converted
+    # }}}
+    @classmethod  # __fetchInterval  # {{{
+    async def __fetchInterval(cls, manifest, begin, end) -> None:
+        logger.debug(f"{cls.__name__}.__fetchInterval()")
+
+        source = manifest.source
+        instr = manifest.instrument
+        data_type = manifest.type
+
+        # request bars
+        if source == DataSource.TINKOFF:
+            bars = await _TinkoffData.getArchiveBars(instr, begin.year)
+            if bars is None:
+                raise ConnectionError(f"no archive {instr.ticker} {begin}")
+        else:
+            source_class = cls.__getDataSourceClass(source)
+            bars = await source_class.getHistoricalBars(
+                instr, data_type, begin, end
+            )
+            bars = BarArray.fromBars(bars) if bars else BarArray.empty()
+
+        # save bars, requests of intervals go in parallel, but saves
+        # into one table - one by one: they create table, partitions
+        # and row of DataInfo
+        if len(bars) > 0:
+            data = _BarsData(source, instr, data_type, bars)
+            async with cls.__saveLock(instr, data_type):
+                await _BarsData.save(data)
+
+        # record interval, with checksum only bars inside of interval
+        first = np.datetime64(begin.replace(tzinfo=None), "ns")
+        last = np.datetime64(end.replace(tzinfo=None), "ns")
+        inside = bars[(bars.dt >= first) & (bars.dt < last)]
+        manifest.add(begin, end, inside)
+        _DownloadManifest.save(manifest)
+
+        logger.info(
+            f"   - {instr.ticker}-{data_type.value} "
+            f"{begin.date()} {end.date()} {len(inside)} bars"
+        )
 
     # }}}
-    @classmethod  # __convertWeekTimeFrame  # {{{
-    def __convertWeekTimeFrame(cls, bars, in_type, out_type):
-        logger.debug(f"{cls.__name__}.__convertWeekTimeFrame()")
-        assert in_type.toTimeDelta() == timedelta(days=1)
-
-        bars = cls.__fillVoid(bars, in_type)
-        first = 0
-        last = 0
-        converted = list()
-        while last < len(bars):
-            while last < len(bars):
-                if bars[last].dt.weekday() == WeekDays.Mon.value:
-                    break
-                else:
-                    last += 1
-            new_bar = cls.__join(bars[first:last])
-            if new_bar is not None:
-                converted.append(new_bar)
-            first = last
-            last += 1
+    @classmethod  # __saveLock  # {{{
+    def __saveLock(cls, instr, data_type) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        locks = cls.__SAVE_LOCKS.setdefault(loop, dict())
+        key = (instr.figi, data_type.name)
+        if key not in locks:
+            locks[key] = asyncio.Lock()
 
-        return converted
+        return locks[key]
 
     # }}}
-    @classmethod  # __convertMonthTimeFrame  # {{{
-    def __convertMonthTimeFrame(cls, bars, in_type, out_type):
-        logger.debug(f"{cls.__name__}.__convertMonthTimeFrame()")
-        assert in_type.toTimeDelta() == timedelta(days=1)
-
-        bars = cls.__fillVoid(bars, in_type)
-        first = 0
-        last = 0
-        converted = list()
-        while last < len(bars):
-            while last < len(bars):
-                if bars[last].dt.day == 1:
-                    break
-                last += 1
-            new_bar = cls.__join(bars[first:last])
-            if new_bar is not None:
-                converted.append(new_bar)
-            first = last
-            last += 1
-
-        return converted
-
-    # }}}
-    @classmethod  # __join  # {{{
-    def __join(cls, bars):
-        """
-        Возвращает объединенный bar из bars, игнорируюя VoidBar
-        Если все бары VoidBar, возвращает None
-        """
-        logger.debug(f"{cls.__name__}.__convertMonthTimeFrame()")
+    @classmethod  # __saveConverted  # {{{
+    async def __saveConverted(cls, instr, data_type, bars: BarArray):
+        logger.debug(f"{cls.__name__}.__saveConverted()")
 
         if len(bars) == 0:
-            return None
-
-        dt_first_bar = bars[0].dt  # join_bar.dt == first bar dt
-        bars = cls.__removeVoid(bars)
-
-        # join
-        if len(bars) > 0:
-            opn = bars[0].open
-            hgh = max([bar.high for bar in bars])
-            low = min([bar.low for bar in bars])
-            close = bars[-1].close
-            volume = sum([bar.vol for bar in bars])
-            join_bar = _Bar(dt_first_bar, opn, hgh, low, close, volume)
-            return join_bar
+            return
 
-        return None  # возвращаем None, если не было баров с данными
+        data = _BarsData(DataSource.CONVERT, instr, data_type, bars)
+        await _BarsData.save(data)
 
     # }}}
     @classmethod  # __update  # {{{
-    async def __update(cls, node):
-        logger.debug(f"{cls.__name__}.__update()")
+    async def __update(
+        cls, node
+    ) -> tuple[str, int, float, float, Optional[str]]:
+        """Request and save new bars of node
 
-        # If the data is obtained by convertation, go out
-        if node.source == DataSource.CONVERT:
-            return
+        Return (task, count of new bars, request sec, save sec, error)
+        """
+        logger.debug(f"{cls.__name__}.__update()")
 
         instr = node.instrument
         data_type = node.data_type
         source = node.source
+        task = f"{instr.ticker}-{data_type.value}"
+
+        # If the data is obtained by convertation, go out
+        if source == DataSource.CONVERT:
+            return (task, 0, 0.0, 0.0, None)
+
         source_class = cls.__getDataSourceClass(source)
         last_dt = node.last_dt
-        logger.info(f"   Updating {instr.ticker}-{data_type.value}")
+        logger.info(f"   Updating {task}")
+
+        request_sec = 0.0
+        save_sec = 0.0
+        try:
+            # request new bars
+            begin = last_dt + data_type.toTimeDelta()
+            end = now().replace(microsecond=0)
+            timer = time.perf_counter()
+            new_bars = await source_class.getHistoricalBars(
+                instr, data_type, begin, end
+            )
+            request_sec = time.perf_counter() - timer
+
+            # check: is new bars found
+            count = len(new_bars)
+            if count == 0:
+                logger.info(f"   - {task} no new bars")
+                return (task, 0, request_sec, save_sec, None)
+
+            # save new bars
+            logger.info(f"   - {task} received {count} bars")
+            timer = time.perf_counter()
+            new_data = _BarsData(source, instr, data_type, new_bars)
+            await _BarsData.save(new_data)
+            save_sec = time.perf_counter() - timer
+
+        except Exception as err:
+            logger.exception(err)
+            error = f"{type(err).__name__}: {err}"
+            return (task, 0, request_sec, save_sec, error)
+
+        return (task, count, request_sec, save_sec, None)
 
-        # request new bars
-        begin = last_dt + data_type.toTimeDelta()
-        end = now().replace(microsecond=0)
-        new_bars = await source_class.getHistoricalBars(
-            instr, data_type, begin, end
+    # }}}
+    @classmethod  # __updateReport  # {{{
+    def __updateReport(cls, results: list, seconds: float) -> None:
+        logger.debug(f"{cls.__name__}.__updateReport()")
+
+        logger.info(":: Update report")
+        total = 0
+        failed = 0
+        for task, count, request_sec, save_sec, error in results:
+            if error is not None:
+                failed += 1
+                logger.error(f"   {task:<12} failed, {error}")
+                continue
+
+            total += count
+            logger.info(
+                f"   {task:<12} {count:>7} bars  "
+                f"request {request_sec:6.2f} sec  save {save_sec:6.2f} sec"
+            )
+
+        logger.info(
+            f"   {len(results)} nodes, {failed} failed, {total} bars, "
+            f"{seconds:.2f} sec"
         )
 
-        # check: is new bars found
-        count = len(new_bars)
-        if count == 0:
-            logger.info("   - no new bars")
-            return
+    # }}}
 
-        # save new bars
-        logger.info(f"   - received {count} bars -> {new_bars[-1].dt}")
-        new_data = _BarsData(source, instr, data_type, new_bars)
-        await _BarsData.save(new_data)
 
-    # }}}
+async def _convertGroup(  # {{{
+    figi: str, in_type_str: str, out_type_strs: list[str]
+) -> list[tuple[str, float, Optional[str]]]:
+    try:
+        instr = await Instrument.fromFigi(figi)
+        in_type = DataType.fromStr(in_type_str)
+        out_types = [DataType.fromStr(i) for i in out_type_strs]
+        return await _DataManager.convertGroup(
+            instr, in_type, out_types
+        )
+
+    except Exception as err:
+        logger.exception(err)
+        error = f"{type(err).__name__}: {err}"
+        return [
+            (f"{figi}-{in_type_str} -> {i}", 0.0, error)
+            for i in out_type_strs
+        ]
+
+
+# }}}
+def _convertWaves(  # {{{
+    groups: dict[tuple[str, str], list[str]],
+) -> list[list[tuple[str, str]]]:
+    """Split convert groups (figi, in_type) -> out_types into waves
+
+    Group goes to the wave after all groups of the same figi, that
+    make its in_type. Groups of one wave don't depend on each other.
+    """
+
+    waves: dict[tuple[str, str], int] = dict()
+
+    def wave(key, chain):
+        if key in waves:
+            return waves[key]
+        if key in chain:  # cycle, D -> W -> D, don't wait
+            return 0
+
+        figi, in_type = key
+        producers = [
+            other
+            for other, out_types in groups.items()
+            if other[0] == figi and other != key and in_type in out_types
+        ]
+        waves[key] = max(
+            (wave(i, chain | {key}) + 1 for i in producers), default=0
+        )
+        return waves[key]
+
+    result: list[list[tuple[str, str]]] = list()
+    for key in groups:
+        n = wave(key, frozenset())
+        while len(result) <= n:
+            result.append(list())
+        result[n].append(key)
+
+    return result
+
+
+# }}}
+def _convertProcess(  # {{{
+    figi: str, in_type_str: str, out_type_strs: list[str]
+) -> list[tuple[str, float, Optional[str]]]:
+    """Entry point of worker process for _DataManager.convertAll"""
+
+    async def run():
+        try:
+            return await _convertGroup(figi, in_type_str, out_type_strs)
+        finally:
+            await Keeper.close()
+
+    return asyncio.run(run())
+
+
+# }}}
 
 
 if __name__ == "__main__":
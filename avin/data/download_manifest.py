@@ -0,0 +1,166 @@
+#!/usr/bin/env  python3
+# ============================================================================
+# URL:          http://arsvincere.com
+# AUTHOR:       Alex Avin
+# E-MAIL:       mr.alexavin@gmail.com
+# LICENSE:      GNU GPLv3
+# ============================================================================
+
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Optional
+
+from avin.config import Usr
+from avin.data.bar import BarArray
+from avin.data.data_source import DataSource
+from avin.data.data_type import DataType
+from avin.data.instrument import Instrument
+from avin.utils import Cmd, logger, now
+
+
+class _DownloadManifest:
+    """Record of downloaded intervals of market data
+
+    One manifest for (source, instrument, data_type), saved as json in
+    'usr/data/download/<source>/<figi>_<data_type>.json'. Every
+    successfully downloaded interval [begin, end) is recorded with count
+    of bars and checksum of bars, so an interrupted download resumes
+    only missing intervals, and saved data can be verified.
+    """
+
+    def __init__(  # {{{
+        self,
+        source: DataSource,
+        instrument: Instrument,
+        data_type: DataType,
+        records: Optional[list[dict]] = None,
+    ):
+        self.__source = source
+        self.__instrument = instrument
+        self.__type = data_type
+        self.__records = records or list()
+
+    # }}}
+
+    @property  # source  # {{{
+    def source(self):
+        return self.__source
+
+    # }}}
+    @property  # instrument  # {{{
+    def instrument(self):
+        return self.__instrument
+
+    # }}}
+    @property  # type  # {{{
+    def type(self):
+        return self.__type
+
+    # }}}
+    @property  # records  # {{{
+    def records(self) -> list[dict]:
+        return self.__records
+
+    # }}}
+
+    def find(self, begin: datetime, end: datetime) -> Optional[dict]:  # {{{
+        """Return record, which covers interval [begin, end), or None"""
+
+        begin = begin.isoformat()
+        end = end.isoformat()
+        for record in self.__records:
+            if record["begin"] <= begin and end <= record["end"]:
+                return record
+
+        return None
+
+    # }}}
+    def isDone(self, begin: datetime, end: datetime) -> bool:  # {{{
+        return self.find(begin, end) is not None
+
+    # }}}
+    def add(self, begin: datetime, end: datetime, bars: BarArray):  # {{{
+        """Record downloaded interval, bars - only bars of [begin, end)"""
+
+        self.remove(begin, end)
+        record = {
+            "begin": begin.isoformat(),
+            "end": end.isoformat(),
+            "count": len(bars),
+            "checksum": bars.checksum(),
+            "downloaded": now().isoformat(),
+        }
+        self.__records.append(record)
+        self.__records.sort(key=lambda i: i["begin"])
+
+    # }}}
+    def remove(self, begin: datetime, end: datetime):  # {{{
+        """Remove records inside of interval [begin, end)"""
+
+        begin = begin.isoformat()
+        end = end.isoformat()
+        self.__records = [
+            i
+            for i in self.__records
+            if not (begin <= i["begin"] and i["end"] <= end)
+        ]
+
+    # }}}
+
+    @classmethod  # save  # {{{
+    def save(cls, manifest: _DownloadManifest) -> None:
+        logger.debug(f"{cls.__name__}.save()")
+
+        file_path = cls.__path(
+            manifest.source, manifest.instrument, manifest.type
+        )
+        Cmd.saveJson(manifest.records, file_path)
+
+    # }}}
+    @classmethod  # load  # {{{
+    def load(
+        cls,
+        source: DataSource,
+        instrument: Instrument,
+        data_type: DataType,
+    ) -> _DownloadManifest:
+        logger.debug(f"{cls.__name__}.load()")
+
+        file_path = cls.__path(source, instrument, data_type)
+        if not Cmd.isExist(file_path):
+            return cls(source, instrument, data_type)
+
+        records = Cmd.loadJson(file_path)
+        return cls(source, instrument, data_type, records)
+
+    # }}}
+    @classmethod  # delete  # {{{
+    def delete(
+        cls,
+        source: DataSource,
+        instrument: Instrument,
+        data_type: DataType,
+    ) -> None:
+        logger.debug(f"{cls.__name__}.delete()")
+
+        file_path = cls.__path(source, instrument, data_type)
+        if Cmd.isExist(file_path):
+            Cmd.delete(file_path)
+
+    # }}}
+
+    @classmethod  # __path  # {{{
+    def __path(cls, source, instrument, data_type) -> str:
+        return Cmd.path(
+            Usr.DATA,
+            "download",
+            source.name.lower(),
+            f"{instrument.figi}_{data_type.value}.json",
+        )
+
+    # }}}
+
+
+if __name__ == "__main__":
+    ...
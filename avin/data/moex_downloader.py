@@ -0,0 +1,247 @@
+#!/usr/bin/env  python3
+# ============================================================================
+# URL:          http://arsvincere.com
+# AUTHOR:       Alex Avin
+# E-MAIL:       mr.alexavin@gmail.com
+# LICENSE:      GNU GPLv3
+# ============================================================================
+
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Callable, NamedTuple, Optional
+
+import httpx
+
+from avin.data.data_type import DataType
+from avin.data.instrument import Instrument
+from avin.utils import RateLimiter, logger
+
+
+class _MoexCandle(NamedTuple):  # {{{
+    begin: datetime  # MSK, offset-naive
+    end: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+
+
+# }}}
+class _MoexDownloader:  # {{{
+    """Async downloader of candles from MOEX ISS
+
+    Requested period is split into windows (one day for 1M, a week
+    for 10M, a month for 1H, a year for D, W, M - about one or two
+    pages of ISS response). All windows are requested concurrently,
+    the budget of requests is limited by RateLimiter. A failed request
+    is repeated with exponential backoff, without blocking event loop.
+
+        downloader = _MoexDownloader(concurrency=4, rate=5)
+        candles = await downloader.candles(instr, data_type, begin, end)
+
+    base_url can be changed to a local fake server for tests.
+    """
+
+    ISS_URL = "https://iss.moex.com/iss"
+    PAGE_SIZE = 500  # max candles in one response of ISS
+
+    MARKETS = {
+        Instrument.Type.INDEX: "engines/stock/markets/index",
+        Instrument.Type.SHARE: "engines/stock/markets/shares",
+        Instrument.Type.ETF: "engines/stock/markets/shares",
+        Instrument.Type.BOND: "engines/stock/markets/bonds",
+        Instrument.Type.FUTURE: "engines/futures/markets/forts",
+        Instrument.Type.CURRENCY: "engines/currency/markets/selt",
+    }
+    INTERVALS = {"1M": 1, "10M": 10, "1H": 60, "D": 24, "W": 7, "M": 31}
+    WINDOWS = {
+        "1M": timedelta(days=1),
+        "10M": timedelta(days=7),
+        "1H": timedelta(days=31),
+        "D": timedelta(days=366),
+        "W": timedelta(days=366),
+        "M": timedelta(days=366),
+    }
+
+    def __init__(  # {{{
+        self,
+        concurrency: int = 4,
+        rate: float = 5,
+        attempts: int = 5,
+        backoff: float = 1.0,
+        timeout: float = 30.0,
+        base_url: str = ISS_URL,
+        cookies: Optional[dict] = None,
+        limiter: Optional[RateLimiter] = None,
+        progress: Optional[Callable[[str, int, int], None]] = None,
+    ):
+        logger.debug(f"{self.__class__.__name__}.__init__()")
+
+        self.__limiter = limiter or RateLimiter(concurrency, rate)
+        self.__attempts = attempts
+        self.__backoff = backoff
+        self.__timeout = timeout
+        self.__base_url = base_url
+        self.__cookies = cookies
+        self.__progress = progress or self.__logProgress
+
+    # }}}
+    async def candles(  # {{{
+        self,
+        instrument: Instrument,
+        data_type: DataType,
+        begin: datetime,
+        end: datetime,
+    ) -> list[_MoexCandle]:
+        """Return candles with begin in [begin, end)
+
+        begin, end - Moscow time, offset-naive, as MOEX use.
+        """
+        logger.debug(f"{self.__class__.__name__}.candles()")
+
+        market = self.MARKETS[instrument.type]
+        path = f"{market}/securities/{instrument.ticker}/candles.json"
+        interval = self.INTERVALS[data_type.value]
+        task = f"{instrument.ticker}-{data_type.value}"
+
+        windows = self.__windows(data_type, begin, end)
+        done = 0
+
+        async def request(client, window_begin, window_till):
+            nonlocal done
+            candles = await self.__requestWindow(
+                client, path, interval, window_begin, window_till
+            )
+            done += 1
+            self.__progress(task, done, len(windows))
+            return candles
+
+        async with httpx.AsyncClient(
+            base_url=self.__base_url,
+            timeout=self.__timeout,
+            cookies=self.__cookies,
+        ) as client:
+            results = await asyncio.gather(
+                *[request(client, b, t) for b, t in windows],
+                return_exceptions=True,
+            )
+
+        all_candles = list()
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+            all_candles += result
+
+        # NOTE: MOEX отдает свечи в закрытом интервале [from, till],
+        # оставляем только [begin, end)
+        return [i for i in all_candles if begin <= i.begin < end]
+
+    # }}}
+
+    def __windows(  # {{{
+        self, data_type: DataType, begin: datetime, end: datetime
+    ) -> list[tuple[datetime, datetime]]:
+        """Return list of (from, till), till is inclusive for ISS"""
+
+        size = self.WINDOWS[data_type.value]
+        current = datetime.combine(begin.date(), datetime.min.time())
+
+        windows = list()
+        while current < end:
+            window_begin = max(current, begin)
+            window_till = min(current + size, end) - timedelta(seconds=1)
+            windows.append((window_begin, window_till))
+            current += size
+
+        return windows
+
+    # }}}
+    async def __requestWindow(  # {{{
+        self,
+        client: httpx.AsyncClient,
+        path: str,
+        interval: int,
+        begin: datetime,
+        till: datetime,
+    ) -> list[_MoexCandle]:
+        params = {
+            "from": begin.strftime("%Y-%m-%d %H:%M:%S"),
+            "till": till.strftime("%Y-%m-%d %H:%M:%S"),
+            "interval": interval,
+            "iss.meta": "off",
+            "iss.only": "candles",
+        }
+
+        candles = list()
+        start = 0
+        while True:
+            data = await self.__get(client, path, params | {"start": start})
+            columns = data["candles"]["columns"]
+            rows = data["candles"]["data"]
+            candles += [self.__toCandle(columns, row) for row in rows]
+
+            if len(rows) < self.PAGE_SIZE:
+                return candles
+            start += len(rows)
+
+    # }}}
+    async def __get(  # {{{
+        self, client: httpx.AsyncClient, path: str, params: dict
+    ) -> dict:
+        for attempt in range(self.__attempts):
+            try:
+                async with self.__limiter:
+                    response = await client.get(path, params=params)
+                response.raise_for_status()
+                return response.json()
+
+            except httpx.HTTPStatusError as err:
+                # 4xx except 429 'Too Many Requests' - repeat is useless
+                status = err.response.status_code
+                if status < 500 and status != 429:
+                    raise
+                error = err
+            except httpx.TransportError as err:
+                error = err
+
+            delay = self.__backoff * 2**attempt
+            logger.warning(
+                f"MOEX request error {type(error).__name__} {error}, "
+                f"try again after {delay} sec"
+            )
+            await asyncio.sleep(delay)
+
+        logger.critical(f"Can't download data {path} {params}")
+        raise ConnectionError(f"Can't download {path} {params['from']}")
+
+    # }}}
+    def __toCandle(self, columns: list[str], row: list) -> _MoexCandle:  # {{{
+        record = dict(zip(columns, row))
+        return _MoexCandle(
+            begin=datetime.fromisoformat(record["begin"]),
+            end=datetime.fromisoformat(record["end"]),
+            open=record["open"],
+            high=record["high"],
+            low=record["low"],
+            close=record["close"],
+            volume=record["volume"],
+        )
+
+    # }}}
+    def __logProgress(self, task: str, done: int, total: int):  # {{{
+        # log every 10%, and always the last window
+        step = max(1, total // 10)
+        if done % step == 0 or done == total:
+            logger.info(f"   - request {task} {done}/{total}")
+
+    # }}}
+
+
+# }}}
+
+
+if __name__ == "__main__":
+    ...
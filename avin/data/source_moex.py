@@ -8,14 +8,15 @@
 
 from __future__ import annotations
 
-import time as timer
-from datetime import UTC, date, datetime, time, timedelta
+import asyncio
+from datetime import UTC, date, datetime, timedelta
+from typing import Optional
+from weakref import WeakKeyDictionary
 
-import httpx
 import moexalgo
 
 from avin.config import Auto, Usr
-from avin.const import ONE_DAY, ONE_WEEK
+from avin.const import ONE_WEEK
 from avin.data.abstract_source import _AbstractDataSource
 from avin.data.bar import _Bar, _BarsData
 from avin.data.cache import _InstrumentsInfoCache
@@ -23,8 +24,9 @@ from avin.data.data_source import DataSource
 from avin.data.data_type import DataType
 from avin.data.exchange import Exchange
 from avin.data.instrument import Instrument
+from avin.data.moex_downloader import _MoexCandle, _MoexDownloader
 from avin.keeper import Keeper
-from avin.utils import Cmd, logger
+from avin.utils import Cmd, RateLimiter, logger
 
 # TODO: authorization - тоже ошибки соединения надо обработать
 
@@ -42,7 +44,12 @@ class _MoexData(_AbstractDataSource):
         DataType.BAR_M,
     ]
 
+    # limits for concurrent update of market data
+    MAX_CONCURRENT_REQUESTS = 4
+    MAX_REQUESTS_PER_SEC = 5
+
     __SUB_DIR = "moex"
+    __LIMITERS: WeakKeyDictionary = WeakKeyDictionary()
     __LOGIN = None
     __PASSWORD = None
     __AUTHORIZATION = None
@@ -180,7 +187,7 @@ class _MoexData(_AbstractDataSource):
             f":: Download {instrument.ticker}-{data_type.value} {year}"
         )
         begin, end = cls.__getPeriod(year)
-        candles = cls.__getHistoricalCandles(
+        candles = await cls.__getHistoricalCandles(
             instrument, data_type, begin, end
         )
         if len(candles) == 0:
@@ -216,7 +223,7 @@ class _MoexData(_AbstractDataSource):
         begin = cls.__toMSK(begin)
         end = cls.__toMSK(end)
 
-        candles = cls.__getHistoricalCandles(
+        candles = await cls.__getHistoricalCandles(
             instrument, data_type, begin, end
         )
         bars = cls.__convert(candles)
@@ -388,143 +395,66 @@ class _MoexData(_AbstractDataSource):
 
     # }}}
     @classmethod  # __requestCandles# {{{
-    def __requestCandles(
+    async def __requestCandles(
         cls,
         instrument: Instrument,
         data_type: DataType,
         begin: datetime,
         end: datetime,
-    ) -> list[Candles]:
+    ) -> list[_MoexCandle]:
         logger.debug(f"{cls.__name__}.__requestCandles()")
 
-        # select method
-        period = data_type.toTimeDelta()
-        if period < ONE_DAY:
-            method = cls.__requestCandlesSmallTimeFrame
-        else:
-            method = cls.__requestCandlesBigTimeFrame
-
-        candles = method(instrument, data_type, begin, end)
+        downloader = _MoexDownloader(
+            limiter=cls.__limiter(),
+            cookies=cls.__cookies(),
+        )
+        candles = await downloader.candles(instrument, data_type, begin, end)
         return candles
 
     # }}}
-    @classmethod  # __requestCandlesBigTimeFrame# {{{
-    def __requestCandlesBigTimeFrame(
-        cls,
-        instrument: Instrument,
-        data_type: DataType,
-        begin: datetime,
-        end: datetime,
-    ) -> list[Candles]:
-        logger.debug(f"{cls.__name__}.__requestCandlesBigTimeFrame()")
-
-        all_candles = list()
-        moex_asset = moexalgo.Ticker(instrument.ticker)
-        period = cls.__convert(data_type)
-        current = begin
-
-        while current < end:
-            logger.info(
-                f"   - request {instrument.ticker}-{data_type.value} "
-                f"{current.date()}"
-            )
-            candles = cls.__tryRequestCandless(
-                moex_asset=moex_asset,
-                begin=current,
-                end=current.replace(year=current.year + 1),
-                period=period,
-            )
-            all_candles += candles
-
-            current = current.replace(year=current.year + 1)
-
-        # Fucking MOEX returns candles in closed interval [begin, end]
-        # fix it, return [begin, end)
-        if all_candles and all_candles[-1].begin == end:
-            all_candles.pop(-1)
-
-        return all_candles
-
-    # }}}
-    @classmethod  # __requestCandlesSmallTimeFrame# {{{
-    def __requestCandlesSmallTimeFrame(
-        cls,
-        instrument: Instrument,
-        data_type: DataType,
-        begin: datetime,
-        end: datetime,
-    ) -> list[Candles]:
-        logger.debug(f"{cls.__name__}.__requestCandlesSmallTimeFrame()")
-
-        all_candles = list()
-        moex_asset = moexalgo.Ticker(instrument.ticker)
-        period = cls.__convert(data_type)
-        current = begin
-
-        while current < end:
-            logger.info(
-                f"   - request {instrument.ticker}-{data_type.value} "
-                f"from {current.date()}"
-            )
-            candles = cls.__tryRequestCandless(
-                moex_asset=moex_asset,
-                begin=current,
-                end=datetime.combine(current.date(), time(23, 59)),
-                period=period,
+    @classmethod  # __limiter# {{{
+    def __limiter(cls) -> RateLimiter:
+        logger.debug(f"{cls.__name__}.__limiter()")
+
+        # NOTE: один бюджет запросов на все одновременные загрузки,
+        # RateLimiter привязан к своему event loop, поэтому по одному
+        # на каждый loop
+        loop = asyncio.get_running_loop()
+        limiter = cls.__LIMITERS.get(loop)
+        if limiter is None:
+            limiter = RateLimiter(
+                cls.MAX_CONCURRENT_REQUESTS, cls.MAX_REQUESTS_PER_SEC
             )
-            all_candles += candles
+            cls.__LIMITERS[loop] = limiter
 
-            current = datetime.combine(current.date() + ONE_DAY, time(0, 0))
-
-        return all_candles
+        return limiter
 
     # }}}
-    @classmethod  # __tryRequestCandless  # {{{
-    def __tryRequestCandless(cls, moex_asset, begin, end, period):
-        logger.debug(f"{cls.__name__}.__tryRequestCandles()")
-
-        max_attempt = 5
-        attempt = 0
-        while attempt < 5:
-            try:
-                candles_generator = moex_asset.candles(
-                    start=begin,
-                    end=end,
-                    period=period,
-                    use_dataframe=False,
-                )
-                candles = list()
-                for i in candles_generator:
-                    candles.append(i)
-
-            except httpx.ConnectError as e:
-                logger.error(f"ConnectionError {moex_asset} {period} {e}")
-                logger.info("Try again after 3 sec")
-                timer.sleep(3)
-            except httpx.ConnectTimeout as e:
-                logger.error(f"ConnectionError {moex_asset} {period} {e}")
-                logger.info("Try again after 3 sec")
-                timer.sleep(3)
-            else:
-                return candles
+    @classmethod  # __cookies# {{{
+    def __cookies(cls) -> Optional[dict]:
+        logger.debug(f"{cls.__name__}.__cookies()")
 
-            attempt += 1
+        # certificate of authorized session, for data without delay
+        cert = moexalgo.session.AUTH_CERT
+        if cert is None:
+            return None
 
-        logger.critical("Can't download data")
-        exit(5)
+        return {"MicexPassportCert": cert}
 
     # }}}
     @classmethod  # __getHistoricalCandles# {{{
-    def __getHistoricalCandles(
+    async def __getHistoricalCandles(
         cls,
         instrument: Instrument,
         data_type: DataType,
         begin: datetime,
         end: datetime,
-    ) -> list[Candles]:
+    ) -> list[_MoexCandle]:
         logger.debug(f"{cls.__name__}.__getHistoricalCandles()")
 
-        candles = cls.__requestCandles(instrument, data_type, begin, end)
+        candles = await cls.__requestCandles(
+            instrument, data_type, begin, end
+        )
         if not candles:
             return list()
 
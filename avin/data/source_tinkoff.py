@@ -8,18 +8,28 @@
 
 from __future__ import annotations
 
+import asyncio
+import io
+import zipfile
+from typing import Optional
+from weakref import WeakKeyDictionary
+
+import httpx
+import numpy as np
+import pandas as pd
 import tinkoff.invest as ti
 
 from avin.config import Auto, Usr
-from avin.const import Res
+from avin.const import Res, WeekDays
 from avin.data.abstract_source import _AbstractDataSource
+from avin.data.bar import BarArray, _Bar, _BarsData
 from avin.data.cache import _InstrumentsInfoCache
 from avin.data.data_source import DataSource
 from avin.data.data_type import DataType
 from avin.data.exchange import Exchange
 from avin.data.instrument import Instrument
 from avin.keeper import Keeper
-from avin.utils import Cmd, logger
+from avin.utils import Cmd, RateLimiter, logger
 
 
 class _TinkoffData(_AbstractDataSource):
@@ -36,8 +46,16 @@ class _TinkoffData(_AbstractDataSource):
         DataType.BAR_M,
     ]
 
+    # limits for concurrent update of market data
+    MAX_CONCURRENT_REQUESTS = 4
+    MAX_REQUESTS_PER_SEC = 5
+
     __SUB_DIR = "tinkoff"
     __DOWNLOAD = Cmd.path(Res.DOWNLOAD, __SUB_DIR)
+    __HISTORY_URL = "https://invest-public-api.tinkoff.ru/history-data"
+    __TIMEOUT = 120.0  # sec
+    __ATTEMPTS = 5
+    __LIMITERS: WeakKeyDictionary = WeakKeyDictionary()
     __TARGET = ti.constants.INVEST_GRPC_API
     __TOKEN_PATH = Usr.TINKOFF_TOKEN
     __TOKEN = None
@@ -131,25 +149,48 @@ class _TinkoffData(_AbstractDataSource):
         cls, instrument: Instrument, data_type: DataType, year: int
     ) -> None:
         logger.debug(f"{cls.__name__}.download()")
-        assert False, "переписать на postgres, пока качаю только с МОЕКС"
 
         assert data_type.value == "1M"
+        logger.info(
+            f":: Download {instrument.ticker}-{data_type.value} {year}"
+        )
+        bars = await cls.getArchiveBars(instrument, year)
+        if bars is None or len(bars) == 0:
+            return
+
+        data = _BarsData(cls.source, instrument, data_type, bars)
+        await _BarsData.save(data)
+        logger.info(f"  - saved {len(bars)} bars")
+
+    # }}}
+    @classmethod  # getArchiveBars  # {{{
+    async def getArchiveBars(
+        cls, instrument: Instrument, year: int
+    ) -> Optional[BarArray]:
+        """Download archive of 1M bars of year and parse it
+
+        Return None if archive is not availible.
+        """
+        logger.debug(f"{cls.__name__}.getArchiveBars()")
+
         auth = await cls.__authorizate()
         if not auth:
-            return
+            return None
 
-        logger.info(
-            f":: Download {instrument.ticker}-{data_type.value} from {year}"
-        )
-        cls.__requestHistoricalData(instrument, year)
+        file_path = await cls.__requestHistoricalData(instrument, year)
+        if file_path is None:
+            return None
+
+        # NOTE: парсинг архива - чистый CPU, уводим в поток, чтобы
+        # параллельные загрузки других годов не стояли
+        bars = await asyncio.to_thread(cls.__readArchive, file_path)
+        return bars
 
     # }}}
     @classmethod  # export  # {{{
     async def export(cls) -> None:
         logger.debug(f"{cls.__name__}.export()")
-        assert False, "переписать на postgres, пока качаю только с МОЕКС"
 
-        # FIX: - not exclude holidays files
         logger.info(":: Tinkoff exporting data in standart format")
         files = Cmd.getFiles(
             cls.__DOWNLOAD, full_path=True, include_sub_dir=True
@@ -158,16 +199,15 @@ class _TinkoffData(_AbstractDataSource):
 
         for archive in archives:
             logger.info(f"  - exporting '{archive}'")
-            tmp_dir = Cmd.path(Dir.TMP, cls.__SUB_DIR)
-            Cmd.extract(archive, tmp_dir)
-
-            bars = cls.__loadDataDir(tmp_dir)
-            instrument, data_type = cls.__parseFileName(Cmd.name(archive))
-
-            data = _BarsData(instrument, data_type, bars, Source.TINKOFF)
-            _BarsData.save(data)
+            file_name = Cmd.name(archive, extension=False)
+            instrument, data_type = await cls.__parseFileName(file_name)
+            bars = cls.__readArchive(archive)
+            if len(bars) == 0:
+                logger.warning(f"  - no bars in '{archive}'")
+                continue
 
-            Cmd.deleteDir(tmp_dir)
+            data = _BarsData(cls.source, instrument, data_type, bars)
+            await _BarsData.save(data)
 
         logger.info("Export complete")
 
@@ -175,7 +215,6 @@ class _TinkoffData(_AbstractDataSource):
     @classmethod  # clear  # {{{
     async def clear(cls) -> None:
         logger.debug(f"{cls.__name__}.clear()")
-        assert False, "переписать на postgres, пока качаю только с МОЕКС"
 
         logger.info(":: Clear Tinkoff files")
         path = cls.__DOWNLOAD
@@ -372,102 +411,151 @@ class _TinkoffData(_AbstractDataSource):
 
     # }}}
     @classmethod  # __requestHistoricalData# {{{
-    def __requestHistoricalData(cls, instrument: Instrument, year: int):
+    async def __requestHistoricalData(
+        cls, instrument: Instrument, year: int
+    ) -> Optional[str]:
+        """Download zip archive with 1M bars of year, return file path"""
+
         logger.debug(f"{cls.__name__}.__requestHistoricalData()")
 
         exchange = instrument.exchange.name
         type_ = instrument.type.name
-        figi = instrument.figi
         ticker = instrument.ticker
         file_name = f"{exchange}-{type_}-{ticker}-1M-{year}.zip"
         file_path = Cmd.path(cls.__DOWNLOAD, type_, ticker, file_name)
-        data_url = "https://invest-public-api.tinkoff.ru/history-data"
-
-        bash_command = (
-            f"curl -s --location '{data_url}?figi={figi}&year={year}' "
-            f"-H 'Authorization: Bearer {cls.__TOKEN}' "
-            f"-o {file_name} "
-        )
-        os.system(bash_command)
+        tmp_path = file_path + ".part"
+        Cmd.makeDirs(Cmd.dirPath(file_path))
+
+        url = cls.__HISTORY_URL
+        params = {"figi": instrument.figi, "year": year}
+        headers = {"Authorization": f"Bearer {cls.__TOKEN}"}
+        async with httpx.AsyncClient(timeout=cls.__TIMEOUT) as client:
+            for attempt in range(cls.__ATTEMPTS):
+                async with cls.__limiter():
+                    async with client.stream(
+                        "GET", url, params=params, headers=headers
+                    ) as response:
+                        if response.status_code == 200:
+                            # NOTE: пишем архив потоком во временный файл,
+                            # прерванная загрузка не оставит битый zip
+                            with open(tmp_path, "wb") as file:
+                                async for chunk in response.aiter_bytes():
+                                    file.write(chunk)
+                            Cmd.replace(tmp_path, file_path)
+                            logger.info(f"  - saved {file_path}")
+                            return file_path
+
+                        if response.status_code == 404:
+                            logger.warning(f"  - no data {ticker} {year}")
+                            return None
+
+                        if response.status_code != 429:
+                            logger.error(
+                                f"  - request {ticker} {year} failed, "
+                                f"status={response.status_code}"
+                            )
+                            return None
+
+                        # 429 Too Many Requests - wait the limit reset
+                        reset = response.headers.get("x-ratelimit-reset")
+                        delay = int(reset) if reset else 2**attempt
+
+                logger.warning(
+                    f"  - request limit, {ticker} {year} "
+                    f"try again after {delay} sec"
+                )
+                await asyncio.sleep(delay)
 
-        if Cmd.isExist(file_name):
-            Cmd.replace(file_name, file_path)
-            logger.info(f"  - saved {file_path}")
+        logger.error(f"  - can't download {ticker} {year}")
+        return None
 
     # }}}
-    @classmethod  # __loadDataDir# {{{
-    def __loadDataDir(cls, dir_path):
-        logger.debug(f"{cls.__name__}.__loadDataDir()")
-
-        files = sorted(Cmd.getFiles(dir_path, full_path=True))
-        if cls.EXCLUDE_HOLIDAYS:
-            files = cls.__excludeHolidaysFiles(files)
-        all_bars = list()
-        for file in files:
-            tinkoff_bars = cls.__readTinkoffFile(file)
-            all_bars += tinkoff_bars
-        return all_bars
+    @classmethod  # __limiter# {{{
+    def __limiter(cls) -> RateLimiter:
+        logger.debug(f"{cls.__name__}.__limiter()")
+
+        # NOTE: один бюджет запросов на все одновременные загрузки,
+        # RateLimiter привязан к своему event loop
+        loop = asyncio.get_running_loop()
+        limiter = cls.__LIMITERS.get(loop)
+        if limiter is None:
+            limiter = RateLimiter(
+                cls.MAX_CONCURRENT_REQUESTS, cls.MAX_REQUESTS_PER_SEC
+            )
+            cls.__LIMITERS[loop] = limiter
 
-    # }}}
-    @classmethod  # __excludeHolidaysFiles# {{{
-    def __excludeHolidaysFiles(cls, files):
-        logger.debug(f"{cls.__name__}.__excludeHolidaysFiles()")
-
-        # file name like: '53b67587-96eb-4b41-8e0c-d2e3c0bdd234_20190103.csv'
-        # consist of 'uid_date.csv'
-        i = 0
-        while i < len(files):
-            file = files[i]
-            file_name = Cmd.name(file, extension=False)
-            file_date = date.fromisoformat(file_name.split("_")[1])
-            week_day = file_date.weekday()
-            if WeekDays.isHoliday(week_day):
-                files.pop(i)
-            else:
-                i += 1
-        return files
+        return limiter
 
     # }}}
-    @classmethod  # __excludeHolidaysBars# {{{
-    def __excludeHolidaysBars(cls, bars: list[Bar]) -> list[Bar]:
-        logger.debug(f"{cls.__name__}.__excludeHolidaysBars()")
-
-        i = 0
-        while i < len(bars):
-            week_day = bars[i].dt.weekday()
-            if WeekDays.isHoliday(week_day):
-                bars.pop(i)
-            else:
-                i += 1
-        return bars
+    @classmethod  # __readArchive# {{{
+    def __readArchive(cls, archive_path: str) -> BarArray:
+        """Parse all csv files of zip archive, without extracting
+
+        File name like: '53b67587-96eb-4b41-8e0c-d2e3c0bdd234_20190103.csv',
+        consist of 'uid_date.csv', line of file like:
+        'uid;2019-01-03T07:00:00Z;open;close;high;low;volume;'
+        """
+
+        logger.debug(f"{cls.__name__}.__readArchive()")
+
+        # NOTE: все дневные файлы склеиваются в один буфер и парсятся
+        # за один вызов read_csv - это на порядки быстрее построчного
+        # разбора каждого файла
+        with zipfile.ZipFile(archive_path) as archive:
+            names = sorted(i for i in archive.namelist() if i.endswith(".csv"))
+            parts = list()
+            for name in names:
+                text = archive.read(name)
+                if text and not text.endswith(b"\n"):
+                    text += b"\n"
+                parts.append(text)
+        buffer = b"".join(parts)
+        if not buffer.strip():
+            return BarArray.empty()
 
-    # }}}
-    @classmethod  # __readTinkoffFile# {{{
-    def __readTinkoffFile(cls, file_path):
-        logger.debug(f"{cls.__name__}.__readTinkoffFile()")
+        UID, DATETIME, OPEN, CLOSE, HIGH, LOW, VOLUME = range(7)
+        df = pd.read_csv(
+            io.BytesIO(buffer),
+            sep=";",
+            header=None,
+            usecols=[DATETIME, OPEN, CLOSE, HIGH, LOW, VOLUME],
+            dtype={
+                OPEN: np.float64,
+                CLOSE: np.float64,
+                HIGH: np.float64,
+                LOW: np.float64,
+                VOLUME: np.int64,
+            },
+        )
+        dt = pd.to_datetime(df[DATETIME], utc=True, format="ISO8601")
+        dt = dt.dt.tz_localize(None).to_numpy("datetime64[ns]")
+
+        bars = BarArray(
+            dt,
+            df[OPEN].to_numpy(),
+            df[HIGH].to_numpy(),
+            df[LOW].to_numpy(),
+            df[CLOSE].to_numpy(),
+            df[VOLUME].to_numpy(),
+        )
+        if cls.EXCLUDE_HOLIDAYS:
+            bars = cls.__excludeHolidays(bars)
 
-        tinkoff_bars = list()
-        text = Cmd.loadText(file_path)
-        for line in text:
-            bar = cls.__parseLineTinkoff(line)
-            tinkoff_bars.append(bar)
-        return tinkoff_bars
+        # archive files are daily, but sort and drop duplicates anyway
+        _, index = np.unique(bars.dt, return_index=True)
+        return bars[index]
 
     # }}}
-    @classmethod  # __parseLineTinkoff# {{{
-    def __parseLineTinkoff(cls, line):
-        logger.debug(f"{cls.__name__}.__parseLineTinkoff()")
+    @classmethod  # __excludeHolidays# {{{
+    def __excludeHolidays(cls, bars: BarArray) -> BarArray:
+        logger.debug(f"{cls.__name__}.__excludeHolidays()")
 
-        fields = line.split(";")
-        UID, DATETIME, OPEN, CLOSE, HIGH, LOW, VOLUME = range(7)
-        opn = float(fields[OPEN])
-        cls = float(fields[CLOSE])
-        hgh = float(fields[HIGH])
-        low = float(fields[LOW])
-        vol = int(fields[VOLUME])
-        dt = fields[DATETIME]
-        bar = _Bar(dt, opn, hgh, low, cls, vol)
-        return bar
+        # 1970-01-01 is Thursday, (days + 3) % 7 - number of week day
+        days = bars.dt.astype("datetime64[D]").astype(np.int64)
+        week_day = (days + 3) % 7
+        mask = ~np.isin(week_day, (WeekDays.Sat.value, WeekDays.Sun.value))
+
+        return bars[mask]
 
     # }}}
     @classmethod  # __CandleIntervalFromTimeFrame# {{{
@@ -552,19 +640,15 @@ class _TinkoffData(_AbstractDataSource):
 
     # }}}
     @classmethod  # __parseFileName# {{{
-    def __parseFileName(cls, file_name):
-        logger.debug(f"{cls.__name__}.__getStandartInstrumentType()")
+    async def __parseFileName(cls, file_name) -> tuple[Instrument, DataType]:
+        logger.debug(f"{cls.__name__}.__parseFileName()")
 
+        # file name like: 'MOEX-SHARE-SBER-1M-2023'
         exchange, itype, ticker, data_type, _ = file_name.split("-")
 
-        exchange = Exchange.fromStr(exchange)
-        itype = Instrument.Type.fromStr(itype)
+        instrument = await Instrument.fromStr(f"{exchange}-{itype}-{ticker}")
         data_type = DataType.fromStr(data_type)
 
-        # FIXME выпилить вызов фасадного класса..
-        # заменить вызовом кипера
-        instrument = Data.find(exchange, itype, ticker)
-
         return instrument, data_type
 
     # }}}
@@ -0,0 +1,413 @@
+#!/usr/bin/env  python3
+# ============================================================================
+# URL:          http://arsvincere.com
+# AUTHOR:       Alex Avin
+# E-MAIL:       mr.alexavin@gmail.com
+# LICENSE:      GNU GPLv3
+# ============================================================================
+
+from __future__ import annotations
+
+import glob
+import os
+from datetime import UTC, date, datetime
+from typing import Optional
+
+import numpy as np
+import pyarrow as pa
+
+from avin.const import DAY_BEGIN
+from avin.utils import Cmd, logger
+
+_SCHEMA = pa.schema(
+    [
+        ("dt", pa.timestamp("ns")),  # UTC
+        ("open", pa.float64()),
+        ("high", pa.float64()),
+        ("low", pa.float64()),
+        ("close", pa.float64()),
+        ("volume", pa.int64()),
+    ]
+)
+
+
+class _ArrowBarStore:  # {{{
+    """Bars in local Arrow IPC files, alternative to postgres tables
+
+    Files are partitioned by instrument, data type and year:
+        <root>/MOEX_SHARE_SBER/1M/2023.arrow
+        <root>/MOEX_SHARE_SBER/1M/info.json  - the same as data."DataInfo"
+        <root>/MOEX_SHARE_SBER/version.json  - as data."DataVersion"
+
+    Files are not compressed and read with memory map, so columns of
+    BarArray are views on the file (zero-copy) when the requested
+    period is inside of one year. Only files of years in [begin, end)
+    are opened, inside of file period is found by binary search on the
+    sorted 'dt' column.
+
+    Used by Keeper when Usr.BAR_STORE == "arrow".
+    """
+
+    def __init__(self, root: str):  # {{{
+        self.root = root
+
+    # }}}
+
+    def save(self, data) -> None:  # {{{
+        """Save _BarsData, replace existing bars in the same period"""
+
+        logger.debug(f"{self.__class__.__name__}.save()")
+
+        columns = self.__toColumns(data.bars)
+        if len(columns[0]) == 0:
+            return
+
+        # the same as in postgres: delete old bars of this period
+        first = columns[0][0]
+        last = columns[0][-1]
+        dir_path = self.__dirPath(data.instrument, data.type)
+        years = columns[0].astype("datetime64[Y]").astype(np.int64) + 1970
+        for year in np.unique(years):
+            mask = years == year
+            new = tuple(c[mask] for c in columns)
+
+            old = self.__readYear(dir_path, int(year))
+            if old is not None:
+                keep = (old[0] < first) | (old[0] > last)
+                old = tuple(c[keep] for c in old)
+                new = tuple(np.concatenate(i) for i in zip(old, new))
+                order = np.argsort(new[0], kind="stable")
+                new = tuple(c[order] for c in new)
+
+            self.__writeYear(dir_path, int(year), new)
+
+        self.__saveInfo(data.source, data.instrument, data.type)
+        self.__bumpVersion(data.instrument, data.type)
+
+    # }}}
+    def load(  # {{{
+        self,
+        instrument,
+        data_type,
+        begin: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> tuple[np.ndarray, ...]:
+        """Return columns dt, open, high, low, close, volume [begin, end)"""
+
+        logger.debug(f"{self.__class__.__name__}.load()")
+
+        dir_path = self.__dirPath(instrument, data_type)
+        begin = self.__toNumpy(begin)
+        end = self.__toNumpy(end)
+
+        parts = list()
+        for year in self.__years(dir_path):
+            # predicate pushdown: skip files out of period
+            if begin is not None and year < self.__year(begin):
+                continue
+            if end is not None and year > self.__year(end):
+                continue
+
+            columns = self.__readYear(dir_path, year)
+            dt = columns[0]
+            first = 0 if begin is None else np.searchsorted(dt, begin)
+            last = len(dt) if end is None else np.searchsorted(dt, end)
+            if first < last:
+                parts.append(tuple(c[first:last] for c in columns))
+
+        if not parts:
+            return self.__emptyColumns()
+        if len(parts) == 1:
+            return parts[0]
+
+        return tuple(np.concatenate(i) for i in zip(*parts))
+
+    # }}}
+    def records(  # {{{
+        self,
+        instrument,
+        data_type,
+        begin: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> list[dict]:
+        """Return bars as list of dict, like records from postgres"""
+
+        logger.debug(f"{self.__class__.__name__}.records()")
+
+        dt, opn, hgh, low, cls, vol = self.load(
+            instrument, data_type, begin, end
+        )
+        dt = dt.astype("datetime64[us]").tolist()
+
+        return [
+            {
+                "dt": dt[i].replace(tzinfo=UTC),
+                "open": float(opn[i]),
+                "high": float(hgh[i]),
+                "low": float(low[i]),
+                "close": float(cls[i]),
+                "volume": int(vol[i]),
+            }
+            for i in range(len(dt))
+        ]
+
+    # }}}
+    def delete(  # {{{
+        self,
+        instrument,
+        data_type,
+        begin: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+    ) -> None:
+        """Delete bars [begin, end), or all bars if period is None"""
+
+        logger.debug(f"{self.__class__.__name__}.delete()")
+
+        dir_path = self.__dirPath(instrument, data_type)
+        if not Cmd.isExist(dir_path):
+            return
+
+        if begin is None or end is None:
+            Cmd.deleteDir(dir_path)
+            self.__bumpVersion(instrument, data_type)
+            return
+
+        info = self.__loadInfo(dir_path)
+        begin = self.__toNumpy(begin)
+        end = self.__toNumpy(end)
+        for year in self.__years(dir_path):
+            if not self.__year(begin) <= year <= self.__year(end):
+                continue
+
+            columns = self.__readYear(dir_path, year)
+            keep = (columns[0] < begin) | (columns[0] >= end)
+            if keep.all():
+                continue
+            if keep.any():
+                columns = tuple(c[keep] for c in columns)
+                self.__writeYear(dir_path, year, columns)
+            else:
+                Cmd.delete(self.__filePath(dir_path, year))
+
+        self.__bumpVersion(instrument, data_type)
+
+        # if no bars - delete dir with data info
+        if not self.__years(dir_path):
+            Cmd.deleteDir(dir_path)
+            return
+
+        self.__saveInfo(
+            info["data_source"], instrument, data_type, info["ticker"]
+        )
+
+    # }}}
+    def info(self, instrument=None, data_type=None) -> list[dict]:  # {{{
+        """Return records like from table data."DataInfo", with ticker"""
+
+        logger.debug(f"{self.__class__.__name__}.info()")
+
+        if instrument is not None and data_type is not None:
+            dir_path = self.__dirPath(instrument, data_type)
+            pattern = Cmd.path(dir_path, "info.json")
+        elif instrument is not None:
+            dir_path = self.__instrumentDir(instrument)
+            pattern = Cmd.path(dir_path, "*", "info.json")
+        else:
+            pattern = Cmd.path(self.root, "*", "*", "info.json")
+
+        records = list()
+        for file_path in glob.glob(pattern):
+            info = Cmd.loadJson(file_path)
+            if data_type is not None and info["data_type"] != data_type.name:
+                continue
+
+            info["first_dt"] = datetime.fromisoformat(info["first_dt"])
+            info["last_dt"] = datetime.fromisoformat(info["last_dt"])
+            records.append(info)
+
+        records.sort(key=lambda i: (i["ticker"], i["data_type"]))
+        return records
+
+    # }}}
+    def version(self, instrument, data_type=None) -> int:  # {{{
+        """Return counter of changes of bars, like data."DataVersion"
+
+        Sum over all data types, or of one data type if it is given.
+        """
+
+        versions = self.__loadVersions(instrument)
+        if data_type is not None:
+            return versions.get(data_type.name, 0)
+
+        return sum(versions.values())
+
+    # }}}
+
+    def __instrumentDir(self, instrument) -> str:  # {{{
+        exchange = instrument.exchange.name
+        itype = instrument.type.name
+        ticker = instrument.ticker
+        return Cmd.path(self.root, f"{exchange}_{itype}_{ticker}")
+
+    # }}}
+    def __dirPath(self, instrument, data_type) -> str:  # {{{
+        return Cmd.path(self.__instrumentDir(instrument), data_type.value)
+
+    # }}}
+    def __filePath(self, dir_path: str, year: int) -> str:  # {{{
+        return Cmd.path(dir_path, f"{year}.arrow")
+
+    # }}}
+    def __years(self, dir_path: str) -> list[int]:  # {{{
+        files = glob.glob(Cmd.path(dir_path, "*.arrow"))
+        years = [int(Cmd.name(i, extension=False)) for i in files]
+        return sorted(years)
+
+    # }}}
+    def __year(self, dt: np.datetime64) -> int:  # {{{
+        return int(dt.astype("datetime64[Y]").astype(np.int64)) + 1970
+
+    # }}}
+    def __readYear(self, dir_path: str, year: int):  # {{{
+        file_path = self.__filePath(dir_path, year)
+        if not Cmd.isExist(file_path):
+            return None
+
+        # NOTE: memory map + без сжатия - numpy массивы смотрят прямо
+        # в страницы файла, ничего не копируется
+        source = pa.memory_map(file_path, "r")
+        table = pa.ipc.open_file(source).read_all()
+        dt = table.column("dt").chunk(0).to_numpy(zero_copy_only=True)
+
+        return (
+            dt.view("datetime64[ns]"),
+            table.column("open").chunk(0).to_numpy(),
+            table.column("high").chunk(0).to_numpy(),
+            table.column("low").chunk(0).to_numpy(),
+            table.column("close").chunk(0).to_numpy(),
+            table.column("volume").chunk(0).to_numpy(),
+        )
+
+    # }}}
+    def __writeYear(self, dir_path: str, year: int, columns) -> None:  # {{{
+        file_path = self.__filePath(dir_path, year)
+        tmp_path = file_path + ".tmp"
+        Cmd.makeDirs(dir_path)
+
+        # one record batch in file - one chunk of column when read
+        batch = pa.record_batch(
+            [pa.array(c) for c in columns], schema=_SCHEMA
+        )
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, _SCHEMA) as writer:
+                writer.write_batch(batch)
+
+        # replace atomically, readers see old or new file only
+        os.replace(tmp_path, file_path)
+
+    # }}}
+    def __saveInfo(  # {{{
+        self, source, instrument, data_type, ticker: Optional[str] = None
+    ) -> None:
+        dir_path = self.__dirPath(instrument, data_type)
+        years = self.__years(dir_path)
+        first = self.__readYear(dir_path, years[0])[0][0]
+        last = self.__readYear(dir_path, years[-1])[0][-1]
+
+        info = {
+            "data_source": getattr(source, "name", source),
+            "data_type": data_type.name,
+            "figi": instrument.figi,
+            "ticker": ticker or instrument.ticker,
+            "first_dt": self.__toDateTime(first).isoformat(),
+            "last_dt": self.__toDateTime(last).isoformat(),
+        }
+        Cmd.saveJson(info, Cmd.path(dir_path, "info.json"))
+
+    # }}}
+    def __loadInfo(self, dir_path: str) -> dict:  # {{{
+        return Cmd.loadJson(Cmd.path(dir_path, "info.json"))
+
+    # }}}
+    def __bumpVersion(self, instrument, data_type) -> None:  # {{{
+        # NOTE: файл в папке инструмента, а не типа данных - он
+        # переживает удаление всех баров, версии не повторяются
+        versions = self.__loadVersions(instrument)
+        versions[data_type.name] = versions.get(data_type.name, 0) + 1
+
+        file_path = Cmd.path(self.__instrumentDir(instrument), "version.json")
+        Cmd.saveJson(versions, file_path)
+
+    # }}}
+    def __loadVersions(self, instrument) -> dict[str, int]:  # {{{
+        file_path = Cmd.path(self.__instrumentDir(instrument), "version.json")
+        if not Cmd.isExist(file_path):
+            return dict()
+
+        return Cmd.loadJson(file_path)
+
+    # }}}
+    def __toColumns(self, bars) -> tuple[np.ndarray, ...]:  # {{{
+        # BarArray
+        if isinstance(getattr(bars, "dt", None), np.ndarray):
+            return (
+                bars.dt.astype("datetime64[ns]"),
+                np.asarray(bars.open, np.float64),
+                np.asarray(bars.high, np.float64),
+                np.asarray(bars.low, np.float64),
+                np.asarray(bars.close, np.float64),
+                np.asarray(bars.vol, np.int64),
+            )
+
+        # list[_Bar]
+        dt = [self.__toNumpy(b.dt) for b in bars]
+        return (
+            np.array(dt, dtype="datetime64[ns]"),
+            np.array([b.open for b in bars], dtype=np.float64),
+            np.array([b.high for b in bars], dtype=np.float64),
+            np.array([b.low for b in bars], dtype=np.float64),
+            np.array([b.close for b in bars], dtype=np.float64),
+            np.array([b.vol for b in bars], dtype=np.int64),
+        )
+
+    # }}}
+    def __emptyColumns(self) -> tuple[np.ndarray, ...]:  # {{{
+        return (
+            np.array([], dtype="datetime64[ns]"),
+            np.array([], dtype=np.float64),
+            np.array([], dtype=np.float64),
+            np.array([], dtype=np.float64),
+            np.array([], dtype=np.float64),
+            np.array([], dtype=np.int64),
+        )
+
+    # }}}
+    def __toNumpy(  # {{{
+        self, dt: Optional[datetime | date]
+    ) -> Optional[np.datetime64]:
+        if dt is None:
+            return None
+
+        # date -> begin of day, BarStream gives period as dates
+        if not isinstance(dt, datetime):
+            dt = datetime.combine(dt, DAY_BEGIN)
+
+        # offset-aware -> naive UTC
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(UTC).replace(tzinfo=None)
+
+        return np.datetime64(dt, "ns")
+
+    # }}}
+    def __toDateTime(self, dt: np.datetime64) -> datetime:  # {{{
+        dt = dt.astype("datetime64[us]").item()
+        return dt.replace(tzinfo=UTC)
+
+    # }}}
+
+
+# }}}
+
+
+if __name__ == "__main__":
+    ...
@@ -18,15 +18,21 @@ the method - Keeper.transaction(sql_request).
 
 from __future__ import annotations
 
+import asyncio
+import contextvars
 import inspect
 import os
-from datetime import datetime
-from typing import Any
+import time
+from contextlib import asynccontextmanager, suppress
+from datetime import UTC, datetime
+from typing import Any, AsyncIterator
 
 import asyncpg
+import numpy as np
 
 from avin.config import Auto, Usr
 from avin.const import ONE_DAY, ONE_MONTH, Dir
+from avin.keeper._bar_store import _ArrowBarStore
 from avin.utils import Cmd, Date, ask_user, logger, now
 
 __all__ = ("Keeper",)
@@ -36,6 +42,81 @@ class Keeper:
     USER = Usr.PG_USER
     DATABASE = Usr.PG_DATABASE
     HOST = Usr.PG_HOST
+    POOL_MIN_SIZE = Usr.PG_POOL_MIN_SIZE
+    POOL_MAX_SIZE = Usr.PG_POOL_MAX_SIZE
+    COPY_CHUNK_SIZE = 100_000  # bars per COPY
+    BAR_STORE = Usr.BAR_STORE  # "postgres" | "arrow"
+    BAR_DIR = Usr.BAR_DIR
+    __PG_EPOCH_US = 946_684_800_000_000  # 2000-01-01 UTC in unix microsec
+    __BAR_DATA_TYPES = ("1M", "5M", "10M", "1H", "D", "W", "M")
+    __BRIN_DATA_TYPES = ("1M", "5M", "10M")
+
+    # NOTE: asyncpg pool привязан к event loop, в котором создан, а GUI
+    # запускает много разных loop через asyncio.run - поэтому храним
+    # отдельный pool для каждого loop
+    __POOLS: dict[asyncio.AbstractEventLoop, asyncpg.Pool] = dict()
+    __CONNECTION = contextvars.ContextVar("keeper_connection", default=None)
+    __UNIT_OF_WORK = contextvars.ContextVar(
+        "keeper_unit_of_work", default=None
+    )
+
+    # class name -> table, primary key; this objects in unit of work mode
+    # are kept in memory and written by Keeper.unitOfWork in one flush
+    __TRACKED = {
+        "Trade": ("Trade", "trade_id"),
+        "MarketOrder": ("Order", "order_id"),
+        "LimitOrder": ("Order", "order_id"),
+        "StopOrder": ("Order", "order_id"),
+        "StopLoss": ("Order", "order_id"),
+        "TakeProfit": ("Order", "order_id"),
+        "Operation": ("Operation", "operation_id"),
+    }
+    __RECORD_COLUMNS = {
+        "Trade": (
+            "trade_id",
+            "trade_list",
+            "figi",
+            "strategy",
+            "version",
+            "dt",
+            "status",
+            "trade_type",
+            "trade_info",
+        ),
+        "Order": (
+            "order_id",
+            "trade_id",
+            "account",
+            "figi",
+            "order_type",
+            "status",
+            "direction",
+            "lots",
+            "quantity",
+            "price",
+            "stop_price",
+            "exec_price",
+            "exec_lots",
+            "exec_quantity",
+            "broker_id",
+            "meta",
+        ),
+        "Operation": (
+            "operation_id",
+            "order_id",
+            "trade_id",
+            "account",
+            "figi",
+            "dt",
+            "direction",
+            "lots",
+            "quantity",
+            "price",
+            "amount",
+            "commission",
+            "meta",
+        ),
+    }
 
     __LAST_BACKUP_DATA_DT = Cmd.path(Usr.DATA, "data_bak_date")
     __LAST_BACKUP_USER_DT = Cmd.path(Usr.DATA, "public_bak_date")
@@ -204,23 +285,171 @@ class Keeper:
 
     # }}}
 
+    @classmethod  # migrateBarsData  # {{{
+    async def migrateBarsData(cls) -> None:
+        """Upgrade bars tables created before partitioning
+
+        Every plain bars table is rebuilt into a table partitioned by
+        year, in its own transaction: bars are copied into partitions,
+        the old table is dropped. Partitioned tables are skipped, so
+        after an interruption the command can just be repeated:
+
+            asyncio.run(Keeper.migrateBarsData())
+        """
+        logger.info(":: Migrate bars tables")
+
+        request = """
+            SELECT c.relname AS name
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE
+                n.nspname = 'data' AND
+                c.relkind = 'r' AND
+                NOT c.relispartition
+            ORDER BY c.relname
+            ;
+            """
+        records = await cls.transaction(request)
+        names = [
+            i["name"]
+            for i in records
+            if i["name"].rsplit("_", 1)[-1] in cls.__BAR_DATA_TYPES
+        ]
+
+        for name in names:
+            begin = time.perf_counter()
+            await cls.__migrateBarsTable(name)
+            seconds = time.perf_counter() - begin
+            logger.info(f"   - {name} ({seconds:.2f} sec)")
+
+        logger.info(f"   - migrated {len(names)} tables")
+
+    # }}}
+    @classmethod  # open  # {{{
+    async def open(cls) -> asyncpg.Pool:
+        """Create connection pool for the running event loop
+
+        Calling is optional - pool is created lazily on first request.
+        """
+
+        logger.debug(f"{cls.__name__}.open()")
+
+        loop = asyncio.get_running_loop()
+        pool = cls.__POOLS.get(loop)
+        if pool is not None and not pool.is_closing():
+            return pool
+
+        cls.__removeDeadPools()
+        pool = await asyncpg.create_pool(
+            user=cls.USER,
+            database=cls.DATABASE,
+            host=cls.HOST,
+            min_size=cls.POOL_MIN_SIZE,
+            max_size=cls.POOL_MAX_SIZE,
+        )
+
+        # пока ждали create_pool, другая корутина этого loop могла
+        # успеть создать свой pool - оставляем первый
+        if loop in cls.__POOLS and not cls.__POOLS[loop].is_closing():
+            await pool.close()
+            return cls.__POOLS[loop]
+
+        cls.__POOLS[loop] = pool
+        return pool
+
+    # }}}
+    @classmethod  # close  # {{{
+    async def close(cls) -> None:
+        """Close connection pool of the running event loop"""
+
+        logger.debug(f"{cls.__name__}.close()")
+
+        loop = asyncio.get_running_loop()
+        pool = cls.__POOLS.pop(loop, None)
+        if pool is not None:
+            await pool.close()
+
+    # }}}
+    @classmethod  # connection  # {{{
+    @asynccontextmanager
+    async def connection(cls) -> AsyncIterator[asyncpg.Connection]:
+        """Acquire one connection from pool
+
+        All Keeper requests inside the block use the same connection:
+
+            async with Keeper.connection() as conn:
+                await Keeper.transaction(request_1)
+                await Keeper.update(trade)
+        """
+
+        logger.debug(f"{cls.__name__}.connection()")
+
+        # nested block - reuse the connection of outer block, but only
+        # in the same task: tasks created inside block (gather...) inherit
+        # context, and one asyncpg connection can't run queries in parallel
+        task = asyncio.current_task()
+        outer = cls.__CONNECTION.get()
+        if outer is not None and outer[1] is task:
+            yield outer[0]
+            return
+
+        pool = await cls.open()
+        async with pool.acquire() as conn:
+            token = cls.__CONNECTION.set((conn, task))
+            try:
+                yield conn
+            finally:
+                cls.__CONNECTION.reset(token)
+
+    # }}}
     @classmethod  # transaction  # {{{
-    async def transaction(cls, sql_request: str) -> list[asyncpg.Record]:
+    async def transaction(
+        cls, sql_request: str, *args
+    ) -> list[asyncpg.Record]:
+        """Execute request, args - values of $1, $2... in request"""
+
         logger.debug(f"{cls.__name__}.transaction()\n{sql_request}")
 
         try:
-            conn = await asyncpg.connect(
-                user=cls.USER,
-                database=cls.DATABASE,
-                host=cls.HOST,
-            )
-            records = await conn.fetch(sql_request)
-            await conn.close()
+            async with cls.connection() as conn:
+                records = await conn.fetch(sql_request, *args)
             return records
         except asyncpg.exceptions.NumericValueOutOfRangeError as err:
             logger.critical(err)
             exit(2)
 
+    # }}}
+    @classmethod  # unitOfWork  # {{{
+    @asynccontextmanager
+    async def unitOfWork(cls, persist: bool = True) -> AsyncIterator[dict]:
+        """Keep trades, orders and operations in memory
+
+        Inside the block Keeper.add / Keeper.update of Trade, Order and
+        Operation don't touch the database, objects are only tracked.
+        On exit from block all tracked objects are written in one
+        transaction with COPY. If persist=False - tracked objects are
+        just dropped, for throwaway runs (optimization...).
+
+            async with Keeper.unitOfWork():
+                await Order.save(order)
+                await order.setStatus(Order.Status.POSTED)
+            # here one bulk write
+
+        If block raised exception - nothing is written.
+        """
+
+        logger.debug(f"{cls.__name__}.unitOfWork()")
+
+        work = {"Trade": dict(), "Order": dict(), "Operation": dict()}
+        token = cls.__UNIT_OF_WORK.set(work)
+        try:
+            yield work
+        finally:
+            cls.__UNIT_OF_WORK.reset(token)
+
+        if persist:
+            await cls.__flushUnitOfWork(work)
+
     # }}}
     @classmethod  # info  # {{{
     async def info(cls, source, itype, **kwargs):
@@ -302,6 +531,10 @@ class Keeper:
         }
         add_method = methods[class_name]
 
+        # In unit of work mode - only remember object
+        if cls.__track(class_name, obj):
+            return
+
         # Add object
         await add_method(obj, kwargs)
 
@@ -322,6 +555,8 @@ class Keeper:
             "datetime": cls.__getDateTime,
             "_Bar": cls.__getBarsRecords,
             "Bar": cls.__getBars,
+            "BarArray": cls.__getBarArray,
+            "_BarsData": cls.__getDataVersion,
             "Asset": cls.__getAsset,
             "AssetList": cls.__getAssetList,
             # "Account": cls.__getAccount,
@@ -340,6 +575,102 @@ class Keeper:
         result = await get_method(Class, kwargs)
         return result
 
+    # }}}
+    @classmethod  # stream  # {{{
+    async def stream(
+        cls, Class, batch: int = 50_000, **kwargs
+    ) -> AsyncIterator[Any]:
+        """Request bars by batches
+
+        Class - Bar, BarArray or _Bar (records), kwargs are the same as
+        in Keeper.get: instrument, timeframe or data_type, begin, end.
+        Batches come in order of dt. While the current batch is
+        processed, the next one is already being fetched:
+
+            async for bars in Keeper.stream(
+                BarArray, instrument=sber, timeframe=tf, begin=b, end=e
+            ):
+                converter.push(bars)
+
+        Memory does not depend on length of period - only two batches
+        at the same time. Every batch is a binary COPY of next 'batch'
+        bars after dt of the last one (keyset pagination), decoded into
+        numpy like in Keeper.get(BarArray). Batches are requested on own
+        connection from pool, so other Keeper requests inside of loop
+        are allowed.
+        """
+        logger.debug(f"{cls.__name__}.stream()")
+        assert inspect.isclass(Class)
+        assert batch > 0
+
+        class_name = cls.__getClassName(Class)
+        assert class_name in ("Bar", "BarArray", "_Bar")
+
+        instrument = kwargs["instrument"]
+        data_type = kwargs.get("data_type")
+        if data_type is None:
+            data_type = kwargs["timeframe"].toDataType()
+        begin = kwargs.get("begin")
+        end = kwargs.get("end")
+
+        # Local arrow files - just slices of memory mapped columns
+        store = cls.__barStore()
+        if store is not None:
+            columns = store.load(instrument, data_type, begin, end)
+            for first in range(0, len(columns[0]), batch):
+                chunk = tuple(c[first : first + batch] for c in columns)
+                yield cls.__columnsToBatch(Class, chunk)
+            return
+
+        bars_table_name = cls.__getTableName(instrument, data_type=data_type)
+        pg_period = cls.__formatPeriod(begin, end)
+
+        async def fetch(conn, last_dt):
+            pg_after = "TRUE" if last_dt is None else f"dt > '{last_dt}+00'"
+            request = f"""
+                SELECT
+                    dt,
+                    coalesce(open, 'NaN'),
+                    coalesce(high, 'NaN'),
+                    coalesce(low, 'NaN'),
+                    coalesce(close, 'NaN'),
+                    coalesce(volume, 0)
+                FROM {bars_table_name}
+                WHERE
+                    {pg_period} AND {pg_after}
+                ORDER BY dt
+                LIMIT {batch}
+                """
+            return await cls.__copyBinaryBars(conn, request)
+
+        # NOTE: repeatable read - все батчи из одного снимка данных,
+        # параллельное сохранение баров не сдвигает границы батчей
+        pool = await cls.open()
+        async with (
+            pool.acquire() as conn,
+            conn.transaction(isolation="repeatable_read", readonly=True),
+        ):
+            pending = asyncio.ensure_future(fetch(conn, None))
+            try:
+                while pending is not None:
+                    columns = await pending
+                    pending = None
+
+                    # prefetch: next batch is fetched in background while
+                    # consumer works with this one
+                    count = len(columns[0])
+                    if count == batch:
+                        last_dt = np.datetime_as_string(columns[0][-1], "us")
+                        pending = asyncio.ensure_future(fetch(conn, last_dt))
+
+                    if count:
+                        yield cls.__columnsToBatch(Class, columns)
+            finally:
+                if pending is not None and not pending.done():
+                    pending.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await pending
+
     # }}}
     @classmethod  # delete  # {{{
     async def delete(cls, obj, **kwargs) -> None:
@@ -374,6 +705,10 @@ class Keeper:
         }
         delete_method = methods[class_name]
 
+        # In unit of work mode - forget object, and delete from db too,
+        # it may be saved before the unit of work
+        cls.__untrack(class_name, obj)
+
         # Delete object
         await delete_method(obj, kwargs)
 
@@ -398,6 +733,10 @@ class Keeper:
             "_InstrumentsInfoCache": cls.__updateCache,
         }
 
+        # In unit of work mode - only remember object
+        if cls.__track(class_name, obj):
+            return
+
         # Update object
         update_method = methods[class_name]
         await update_method(obj, kwargs)
@@ -457,53 +796,73 @@ class Keeper:
     async def __addBarsData(cls, data, kwargs) -> None:
         logger.debug(f"{cls.__name__}.__addBarsData()")
 
-        # Create table if not exist
+        # Bars in local arrow files, not in postgres
+        store = cls.__barStore()
+        if store is not None:
+            await asyncio.to_thread(store.save, data)
+            return
+
+        # Create table and partitions of years if not exist
         bars_table_name = cls.__getTableName(data.instrument, data.type)
-        await cls.__createBarsDataTable(bars_table_name)
+        await cls.__createBarsDataTable(bars_table_name, data.type)
+        await cls.__createBarsPartitions(
+            bars_table_name, data.first_dt.year, data.last_dt.year
+        )
 
-        # If exist - delete old data at the same period
-        request = f"""
-            DELETE FROM {bars_table_name}
-            WHERE
-                '{data.first_dt}' <= dt AND dt <= '{data.last_dt}'
-                ;
-            """
-        await cls.transaction(request)
+        async with cls.connection() as conn, conn.transaction():
+            # If exist - delete old data at the same period
+            request = f"""
+                DELETE FROM {bars_table_name}
+                WHERE
+                    '{data.first_dt}' <= dt AND dt <= '{data.last_dt}'
+                    ;
+                """
+            await cls.transaction(request)
 
-        # Add bars data
-        values = cls.__formatBarsData(data)
-        request = f"""
-        INSERT INTO {bars_table_name} (dt, open, high, low, close, volume)
-        VALUES
-            {values}
-            ;
-        """
-        await cls.transaction(request)
+            # Add bars data: binary COPY into staging table, then merge
+            await cls.__copyBarsData(conn, bars_table_name, data.bars)
 
-        # Update table data."DataInfo" - about availible market data
-        request = f"""
-            DELETE FROM data."DataInfo"
-            WHERE
-                figi = '{data.instrument.figi}' AND
-                data_type = '{data.type.name}'
-                ;
-            """
-        await cls.transaction(request)
-        request = f"""
-            INSERT INTO data."DataInfo"(
-                data_source, data_type, figi, first_dt, last_dt
+            # Update table data."DataInfo" - about availible market data.
+            # NOTE: период только расширяется периодом этих баров,
+            # без min/max по всей таблице. Одна строка на инструмент и
+            # тип данных: строка другого источника (MOEX, потом архив
+            # Tinkoff) удаляется, ее период входит в новую. Один
+            # запрос - upsert, параллельные сохранения не ловят
+            # нарушение PRIMARY KEY
+            request = f"""
+                WITH other AS (
+                    DELETE FROM data."DataInfo"
+                    WHERE
+                        figi = '{data.instrument.figi}' AND
+                        data_type = '{data.type.name}' AND
+                        data_source <> '{data.source.name}'
+                    RETURNING first_dt, last_dt
                 )
-            VALUES (
-                '{data.source.name}',
-                '{data.type.name}',
-                '{data.instrument.figi}',
-                (SELECT min(dt) FROM {bars_table_name}),
-                (SELECT max(dt) FROM {bars_table_name})
-            );
-            """
-        await cls.transaction(request)
+                INSERT INTO data."DataInfo"(
+                    data_source, data_type, figi, first_dt, last_dt
+                    )
+                SELECT
+                    '{data.source.name}',
+                    '{data.type.name}',
+                    '{data.instrument.figi}',
+                    least('{data.first_dt}'::timestamptz, min(first_dt)),
+                    greatest('{data.last_dt}'::timestamptz, max(last_dt))
+                FROM other
+                ON CONFLICT (data_source, data_type, figi) DO UPDATE SET
+                    first_dt = least(
+                        data."DataInfo".first_dt, EXCLUDED.first_dt
+                    ),
+                    last_dt = greatest(
+                        data."DataInfo".last_dt, EXCLUDED.last_dt
+                    )
+                ;
+                """
+            await cls.transaction(request)
+            await cls.__bumpDataVersion(data.instrument, data.type)
 
         # Update table "Asset" add new instrument if not exist
+        # NOTE: вне транзакции - UniqueViolationError в ней
+        # сделал бы невалидной всю транзакцию
         await cls.__addAsset(data.instrument, kwargs={})
 
     # }}}
@@ -883,7 +1242,12 @@ class Keeper:
         figi = kwargs.get("figi")
 
         # create condition
-        if figi:
+        args = list()
+        if isinstance(figi, (list, tuple, set)):
+            # many instruments by one request
+            pg_condition = "figi = ANY($1::text[])"
+            args.append(list(figi))
+        elif figi:
             pg_condition = f"figi = '{figi}'"
         elif exchange and itype and ticker:
             pg_condition = (
@@ -910,7 +1274,7 @@ class Keeper:
             ORDER BY ticker
             ;
             """
-        records = await cls.transaction(request)
+        records = await cls.transaction(request, *args)
 
         # Create 'list' of 'Instrument' from records
         instr_list = list()
@@ -925,6 +1289,14 @@ class Keeper:
     async def __getDataInfo(cls, DataInfo, kwargs: dict):
         logger.debug(f"{cls.__name__}.__getDataInfo()")
 
+        store = cls.__barStore()
+        if store is not None:
+            records = store.info(kwargs["instrument"], kwargs["data_type"])
+            if not records:
+                return None
+            node = await DataInfo.fromRecord(records[0])
+            return node
+
         instrument = kwargs["instrument"]
         data_type = kwargs["data_type"]
 
@@ -959,6 +1331,14 @@ class Keeper:
     async def __getDataInfoList(cls, DataInfoList, kwargs: dict):
         logger.debug(f"{cls.__name__}.__getDataInfoList()")
 
+        store = cls.__barStore()
+        if store is not None:
+            records = store.info(
+                kwargs.get("instrument"), kwargs.get("data_type")
+            )
+            data_info = await DataInfoList.fromRecord(records)
+            return data_info
+
         instrument = kwargs.get("instrument")
         data_type = kwargs.get("data_type")
 
@@ -1003,6 +1383,13 @@ class Keeper:
     async def __getDataSource(cls, DataSource, kwargs: dict):
         logger.debug(f"{cls.__name__}.__getDataSource()")
 
+        store = cls.__barStore()
+        if store is not None:
+            records = store.info(kwargs["instrument"], kwargs["data_type"])
+            if not records:
+                return None
+            return DataSource.fromRecord(records[0])
+
         instrument = kwargs["instrument"]
         data_type = kwargs["data_type"]
 
@@ -1026,6 +1413,11 @@ class Keeper:
     async def __getDataType(cls, DataType, kwargs: dict):
         logger.debug(f"{cls.__name__}.__getDataType()")
 
+        store = cls.__barStore()
+        if store is not None:
+            records = store.info(kwargs["instrument"])
+            return [DataType.fromRecord(i) for i in records]
+
         instrument = kwargs["instrument"]
 
         request = f"""
@@ -1047,6 +1439,12 @@ class Keeper:
     async def __getDateTime(cls, datetime, kwargs: dict):
         logger.debug(f"{cls.__name__}.__getData()")
 
+        store = cls.__barStore()
+        if store is not None:
+            records = store.info(kwargs["instrument"], kwargs["data_type"])
+            assert len(records) == 1
+            return [records[0]["first_dt"], records[0]["last_dt"]]
+
         instrument = kwargs["instrument"]
         data_type = kwargs["data_type"]
 
@@ -1067,11 +1465,51 @@ class Keeper:
         record = records[0]
         return [record["first_dt"], record["last_dt"]]
 
+    # }}}
+    @classmethod  # __getDataVersion  # {{{
+    async def __getDataVersion(cls, _BarsData, kwargs: dict) -> int:
+        """Return counter of changes of bars of instrument
+
+        Sum over all data types, or of one data type if it is given.
+        """
+        logger.debug(f"{cls.__name__}.__getDataVersion()")
+
+        instrument = kwargs["instrument"]
+        data_type = kwargs.get("data_type")
+
+        store = cls.__barStore()
+        if store is not None:
+            return store.version(instrument, data_type)
+
+        pg_figi = f"figi = '{instrument.figi}'"
+        if data_type:
+            pg_data_type = f"data_type = '{data_type.name}'"
+        else:
+            pg_data_type = "TRUE"
+
+        request = f"""
+            SELECT coalesce(sum(version), 0) AS version
+            FROM data."DataVersion"
+            WHERE
+                {pg_figi} AND {pg_data_type};
+            """
+        records = await cls.transaction(request)
+        return int(records[0]["version"])
+
     # }}}
     @classmethod  # __getBarsRecords  # {{{
     async def __getBarsRecords(cls, _Bar, kwargs: dict):
         logger.debug(f"{cls.__name__}.__getBars()")
 
+        store = cls.__barStore()
+        if store is not None:
+            return store.records(
+                kwargs["instrument"],
+                kwargs.get("data_type"),
+                kwargs.get("begin"),
+                kwargs.get("end"),
+            )
+
         instrument = kwargs["instrument"]
         data_type = kwargs.get("data_type")
         begin = kwargs.get("begin")
@@ -1081,14 +1519,7 @@ class Keeper:
         bars_table_name = cls.__getTableName(instrument, data_type=data_type)
 
         # create condition for begin-end:
-        if begin is None and end is None:
-            pg_period = "TRUE"
-        elif begin is not None and end is None:
-            pg_period = f"'{begin}' <= dt"
-        elif begin is None and end is not None:
-            pg_period = f"dt < '{end}'"
-        else:
-            pg_period = f"'{begin}' <= dt AND dt < '{end}'"
+        pg_period = cls.__formatPeriod(begin, end)
 
         # request bars records
         request = f"""
@@ -1103,6 +1534,52 @@ class Keeper:
 
         return records
 
+    # }}}
+    @classmethod  # __getBarArray  # {{{
+    async def __getBarArray(cls, BarArray, kwargs: dict):
+        """Request bars as columns of numpy arrays
+
+        Bars are received with binary COPY and decoded directly into
+        numpy arrays, without creating python object for every row.
+        """
+        logger.debug(f"{cls.__name__}.__getBarArray()")
+
+        instrument = kwargs["instrument"]
+        if kwargs.get("data_type") is None:
+            kwargs["data_type"] = kwargs["timeframe"].toDataType()
+        data_type = kwargs["data_type"]
+        begin = kwargs.get("begin")
+        end = kwargs.get("end")
+
+        # Local arrow files - columns are views on memory mapped file
+        store = cls.__barStore()
+        if store is not None:
+            columns = store.load(instrument, data_type, begin, end)
+            return BarArray(*columns)
+
+        bars_table_name = cls.__getTableName(instrument, data_type=data_type)
+        pg_period = cls.__formatPeriod(begin, end)
+
+        # NOTE: NULL ломает фиксированную длину строки в бинарном COPY,
+        # поэтому coalesce
+        request = f"""
+            SELECT
+                dt,
+                coalesce(open, 'NaN'),
+                coalesce(high, 'NaN'),
+                coalesce(low, 'NaN'),
+                coalesce(close, 'NaN'),
+                coalesce(volume, 0)
+            FROM {bars_table_name}
+            WHERE
+                {pg_period}
+            ORDER BY dt
+            """
+        async with cls.connection() as conn:
+            columns = await cls.__copyBinaryBars(conn, request)
+
+        return BarArray(*columns)
+
     # }}}
     @classmethod  # __getBars  # {{{
     async def __getBars(cls, Bar, kwargs: dict):
@@ -1417,7 +1894,12 @@ class Keeper:
         # }}}
 
         # Create condition
-        if trade_id:
+        args = list()
+        if isinstance(trade_id, (list, tuple)):
+            # many trades by one request
+            pg_condition = "trade_id = ANY($1::text[])"
+            args.append([str(i) for i in trade_id])
+        elif trade_id:
             pg_condition = f"trade_id = '{trade_id}'"
         else:
             pg_condition = condition(strategy, statuses, begin, end)
@@ -1432,20 +1914,18 @@ class Keeper:
                 version,
                 dt,
                 status,
-                type,
-                info
+                trade_type,
+                trade_info
             FROM "Trade"
             WHERE {pg_condition}
             ORDER BY trade_id
             ;
             """
-        trade_records = await cls.transaction(request)
+        trade_records = await cls.transaction(request, *args)
 
-        # Create 'list' of 'Trade' objects from 'Records'
-        all_trades = list()
-        for i in trade_records:
-            trade = await Trade.fromRecord(i)
-            all_trades.append(trade)
+        # Create 'list' of 'Trade' objects from 'Records', orders and
+        # operations of all trades are requested together
+        all_trades = await Trade.fromRecords(trade_records)
 
         return all_trades
 
@@ -1456,8 +1936,14 @@ class Keeper:
 
         trade_id = kwargs.get("trade_id")
         operation_id = kwargs.get("operation_id")
-
-        if trade_id:
+        instruments = kwargs.get("instruments", dict())  # figi -> instr
+
+        args = list()
+        if isinstance(trade_id, (list, tuple)):
+            # operations of many trades by one request
+            pg_condition = "trade_id = ANY($1::text[])"
+            args.append([str(i) for i in trade_id])
+        elif trade_id:
             pg_condition = f"trade_id = '{trade_id}'"
         elif operation_id:
             pg_condition = f"operation_id = '{operation_id}'"
@@ -1484,12 +1970,14 @@ class Keeper:
             ORDER BY operation_id
             ;
             """
-        op_records = await cls.transaction(request)
+        op_records = await cls.transaction(request, *args)
 
         # Create 'list' of 'Operation' objects from 'Records'
         op_list = list()
         for i in op_records:
-            op = await Operation.fromRecord(i)
+            instrument = instruments.get(i["figi"])
+            op = await Operation.fromRecord(i, instrument)
+            instruments[i["figi"]] = op.instrument
             op_list.append(op)
 
         return op_list
@@ -1501,9 +1989,15 @@ class Keeper:
 
         trade_id = kwargs.get("trade_id")
         order_id = kwargs.get("order_id")
+        instruments = kwargs.get("instruments", dict())  # figi -> instr
 
         # create condition
-        if trade_id:
+        args = list()
+        if isinstance(trade_id, (list, tuple)):
+            # orders of many trades by one request
+            pg_condition = "trade_id = ANY($1::text[])"
+            args.append([str(i) for i in trade_id])
+        elif trade_id:
             pg_condition = f"trade_id = '{trade_id}'"
         elif order_id:
             pg_condition = f"order_id = '{order_id}'"
@@ -1533,12 +2027,14 @@ class Keeper:
             ORDER BY order_id
             ;
             """
-        order_records = await cls.transaction(request)
+        order_records = await cls.transaction(request, *args)
 
         # Create 'list' of 'Order' objects from 'Records'
         order_list = list()
         for i in order_records:
-            order = await Order.fromRecord(i)
+            instrument = instruments.get(i["figi"])
+            order = await Order.fromRecord(i, instrument)
+            instruments[i["figi"]] = order.instrument
             order_list.append(order)
 
         return order_list
@@ -1724,54 +2220,79 @@ class Keeper:
         begin = kwargs.get("begin")
         end = kwargs.get("end")
 
+        store = cls.__barStore()
+        if store is not None:
+            await asyncio.to_thread(
+                store.delete, instrument, data_type, begin, end
+            )
+            return
+
         # Create condition for begin-end:
         if begin and end:
             pg_period = f"'{begin}' <= dt AND dt < '{end}'"
         else:
             pg_period = "TRUE"
 
-        # Delete bars
         bars_table_name = cls.__getTableName(instrument, data_type)
-        request = f"""
-            DELETE FROM {bars_table_name}
-            WHERE
-                {pg_period}
-            """
-        await cls.transaction(request)
-
-        # if table is empty - delete table & data info
-        request = f"""
-            SELECT * FROM {bars_table_name}
-            """
-        records = await cls.transaction(request)
-        if not records:
-            # Delete bars table
+        async with cls.connection() as conn, conn.transaction():
+            # Drop partitions of whole years inside of period - it is
+            # instant, unlike delete of millions of rows
+            if begin and end:
+                for year in cls.__wholeYears(begin, end):
+                    partition = cls.__getPartitionName(bars_table_name, year)
+                    request = f"""
+                        DROP TABLE IF EXISTS {partition};
+                        """
+                    await cls.transaction(request)
+
+            # Delete bars
             request = f"""
-                DROP TABLE {bars_table_name};
-                """
-            await cls.transaction(request)
-            # Delete data info
-            request = f"""
-                DELETE FROM data."DataInfo"
+                DELETE FROM {bars_table_name}
                 WHERE
-                    figi = '{instrument.figi}' AND
-                    data_type = '{data_type.name}'
+                    {pg_period}
                 """
             await cls.transaction(request)
-        else:
-            # if talbe not empty after delete bars update table
-            # data."DataInfo" - information about availible market data
+            await cls.__bumpDataVersion(instrument, data_type)
+
+            # NOTE: min/max по btree индексу партиций, а не чтение
+            # всей таблицы
             request = f"""
-                UPDATE data."DataInfo"
-                SET
-                    first_dt = (SELECT min(dt) FROM {bars_table_name}),
-                    last_dt = (SELECT max(dt) FROM {bars_table_name})
-                WHERE
-                    figi = '{instrument.figi}' AND
-                    data_type = '{data_type.name}'
-                ;
+                SELECT min(dt) AS first_dt, max(dt) AS last_dt
+                FROM {bars_table_name}
                 """
-            await cls.transaction(request)
+            records = await cls.transaction(request)
+            first_dt = records[0]["first_dt"]
+            last_dt = records[0]["last_dt"]
+
+            # if table is empty - delete table & data info
+            if first_dt is None:
+                # Delete bars table with all partitions
+                request = f"""
+                    DROP TABLE {bars_table_name};
+                    """
+                await cls.transaction(request)
+                # Delete data info
+                request = f"""
+                    DELETE FROM data."DataInfo"
+                    WHERE
+                        figi = '{instrument.figi}' AND
+                        data_type = '{data_type.name}'
+                    """
+                await cls.transaction(request)
+            else:
+                # if talbe not empty after delete bars update table
+                # data."DataInfo" - information about availible market data
+                request = f"""
+                    UPDATE data."DataInfo"
+                    SET
+                        first_dt = '{first_dt}',
+                        last_dt = '{last_dt}'
+                    WHERE
+                        figi = '{instrument.figi}' AND
+                        data_type = '{data_type.name}'
+                    ;
+                    """
+                await cls.transaction(request)
 
     # }}}
     @classmethod  # __deleteAccount  # {{{
@@ -2126,8 +2647,81 @@ class Keeper:
 
     # }}}
 
+    @classmethod  # __migrateBarsTable  # {{{
+    async def __migrateBarsTable(cls, name: str) -> None:
+        """Rebuild plain table data."<name>" as partitioned by year"""
+
+        logger.debug(f"{cls.__name__}.__migrateBarsTable()")
+
+        bars_table_name = f'data."{name}"'
+        old_table_name = f'data."{name}_unpartitioned"'
+        data_type = name.rsplit("_", 1)[-1]
+
+        async with cls.connection() as conn, conn.transaction():
+            request = f"""
+                SELECT min(dt) AS first_dt, max(dt) AS last_dt
+                FROM {bars_table_name}
+                """
+            records = await cls.transaction(request)
+            first_dt = records[0]["first_dt"]
+            last_dt = records[0]["last_dt"]
+
+            # NOTE: имя индекса primary key уникально в схеме, старая
+            # таблица отдает его новой
+            request = f"""
+                SELECT conname FROM pg_constraint
+                WHERE
+                    conrelid = '{bars_table_name}'::regclass AND
+                    contype = 'p'
+                """
+            records = await cls.transaction(request)
+            request = f"""
+                ALTER TABLE {bars_table_name}
+                    RENAME TO "{name}_unpartitioned";
+                """
+            await cls.transaction(request)
+            for record in records:
+                request = f"""
+                    ALTER TABLE {old_table_name}
+                        RENAME CONSTRAINT "{record["conname"]}"
+                        TO "{name}_unpartitioned_pkey";
+                    """
+                await cls.transaction(request)
+
+            # NOTE: имя BRIN индекса тоже уникально в схеме - если он
+            # есть у старой таблицы, новая осталась бы без индекса
+            request = f"""
+                DROP INDEX IF EXISTS data."{name}_brin";
+                """
+            await cls.transaction(request)
+
+            # new table, bars are copied in order of time - so BRIN
+            # index is compact from the start
+            await cls.__createBarsDataTable(bars_table_name, data_type)
+            if first_dt is not None:
+                await cls.__createBarsPartitions(
+                    bars_table_name, first_dt.year, last_dt.year
+                )
+                request = f"""
+                    INSERT INTO {bars_table_name}
+                        (dt, open, high, low, close, volume)
+                    SELECT dt, open, high, low, close, volume
+                    FROM {old_table_name}
+                    ORDER BY dt
+                    ;
+                    """
+                await cls.transaction(request)
+
+            request = f"""
+                DROP TABLE {old_table_name};
+                """
+            await cls.transaction(request)
+
+    # }}}
     @classmethod  # __createBarsDataTable  # {{{
-    async def __createBarsDataTable(cls, bars_table_name: str) -> None:
+    async def __createBarsDataTable(
+        cls, bars_table_name: str, data_type
+    ) -> None:
         """Create a separate table for bars
 
         Every asset have market data candles in different timeframes.
@@ -2137,6 +2731,11 @@ class Keeper:
             - data."MOEX_SHARE_SBER_1H"
             - data."MOEX_SHARE_SBER_D"
             - ...
+
+        Table is partitioned by year, partitions are created on adding of
+        bars: data."MOEX_SHARE_SBER_1M_2023"... Primary key on 'dt' is a
+        btree index in every partition, intraday tables have also BRIN
+        index - bars are appended in order of time, so it is very small.
         """
         logger.debug(f"{cls.__name__}.__createBarsDataTable()")
 
@@ -2148,10 +2747,449 @@ class Keeper:
             low float,
             close float,
             volume bigint
-            );
+            )
+            PARTITION BY RANGE (dt);
             """
         await cls.transaction(request)
 
+        if str(data_type) not in cls.__BRIN_DATA_TYPES:
+            return
+
+        # NOTE: старая обычная таблица (до миграции) остается как есть,
+        # BRIN создается только у партиционированной
+        request = f"""
+            SELECT relkind FROM pg_class
+            WHERE oid = to_regclass('{bars_table_name}');
+            """
+        records = await cls.transaction(request)
+        if records[0]["relkind"] != "p":
+            return
+
+        # index name without schema: "MOEX_SHARE_SBER_1M_brin"
+        brin_name = bars_table_name.split(".", 1)[1][:-1] + '_brin"'
+        request = f"""
+        CREATE INDEX IF NOT EXISTS {brin_name}
+            ON {bars_table_name} USING brin (dt);
+            """
+        await cls.transaction(request)
+
+    # }}}
+    @classmethod  # __createBarsPartitions  # {{{
+    async def __createBarsPartitions(
+        cls, bars_table_name: str, first_year: int, last_year: int
+    ) -> None:
+        """Create partitions of bars table for years, if not exist"""
+
+        logger.debug(f"{cls.__name__}.__createBarsPartitions()")
+
+        # NOTE: таблицы, созданные до партиционирования - обычные,
+        # в них партиции не создать, работают как раньше до миграции
+        request = f"""
+            SELECT relkind FROM pg_class
+            WHERE oid = to_regclass('{bars_table_name}');
+            """
+        records = await cls.transaction(request)
+        if records and records[0]["relkind"] != "p":
+            logger.warning(
+                f"Table {bars_table_name} is not partitioned, "
+                "run Keeper.migrateBarsData()"
+            )
+            return
+
+        for year in range(first_year, last_year + 1):
+            partition = cls.__getPartitionName(bars_table_name, year)
+            request = f"""
+            CREATE TABLE IF NOT EXISTS {partition}
+                PARTITION OF {bars_table_name}
+                FOR VALUES
+                    FROM ('{year}-01-01 00:00:00+00')
+                    TO ('{year + 1}-01-01 00:00:00+00');
+                """
+            await cls.transaction(request)
+
+    # }}}
+    @classmethod  # __bumpDataVersion  # {{{
+    async def __bumpDataVersion(cls, instrument, data_type) -> None:
+        """Increment counter of changes of bars
+
+        Must be called inside transaction with the change itself. Row
+        of counter is never deleted - after delete of all bars and new
+        download the counter goes on, old versions don't come back.
+        """
+        logger.debug(f"{cls.__name__}.__bumpDataVersion()")
+
+        request = f"""
+            INSERT INTO data."DataVersion" (data_type, figi, version)
+            VALUES ('{data_type.name}', '{instrument.figi}', 1)
+            ON CONFLICT (data_type, figi) DO UPDATE SET
+                version = data."DataVersion".version + 1
+                ;
+            """
+        await cls.transaction(request)
+
+    # }}}
+    @classmethod  # __copyBarsData  # {{{
+    async def __copyBarsData(cls, conn, bars_table_name: str, bars) -> None:
+        """Bulk load bars with binary COPY
+
+        Bars copied by chunks into temporary staging table, then merged
+        into bars table with upsert. Must be called inside transaction.
+        """
+        logger.debug(f"{cls.__name__}.__copyBarsData()")
+
+        staging = "_bars_staging"
+        columns = ("dt", "open", "high", "low", "close", "volume")
+
+        request = f"""
+            CREATE TEMP TABLE IF NOT EXISTS {staging}
+                (LIKE {bars_table_name} INCLUDING DEFAULTS)
+                ON COMMIT DROP;
+            """
+        await conn.execute(request)
+
+        begin = time.perf_counter()
+        count = 0
+        for i in range(0, len(bars), cls.COPY_CHUNK_SIZE):
+            chunk = bars[i : i + cls.COPY_CHUNK_SIZE]
+            records = (
+                (b.dt, b.open, b.high, b.low, b.close, int(b.vol))
+                for b in chunk
+            )
+            await conn.copy_records_to_table(
+                staging, records=records, columns=columns
+            )
+            count += len(chunk)
+
+        request = f"""
+            INSERT INTO {bars_table_name} (dt, open, high, low, close, volume)
+            SELECT dt, open, high, low, close, volume FROM {staging}
+            ON CONFLICT (dt) DO UPDATE SET
+                open = EXCLUDED.open,
+                high = EXCLUDED.high,
+                low = EXCLUDED.low,
+                close = EXCLUDED.close,
+                volume = EXCLUDED.volume
+                ;
+            DROP TABLE {staging};
+            """
+        await conn.execute(request)
+
+        seconds = time.perf_counter() - begin
+        speed = count / seconds if seconds else 0
+        logger.info(
+            f"   - copy {count} bars into {bars_table_name} "
+            f"({seconds:.2f} sec, {speed:.0f} rows/sec)"
+        )
+
+    # }}}
+    @classmethod  # __track  # {{{
+    def __track(cls, class_name: str, obj) -> bool:
+        """Remember obj in active unit of work
+
+        Return False if there is no unit of work, or obj is not tracked
+        """
+        work = cls.__UNIT_OF_WORK.get()
+        if work is None or class_name not in cls.__TRACKED:
+            return False
+
+        table, key = cls.__TRACKED[class_name]
+        work[table][str(getattr(obj, key))] = obj
+        return True
+
+    # }}}
+    @classmethod  # __untrack  # {{{
+    def __untrack(cls, class_name: str, obj) -> None:
+        work = cls.__UNIT_OF_WORK.get()
+        if work is None or class_name not in cls.__TRACKED:
+            return
+
+        table, key = cls.__TRACKED[class_name]
+        obj_id = str(getattr(obj, key))
+        work[table].pop(obj_id, None)
+
+        # NOTE: в базе ордера и операции удаляются вместе с трейдом
+        # (ON DELETE CASCADE), значит и из unit of work их надо убрать,
+        # иначе при flush они запишутся со ссылкой на удаленный трейд
+        dependents = {
+            "Trade": (("Order", "trade_id"), ("Operation", "trade_id")),
+            "Order": (("Operation", "order_id"),),
+        }
+        for dependent, ref in dependents.get(table, ()):
+            tracked = work[dependent]
+            for i in [
+                k for k, v in tracked.items() if str(getattr(v, ref)) == obj_id
+            ]:
+                del tracked[i]
+
+    # }}}
+    @classmethod  # __flushUnitOfWork  # {{{
+    async def __flushUnitOfWork(cls, work: dict) -> None:
+        logger.debug(f"{cls.__name__}.__flushUnitOfWork()")
+
+        trades = [cls.__tradeRecord(i) for i in work["Trade"].values()]
+        orders = [cls.__orderRecord(i) for i in work["Order"].values()]
+        operations = [
+            cls.__operationRecord(i) for i in work["Operation"].values()
+        ]
+        if not (trades or orders or operations):
+            return
+
+        # NOTE: порядок важен - Order и Operation ссылаются на Trade
+        begin = time.perf_counter()
+        async with cls.connection() as conn:
+            async with conn.transaction():
+                await cls.__copyRecords(conn, "Trade", "trade_id", trades)
+                await cls.__copyRecords(conn, "Order", "order_id", orders)
+                await cls.__copyRecords(
+                    conn, "Operation", "operation_id", operations
+                )
+
+        seconds = time.perf_counter() - begin
+        logger.info(
+            f"   - flush {len(trades)} trades, {len(orders)} orders, "
+            f"{len(operations)} operations ({seconds:.2f} sec)"
+        )
+
+    # }}}
+    @classmethod  # __copyRecords  # {{{
+    async def __copyRecords(
+        cls, conn, table: str, key: str, records: list[tuple]
+    ) -> None:
+        """Upsert records into public table with binary COPY
+
+        Records must have all columns of table, in order of table.
+        Must be called inside transaction.
+        """
+        logger.debug(f"{cls.__name__}.__copyRecords()")
+
+        if not records:
+            return
+
+        columns = cls.__RECORD_COLUMNS[table]
+        staging = f"_{table.lower()}_staging"
+        request = f"""
+            CREATE TEMP TABLE IF NOT EXISTS {staging}
+                (LIKE "{table}" INCLUDING DEFAULTS)
+                ON COMMIT DROP;
+            """
+        await conn.execute(request)
+        await conn.copy_records_to_table(
+            staging, records=records, columns=columns
+        )
+
+        pg_columns = ", ".join(columns)
+        pg_update = ",\n".join(
+            f"{i} = EXCLUDED.{i}" for i in columns if i != key
+        )
+        request = f"""
+            INSERT INTO "{table}" ({pg_columns})
+            SELECT {pg_columns} FROM {staging}
+            ON CONFLICT ({key}) DO UPDATE SET
+                {pg_update}
+                ;
+            DROP TABLE {staging};
+            """
+        await conn.execute(request)
+
+    # }}}
+    @classmethod  # __tradeRecord  # {{{
+    def __tradeRecord(cls, trade) -> tuple:
+        # same values as __addTrade
+        return (
+            str(trade.trade_id),
+            str(trade.trade_list_name),
+            str(trade.instrument.figi),
+            str(trade.strategy),
+            str(trade.version),
+            trade.dt,
+            trade.status.name,
+            trade.type.name,
+            Cmd.toJson(trade.info, trade.encoderJson),
+        )
+
+    # }}}
+    @classmethod  # __orderRecord  # {{{
+    def __orderRecord(cls, order) -> tuple:
+        # same values as __addOrder
+        price, s_price, e_price = None, None, None
+        if order.type.name == "LIMIT":
+            price = float(order.price)
+        elif order.type.name in ("STOP", "STOP_LOSS", "TAKE_PROFIT"):
+            s_price = float(order.stop_price)
+            e_price = float(order.exec_price) if order.exec_price else None
+
+        return (
+            str(order.order_id),
+            str(order.trade_id),
+            str(order.account_name),
+            str(order.instrument.figi),
+            order.type.name,
+            order.status.name,
+            order.direction.name,
+            int(order.lots),
+            int(order.quantity),
+            price,
+            s_price,
+            e_price,
+            int(order.exec_lots),
+            int(order.exec_quantity),
+            str(order.broker_id),
+            str(order.meta),
+        )
+
+    # }}}
+    @classmethod  # __operationRecord  # {{{
+    def __operationRecord(cls, operation) -> tuple:
+        # same values as __addOperation
+        return (
+            str(operation.operation_id),
+            str(operation.order_id),
+            str(operation.trade_id),
+            str(operation.account_name),
+            str(operation.instrument.figi),
+            operation.dt,
+            operation.direction.name,
+            int(operation.lots),
+            int(operation.quantity),
+            float(operation.price),
+            float(operation.amount),
+            float(operation.commission),
+            str(operation.meta),
+        )
+
+    # }}}
+    @classmethod  # __copyBinaryBars  # {{{
+    async def __copyBinaryBars(cls, conn, request: str) -> tuple:
+        """Run request with binary COPY, return decoded columns
+
+        Request must select dt, open, high, low, close, volume without
+        NULL - see __decodeBinaryBars.
+        """
+
+        chunks = list()
+
+        async def collect(chunk):
+            chunks.append(chunk)
+
+        await conn.copy_from_query(request, output=collect, format="binary")
+        return cls.__decodeBinaryBars(b"".join(chunks))
+
+    # }}}
+    @classmethod  # __decodeBinaryBars  # {{{
+    def __decodeBinaryBars(cls, buf: bytes) -> tuple:
+        """Decode bars from postgres binary COPY format
+
+        Row: int16 fields count, then 6 fields, each is int32 length + data:
+        dt timestamptz (int64 microseconds since 2000-01-01 UTC),
+        open, high, low, close float8, volume int8.
+        """
+        logger.debug(f"{cls.__name__}.__decodeBinaryBars()")
+
+        # header: 11 bytes signature, int32 flags, int32 extension length
+        signature = b"PGCOPY\n\xff\r\n\x00"
+        assert buf[:11] == signature
+        ext_len = int.from_bytes(buf[15:19], "big")
+        offset = 19 + ext_len
+
+        row = np.dtype(
+            [
+                ("n", ">i2"),
+                ("l_dt", ">i4"),
+                ("dt", ">i8"),
+                ("l_open", ">i4"),
+                ("open", ">f8"),
+                ("l_high", ">i4"),
+                ("high", ">f8"),
+                ("l_low", ">i4"),
+                ("low", ">f8"),
+                ("l_close", ">i4"),
+                ("close", ">f8"),
+                ("l_vol", ">i4"),
+                ("vol", ">i8"),
+            ]
+        )
+        count = (len(buf) - offset - 2) // row.itemsize  # 2 = trailer int16
+        rows = np.frombuffer(buf, dtype=row, count=count, offset=offset)
+
+        us = rows["dt"].astype(np.int64) + cls.__PG_EPOCH_US
+        dt = (us * 1000).astype("datetime64[ns]")
+
+        return (
+            dt,
+            rows["open"].astype(np.float64),
+            rows["high"].astype(np.float64),
+            rows["low"].astype(np.float64),
+            rows["close"].astype(np.float64),
+            rows["vol"].astype(np.int64),
+        )
+
+    # }}}
+    @classmethod  # __columnsToBatch  # {{{
+    def __columnsToBatch(cls, Class, columns: tuple) -> Any:
+        """Convert slice of bar columns to Bar, BarArray or records"""
+
+        if cls.__getClassName(Class) == "BarArray":
+            return Class(*columns)
+
+        dt, opn, hgh, low, close, vol = columns
+        dt = dt.astype("datetime64[us]").tolist()
+        records = [
+            {
+                "dt": dt[i].replace(tzinfo=UTC),
+                "open": float(opn[i]),
+                "high": float(hgh[i]),
+                "low": float(low[i]),
+                "close": float(close[i]),
+                "volume": int(vol[i]),
+            }
+            for i in range(len(dt))
+        ]
+        if cls.__getClassName(Class) == "Bar":
+            return [Class.fromRecord(i) for i in records]
+
+        return records
+
+    # }}}
+    @classmethod  # __barStore  # {{{
+    def __barStore(cls) -> _ArrowBarStore | None:
+        """Return local store of bars, None - bars are in postgres"""
+
+        if cls.BAR_STORE == "postgres":
+            return None
+
+        assert cls.BAR_STORE == "arrow", f"Unknown store '{cls.BAR_STORE}'"
+        return _ArrowBarStore(cls.BAR_DIR)
+
+    # }}}
+    @classmethod  # __formatPeriod  # {{{
+    def __formatPeriod(cls, begin, end) -> str:
+        # create condition for half open period [begin, end)
+        if begin is None and end is None:
+            pg_period = "TRUE"
+        elif begin is not None and end is None:
+            pg_period = f"'{begin}' <= dt"
+        elif begin is None and end is not None:
+            pg_period = f"dt < '{end}'"
+        else:
+            pg_period = f"'{begin}' <= dt AND dt < '{end}'"
+
+        return pg_period
+
+    # }}}
+    @classmethod  # __removeDeadPools  # {{{
+    def __removeDeadPools(cls) -> None:
+        # loop, созданный asyncio.run, после завершения закрыт,
+        # его pool уже никто не закроет штатно - просто обрываем соединения
+        for loop in list(cls.__POOLS.keys()):
+            if not loop.is_closed():
+                continue
+
+            pool = cls.__POOLS.pop(loop)
+            try:
+                pool.terminate()
+            except Exception as err:
+                logger.warning(f"Terminate pool failed: {err}")
+
     # }}}
     @classmethod  # __getClassName  # {{{
     def __getClassName(cls, obj) -> str:
@@ -2177,17 +3215,29 @@ class Keeper:
         return bars_table_name
 
     # }}}
-    @classmethod  # __formatBarsData  # {{{
-    def __formatBarsData(cls, data) -> str:
-        # Format bars data in postges value
-        values = ""
-        for b in data.bars:
-            dt = f"'{b.dt.isoformat()}'"
-            val = f"({dt},{b.open},{b.high},{b.low},{b.close},{b.vol}),\n"
-            values += val
+    @classmethod  # __wholeYears  # {{{
+    def __wholeYears(cls, begin: datetime, end: datetime) -> list[int]:
+        """Return years, which are entirely inside of [begin, end) UTC"""
 
-        values = values[0:-2]  # remove ",\n" after last value
-        return values
+        begin = begin if begin.tzinfo else begin.replace(tzinfo=UTC)
+        end = end if end.tzinfo else end.replace(tzinfo=UTC)
+
+        years = list()
+        first_year = begin.astimezone(UTC).year
+        last_year = end.astimezone(UTC).year
+        for year in range(first_year, last_year + 1):
+            year_begin = datetime(year, 1, 1, tzinfo=UTC)
+            year_end = datetime(year + 1, 1, 1, tzinfo=UTC)
+            if begin <= year_begin and year_end <= end:
+                years.append(year)
+
+        return years
+
+    # }}}
+    @classmethod  # __getPartitionName  # {{{
+    def __getPartitionName(cls, bars_table_name: str, year: int) -> str:
+        # partition name looks like: data."MOEX_SHARE_SBER_1M_2023"
+        return f'{bars_table_name[:-1]}_{year}"'
 
     # }}}
     @classmethod  # __formatTradeInfo  # {{{
@@ -38,4 +38,13 @@ CREATE TABLE IF NOT EXISTS data."DataInfo" ( -- {{{
     PRIMARY KEY (data_source, data_type, figi)
     );
 -- }}}
+CREATE TABLE IF NOT EXISTS data."DataVersion" ( -- {{{
+    data_type "DataType" NOT NULL,
+    figi text NOT NULL,
+    version bigint NOT NULL,
+    PRIMARY KEY (data_type, figi)
+    );
+COMMENT ON TABLE data."DataVersion"
+    IS 'counter of changes of bars, +1 on every save and delete';
+-- }}}
 
@@ -6,10 +6,12 @@
 # LICENSE:      GNU GPLv3
 # ============================================================================
 
+from avin.tester.equity import Equity
 from avin.tester.test import Test, TestList
 from avin.tester.tester import Tester
 
 __all__ = (
+    "Equity",
     "Test",
     "TestList",
     "Tester",
@@ -0,0 +1,309 @@
+#!/usr/bin/env  python3
+# ============================================================================
+# URL:          http://arsvincere.com
+# AUTHOR:       Alex Avin
+# E-MAIL:       mr.alexavin@gmail.com
+# LICENSE:      GNU GPLv3
+# ============================================================================
+
+from __future__ import annotations
+
+from datetime import UTC, datetime
+from typing import Optional
+
+import numpy as np
+
+from avin.core import Direction, TransactionEvent, Trade
+from avin.utils import logger
+
+
+class Equity:  # {{{
+    """Equity curve and drawdown of test
+
+    Tester connects it to Strategy.tradeClosed and
+    VirtualBroker.new_transaction while test is running, work on every
+    event is O(1): result of closed trade is appended to numpy arrays
+    (capacity doubles when full), peak and max drawdown are updated
+    incrementally. Equity is realized - it changes only when trade
+    is closed.
+
+    Exposure - percent of test period, when at least one position is
+    open, it is counted by transactions.
+
+    Saved in config of Test, so curves are available without loading
+    and replaying trades.
+    """
+
+    CAPACITY = 1024
+
+    def __init__(  # {{{
+        self,
+        deposit: float,
+        begin: datetime,
+        end: datetime,
+    ):
+        logger.debug(f"{self.__class__.__name__}.__init__()")
+
+        self.__deposit = deposit
+        self.__begin = begin
+        self.__end = end
+
+        self.__dt = np.empty(self.CAPACITY, dtype="datetime64[ns]")
+        self.__equity = np.empty(self.CAPACITY, dtype=np.float64)
+        self.__drawdown = np.empty(self.CAPACITY, dtype=np.float64)
+        self.__size = 0
+
+        self.__peak = deposit
+        self.__max_drawdown = 0.0
+        self.__max_drawdown_percent = 0.0
+
+        self.__positions: dict[str, int] = dict()  # figi -> quantity
+        self.__in_market_since: Optional[datetime] = None
+        self.__exposure_sec = 0.0
+
+    # }}}
+    def __len__(self) -> int:  # {{{
+        return self.__size
+
+    # }}}
+    def __str__(self):  # {{{
+        return (
+            f"Equity={self.last} "
+            f"max_dd={self.max_drawdown} ({self.max_drawdown_percent}%) "
+            f"exposure={self.exposure}%"
+        )
+
+    # }}}
+
+    @property  # deposit  # {{{
+    def deposit(self) -> float:
+        return self.__deposit
+
+    # }}}
+    @property  # begin  # {{{
+    def begin(self) -> datetime:
+        return self.__begin
+
+    # }}}
+    @property  # end  # {{{
+    def end(self) -> datetime:
+        return self.__end
+
+    # }}}
+    @property  # dt  # {{{
+    def dt(self) -> np.ndarray:
+        """Close time of trades, datetime64[ns] UTC"""
+        return self.__dt[: self.__size]
+
+    # }}}
+    @property  # equity  # {{{
+    def equity(self) -> np.ndarray:
+        return self.__equity[: self.__size]
+
+    # }}}
+    @property  # drawdown  # {{{
+    def drawdown(self) -> np.ndarray:
+        """Drawdown from previous peak of equity, <= 0"""
+        return self.__drawdown[: self.__size]
+
+    # }}}
+    @property  # last  # {{{
+    def last(self) -> float:
+        if self.__size == 0:
+            return self.__deposit
+
+        return round(float(self.__equity[self.__size - 1]), 2)
+
+    # }}}
+    @property  # profit  # {{{
+    def profit(self) -> float:
+        return round(self.last - self.__deposit, 2)
+
+    # }}}
+    @property  # max_drawdown  # {{{
+    def max_drawdown(self) -> float:
+        return round(self.__max_drawdown, 2)
+
+    # }}}
+    @property  # max_drawdown_percent  # {{{
+    def max_drawdown_percent(self) -> float:
+        return round(self.__max_drawdown_percent, 2)
+
+    # }}}
+    @property  # exposure  # {{{
+    def exposure(self) -> float:
+        """Percent of test period with open position"""
+
+        period = (self.__end - self.__begin).total_seconds()
+        if period <= 0:
+            return 0.0
+
+        return round(self.__exposure_sec / period * 100, 2)
+
+    # }}}
+
+    def add(self, dt: datetime, result: float) -> None:  # {{{
+        """Append result of closed trade"""
+
+        if self.__size == len(self.__equity):
+            self.__grow()
+
+        i = self.__size
+        last = self.__equity[i - 1] if i else self.__deposit
+        value = float(last) + result
+        self.__peak = max(self.__peak, value)
+        drawdown = value - self.__peak
+
+        self.__dt[i] = self.__toNumpy(dt)
+        self.__equity[i] = value
+        self.__drawdown[i] = drawdown
+        self.__size += 1
+
+        if drawdown < self.__max_drawdown:
+            self.__max_drawdown = drawdown
+        percent = drawdown / self.__peak * 100 if self.__peak > 0 else 0.0
+        if percent < self.__max_drawdown_percent:
+            self.__max_drawdown_percent = percent
+
+    # }}}
+    def finish(self) -> None:  # {{{
+        """Close exposure interval, if position still open at the end"""
+
+        logger.debug(f"{self.__class__.__name__}.finish()")
+
+        if self.__in_market_since is not None:
+            duration = self.__end - self.__in_market_since
+            self.__exposure_sec += max(duration.total_seconds(), 0.0)
+            self.__in_market_since = None
+
+    # }}}
+    def dailyReturns(self) -> tuple[np.ndarray, np.ndarray]:  # {{{
+        """Return (days, percent) - change of equity by days
+
+        Only days with closed trades, equity of day - after the last
+        trade of day, the first day is compared with deposit.
+        """
+
+        logger.debug(f"{self.__class__.__name__}.dailyReturns()")
+
+        days = self.dt.astype("datetime64[D]")
+        if len(days) == 0:
+            return days, np.array([], dtype=np.float64)
+
+        last_of_day = np.flatnonzero(np.append(days[1:] != days[:-1], True))
+        equity = self.equity[last_of_day]
+        previous = np.concatenate(([self.__deposit], equity[:-1]))
+
+        returns = (equity / previous - 1.0) * 100
+        return days[last_of_day], np.round(returns, 2)
+
+    # }}}
+
+    # @async_slot  # onTradeClosed  # {{{
+    async def onTradeClosed(self, trade: Trade) -> None:
+        self.add(trade.closeDateTime(), trade.result())
+
+    # }}}
+    # @async_slot  # onTransaction  # {{{
+    async def onTransaction(self, event: TransactionEvent) -> None:
+        transaction = event.transaction
+        quantity = transaction.quantity
+        if event.direction == Direction.SELL:
+            quantity = -quantity
+
+        was_open = bool(self.__positions)
+        position = self.__positions.get(event.figi, 0) + quantity
+        if position:
+            self.__positions[event.figi] = position
+        else:
+            self.__positions.pop(event.figi, None)
+        is_open = bool(self.__positions)
+
+        if not was_open and is_open:
+            self.__in_market_since = transaction.dt
+        elif was_open and not is_open:
+            duration = transaction.dt - self.__in_market_since
+            self.__exposure_sec += duration.total_seconds()
+            self.__in_market_since = None
+
+    # }}}
+
+    @staticmethod  # toDict  # {{{
+    def toDict(equity: Equity) -> dict:
+        logger.debug("Equity.toDict()")
+
+        obj = {
+            "deposit": equity.deposit,
+            "begin": equity.begin.isoformat(),
+            "end": equity.end.isoformat(),
+            "exposure_sec": equity.__exposure_sec,
+            "dt": equity.dt.astype(np.int64).tolist(),
+            "equity": equity.equity.round(2).tolist(),
+        }
+        return obj
+
+    # }}}
+    @staticmethod  # fromDict  # {{{
+    def fromDict(obj: dict) -> Equity:
+        logger.debug("Equity.fromDict()")
+
+        equity = Equity(
+            obj["deposit"],
+            datetime.fromisoformat(obj["begin"]),
+            datetime.fromisoformat(obj["end"]),
+        )
+        equity.__exposure_sec = obj["exposure_sec"]
+
+        dt = np.array(obj["dt"], dtype=np.int64).view("datetime64[ns]")
+        values = np.array(obj["equity"], dtype=np.float64)
+        equity.__setSeries(dt, values)
+
+        return equity
+
+    # }}}
+
+    def __grow(self) -> None:  # {{{
+        capacity = max(2 * len(self.__equity), self.CAPACITY)
+        self.__dt = np.resize(self.__dt, capacity)
+        self.__equity = np.resize(self.__equity, capacity)
+        self.__drawdown = np.resize(self.__drawdown, capacity)
+
+    # }}}
+    def __setSeries(self, dt: np.ndarray, values: np.ndarray) -> None:  # {{{
+        # NOTE: при загрузке просадка считается заново векторно,
+        # сохраняются только время и equity
+        peak = np.maximum.accumulate(
+            np.concatenate(([self.__deposit], values))
+        )[1:]
+        drawdown = values - peak
+
+        self.__dt = dt
+        self.__equity = values
+        self.__drawdown = drawdown
+        self.__size = len(values)
+        if self.__size == 0:
+            self.__grow()
+            return
+
+        self.__peak = float(peak[-1])
+        self.__max_drawdown = min(float(drawdown.min()), 0.0)
+        self.__max_drawdown_percent = min(
+            float((drawdown / peak * 100).min()), 0.0
+        )
+
+    # }}}
+    def __toNumpy(self, dt: datetime) -> np.datetime64:  # {{{
+        # offset-aware -> naive UTC
+        if dt.tzinfo is not None:
+            dt = dt.astimezone(UTC).replace(tzinfo=None)
+
+        return np.datetime64(dt, "ns")
+
+    # }}}
+
+
+# }}}
+
+
+if __name__ == "__main__":
+    ...
@@ -8,8 +8,11 @@
 
 from __future__ import annotations
 
+import asyncio
+import heapq
+import itertools
 from collections import defaultdict
-from datetime import UTC, datetime
+from datetime import UTC, datetime, timedelta
 
 from avin.const import DAY_BEGIN, ONE_MINUTE
 from avin.core import (
@@ -20,6 +23,8 @@ from avin.core import (
     TimeFrame,
     TimeFrameList,
 )
+from avin.data import BarArray
+from avin.data.bar import _Bar
 from avin.keeper import Keeper
 from avin.utils import Date, logger
 
@@ -32,8 +37,8 @@ from avin.utils import Date, logger
 
 """BarStream - выдает бары по очереди в хронологическом порядке
 
-Пока работает только с одним активом. Assert если попытаться подписаться
-на несколько разных активов.
+Работает с любым количеством активов: выдача по всем активам и
+таймфреймам сливается в один поток по времени закрытия бара.
 
 Выдает свечи сначала младшего таймфрейма, потом старшего 1M - 5M - 1H - D ...
 
@@ -130,53 +135,58 @@ class BarStream:
         self.__subscriptions: defaultdict[Asset, TimeFrameList] = defaultdict(
             TimeFrameList
         )
-        self.__bars = dict()
-        self.__asset = None
+        self.__bars: dict[tuple[Asset, TimeFrame], BarArray] = dict()
         self.__begin = None
         self.__end = None
 
     # }}}
     def __iter__(self):  # {{{
-        timeframes = sorted(self.__bars.keys())
+        # NOTE: вместо bars.pop(0) и шага времени по минуте - курсоры.
+        # Для каждой пары (актив, таймфрейм) храним индекс текущего бара
+        # и время, когда он закроется. Курсоры лежат в куче, время сразу
+        # прыгает к ближайшему закрытию, ночи, выходные и праздники
+        # пропускаются. Порядок событий прежний: за одну минуту по каждой
+        # паре не больше одного закрытого бара, сначала младшие
+        # таймфреймы, при равенстве - активы по figi.
+        heap = list()
+        timeframes = sorted({tf for _, tf in self.__bars.keys()})
+        for (asset, timeframe), bars in self.__bars.items():
+            cursor = _Cursor(asset.figi, timeframe, bars, self.__begin)
+            if cursor.due is None:
+                continue
 
-        time = self.__begin
-        while time < self.__end:
-            for timeframe in timeframes:
-                bars = self.__bars[timeframe]
-                if not bars:
-                    continue
-                if time < bars[0].dt + timeframe:
-                    continue
+            rank = timeframes.index(timeframe)
+            heapq.heappush(heap, (cursor.due, rank, asset.figi, cursor))
+
+        while heap:
+            time = heap[0][0]
+            if time >= self.__end:
+                return
+
+            while heap and heap[0][0] == time:
+                _, rank, figi, cursor = heapq.heappop(heap)
 
                 # send new historical bar
-                last_bar = bars.pop(0)
-                figi = self.__asset.figi
-                historical = NewHistoricalBarEvent(figi, timeframe, last_bar)
+                last_bar = cursor.bar()
+                historical = NewHistoricalBarEvent(
+                    figi, cursor.timeframe, last_bar
+                )
                 yield historical
+                cursor.next(time + ONE_MINUTE)
 
                 # send now bar
-                if not bars:
+                if cursor.due is None:
                     continue
-                now_bar = bars[0]
-                now_changed = BarChangedEvent(figi, timeframe, now_bar)
+                now_bar = cursor.bar()
+                now_changed = BarChangedEvent(figi, cursor.timeframe, now_bar)
                 yield now_changed
 
-            time += ONE_MINUTE
+                heapq.heappush(heap, (cursor.due, rank, figi, cursor))
 
     # }}}
     def subscribe(self, asset, timeframe) -> None:  # {{{
         self.__subscriptions[asset].add(timeframe)
 
-        if self.__asset is None:
-            self.__asset = asset  # сохраняем ассет от первой подписки
-        else:
-            # NOTE:
-            # пока можно подписываться только на один и тот же ассет
-            # на разные таймфреймы. Выдача баров по нескольким активам
-            # одновременно не реализована.
-            # Чтобы не забыть - впилю тут асерт
-            assert self.__asset == asset
-
     # }}}
     async def loadData(self, begin: Date, end: Date):  # {{{
         logger.debug(f"{self.__class__.__name__}.loadData()")
@@ -187,157 +197,273 @@ class BarStream:
         self.__begin = datetime.combine(begin, DAY_BEGIN, UTC)
         self.__end = datetime.combine(end, DAY_BEGIN, UTC)
 
+        # load all (asset, timeframe) pairs concurrently
+        keys = list()
+        requests = list()
         for asset, tflist in self.__subscriptions.items():
             for timeframe in tflist:
-                bars = await Keeper.get(
-                    Bar,
-                    instrument=asset,
-                    timeframe=timeframe,
-                    begin=begin,
-                    end=end,
-                )
-                self.__bars[timeframe] = bars
+                keys.append((asset, timeframe))
+                requests.append(_loadBars(asset, timeframe, begin, end))
+        results = await asyncio.gather(*requests)
+        self.__bars = dict(zip(keys, results))
+
+    # }}}
+
+
+class _Cursor:
+    """Позиция в массиве баров одной пары (актив, таймфрейм)"""
+
+    def __init__(  # {{{
+        self,
+        figi: str,
+        timeframe: TimeFrame,
+        bars: BarArray,
+        begin: datetime,
+    ):
+        self.figi = figi
+        self.timeframe = timeframe
+        self.bars = bars
+        self.index = 0
+        self.due = self.__dueTime(0)  # когда закроется текущий бар
+        if self.due is not None:
+            self.due = max(self.due, begin)
+
+    # }}}
+    def __lt__(self, other: _Cursor) -> bool:  # {{{
+        # в куче курсоры сравниваются только при равных ключах,
+        # а (figi, timeframe) уникальны - сюда не дойдет
+        return id(self) < id(other)
+
+    # }}}
+    def bar(self) -> Bar:  # {{{
+        return _toBar(self.bars[self.index])
+
+    # }}}
+    def next(self, not_before: datetime) -> None:  # {{{
+        """Move cursor to next bar
+
+        Если следующий бар уже закрыт (дырка в данных), он все равно
+        выдается не раньше следующей минуты - как было при шаге по минуте
+        """
+        self.index += 1
+        due = self.__dueTime(self.index)
+        if due is not None:
+            due = max(due, not_before)
+        self.due = due
+
+    # }}}
+    def __dueTime(self, index: int) -> datetime | None:  # {{{
+        if index >= len(self.bars):
+            return None
+
+        return self.bars.datetime(index) + self.timeframe
 
     # }}}
 
 
 class BarStream2:
+    """Поток баров, который грузит из БД только 1М бары
+
+    Старшие таймфреймы (5M, 10M, 1H, D) собираются из 1М на лету,
+    O(1) на каждый минутный бар. Бары старших таймфреймов выровнены
+    так же, как при конвертации в _DataManager - от начала суток UTC.
+
+    Отличие от BarStream: событие BAR_CHANGED старшего таймфрейма
+    приходит после каждого минутного бара и содержит недостроенный
+    бар, а не готовый бар из будущего. Когда бар достроен - приходит
+    NEW_HISTORICAL_BAR, в момент его закрытия, как в BarStream.
+    """
+
+    TIMEFRAMES = ("1M", "5M", "10M", "1H", "D")
+
     def __init__(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.__init__()")
 
-        self.__asset = None
-        self.__timeframe_list = TimeFrameList()
+        self.__subscriptions: defaultdict[Asset, TimeFrameList] = defaultdict(
+            TimeFrameList
+        )
+        self.__bars: dict[Asset, BarArray] = dict()  # 1M bars
         self.__begin = None
         self.__end = None
-        self.__bars = list()  # 1m bars
-        self.__time = None
 
     # }}}
     def __iter__(self):  # {{{
-        timeframes = sorted(self.__bars.keys())
+        # поток каждого актива упорядочен сам по себе, сливаем их
+        # с тем же порядком что в BarStream: (время, таймфрейм, figi)
+        streams = [
+            self.__assetEvents(asset, tflist)
+            for asset, tflist in self.__subscriptions.items()
+        ]
+        for *_, event in heapq.merge(*streams):
+            yield event
 
-        self.__time = self.__begin
-        self.__sendInitialBars()
+    # }}}
+    def subscribe(self, asset, timeframe) -> None:  # {{{
+        assert str(timeframe) in self.TIMEFRAMES
 
-        while self.__time < self.__end:
-            time += ONE_MINUTE
+        self.__subscriptions[asset].add(timeframe)
 
-            if not self.__bars:
-                continue
-            if self.__time < self.__bars[0].dt + ONE_MINUTE:
-                continue
+    # }}}
+    async def loadData(self, begin: Date, end: Date):  # {{{
+        logger.debug(f"{self.__class__.__name__}.loadData()")
+        assert isinstance(begin, Date)
+        assert isinstance(end, Date)
 
-            # send 1m historical bar
-            last_bar = self.__bars.pop(0)
-            figi = self.__asset.figi
-            historical = NewHistoricalBarEvent(figi, timeframe, last_bar)
-            yield historical
+        self.__bars.clear()
+        self.__begin = datetime.combine(begin, DAY_BEGIN, UTC)
+        self.__end = datetime.combine(end, DAY_BEGIN, UTC)
 
-            # send 1m now bar
-            if not bars:
-                continue
-            now_bar = bars[0]
-            now_changed = BarChangedEvent(figi, timeframe, now_bar)
-            yield now_changed
-
-            # send other timeframes
-            if self.__bar_5M is not None:
-                self.__sendBar5M(now_bar)
-            if self.__bar_1H is not None:
-                self.__sendBar1H(now_bar)
-            if self.__bar_D is not None:
-                self.__sendBarD(now_bar)
+        assets = list(self.__subscriptions.keys())
+        requests = [
+            _loadBars(asset, TimeFrame("1M"), begin, end) for asset in assets
+        ]
+        results = await asyncio.gather(*requests)
+        self.__bars = dict(zip(assets, results))
 
     # }}}
-    def setAsset(self, asset: Asset) -> None:  # {{{
-        logger.debug(f"{self.__class__.__name__}.setAsset()")
-        assert isinstance(asset, Asset)
 
-        self.__asset = asset
+    def __assetEvents(self, asset, tflist):  # {{{
+        """Events of one asset as tuples (time, rank, figi, n, event)"""
+
+        figi = asset.figi
+        bars = self.__bars[asset]
+        one_minute = TimeFrame("1M")
+        send_1m = one_minute in tflist
+        builders = [_BarBuilder(i) for i in sorted(tflist) if i != one_minute]
+        n = itertools.count()  # порядок событий внутри одного момента
+
+        for i in range(len(bars)):
+            bar = bars[i]
+            time = max(bar.dt + ONE_MINUTE, self.__begin)
+            if time >= self.__end:
+                break
+
+            # бары старших таймфреймов, которые закрылись раньше этого
+            # минутного бара (дырка в данных, ночь, выходные)
+            closed = [j for j in builders if j.isClosedBefore(bar.dt)]
+            closed.sort(key=lambda x: (x.end, x.rank))
+            for builder in closed:
+                event = builder.historicalEvent(figi)
+                yield builder.end, builder.rank, figi, next(n), event
+
+            # 1M bar
+            if send_1m:
+                last_bar = _toBar(bar)
+                event = NewHistoricalBarEvent(figi, one_minute, last_bar)
+                yield time, 1, figi, next(n), event
+
+                if i + 1 < len(bars):
+                    now_bar = _toBar(bars[i + 1])
+                    event = BarChangedEvent(figi, one_minute, now_bar)
+                    yield time, 1, figi, next(n), event
+
+            # other timeframes
+            for builder in builders:
+                builder.add(bar)
+                if builder.end == time:
+                    event = builder.historicalEvent(figi)
+                else:
+                    event = builder.changedEvent(figi)
+                yield time, builder.rank, figi, next(n), event
+
+        # последние бары старших таймфреймов
+        closed = [j for j in builders if j.isClosedBefore(self.__end)]
+        closed.sort(key=lambda x: (x.end, x.rank))
+        for builder in closed:
+            event = builder.historicalEvent(figi)
+            yield builder.end, builder.rank, figi, next(n), event
 
     # }}}
-    def subscribe(self, timeframe) -> None:  # {{{
-        assert str(timeframe) in ("1H", "5M", "1H", "D")
 
-        self.__timeframe_list.add(timeframe)
 
-    # }}}
-    async def loadData(self, begin: Date, end: Date):  # {{{
-        logger.debug(f"{self.__class__.__name__}.loadData()")
-        assert isinstance(begin, Date)
-        assert isinstance(end, Date)
+class _BarBuilder:
+    """Собирает бар старшего таймфрейма из минутных баров"""
 
-        self.__bars = await Keeper.get(
-            Bar,
-            instrument=self.__asset,
-            timeframe=TimeFrame("1M"),
-            begin=begin,
-            end=end,
+    def __init__(self, timeframe: TimeFrame):  # {{{
+        self.timeframe = timeframe
+        self.rank = timeframe.minutes()
+        self.period = timeframe.minutes()
+        self.bar = None  # bar under construction
+        self.end = None  # close time of this bar
+
+    # }}}
+    def add(self, bar_1m) -> None:  # {{{
+        if self.bar is None:
+            self.__begin(bar_1m)
+            return
+
+        self.bar = Bar(
+            self.bar.dt,
+            self.bar.open,
+            max(self.bar.high, bar_1m.high),
+            min(self.bar.low, bar_1m.low),
+            bar_1m.close,
+            self.bar.vol + bar_1m.vol,
         )
-        self.__begin = datetime.combine(begin, DAY_BEGIN, UTC)
-        self.__end = datetime.combine(end, DAY_BEGIN, UTC)
 
     # }}}
+    def isClosedBefore(self, dt: datetime) -> bool:  # {{{
+        return self.bar is not None and self.end <= dt
 
-    def __sendInitialBars(self):  # {{{
-        # send first 1m historical bar
-        first_bar = self.__bars.pop(0)
-        figi = self.__asset.figi
-        event = NewHistoricalBarEvent(figi, TimeFrame("1M"), first_bar)
-        yield event
-
-        # send first 1m real-time bar
-        now_bar = self.__bars.pop(0)
-
-        # send other timeframes real-time bars
-        if TimeFrame("5M") in self.__timeframe_list:
-            self.__bar_5m = first_bar
-            self.__time_5m = self.__getNextTime(TimeFrame("5M"), first_bar)
-            event = BarChangedEvent(figi, TimeFrame("1H"), first_bar)
-            yield event
-        if TimeFrame("1H") in self.__timeframe_list:
-            self.__bar_1h = first_bar
-            self.__time_1h = self.__getNextTime(TimeFrame("1H"), first_bar)
-            event = BarChangedEvent(figi, TimeFrame("1H"), first_bar)
-            yield event
-        if TimeFrame("D") in self.__timeframe_list:
-            self.__bar_d = first_bar
-            self.__time_d = self.__getNextTime(TimeFrame("D"), first_bar)
-            event = BarChangedEvent(figi, TimeFrame("D"), first_bar)
-            yield event
+    # }}}
+    def historicalEvent(self, figi: str) -> NewHistoricalBarEvent:  # {{{
+        event = NewHistoricalBarEvent(figi, self.timeframe, self.bar)
+        self.bar = None
+        self.end = None
+        return event
 
     # }}}
-    def __sendBar1H(self, bar_1m: Bar):  # {{{
-        if self.__time < self.__time_1h:
-            self.__bar_1H = self.__joinBar(self.__bar_1H, bar_1m)
-            event = BarChangedEvent(figi, TimeFrame("1H"), self.__bar_1H)
-            return event
-
-        while time < self.__end:
-            for timeframe in timeframes:
-                bars = self.__bars[timeframe]
-                if not bars:
-                    continue
-                if time < bars[0].dt + timeframe:
-                    continue
+    def changedEvent(self, figi: str) -> BarChangedEvent:  # {{{
+        return BarChangedEvent(figi, self.timeframe, self.bar)
 
-                # send new historical bar
-                last_bar = bars.pop(0)
-                figi = self.__asset.figi
-                historical = NewHistoricalBarEvent(figi, timeframe, last_bar)
-                yield historical
+    # }}}
+    def __begin(self, bar_1m) -> None:  # {{{
+        # начало бара - от начала суток UTC с шагом в период таймфрейма
+        day = bar_1m.dt.replace(hour=0, minute=0, second=0, microsecond=0)
+        minutes = bar_1m.dt.hour * 60 + bar_1m.dt.minute
+        dt = day + timedelta(minutes=minutes // self.period * self.period)
+
+        self.end = dt + self.timeframe
+        self.bar = Bar(
+            dt,
+            bar_1m.open,
+            bar_1m.high,
+            bar_1m.low,
+            bar_1m.close,
+            bar_1m.vol,
+        )
+
+    # }}}
 
-                # send now bar
-                if not bars:
-                    continue
-                now_bar = bars[0]
-                now_changed = BarChangedEvent(figi, timeframe, now_bar)
-                yield now_changed
 
-            time += ONE_MINUTE
+def _toBar(bar: _Bar) -> Bar:  # {{{
+    return Bar(bar.dt, bar.open, bar.high, bar.low, bar.close, bar.vol)
 
 
 # }}}
+async def _loadBars(  # {{{
+    asset: Asset, timeframe: TimeFrame, begin: Date, end: Date
+) -> BarArray:
+    """Load bars with Keeper.stream, batches are joined in one array
+
+    Decoding of a batch goes in parallel with fetching of the next one.
+    """
+
+    batches = [
+        bars
+        async for bars in Keeper.stream(
+            BarArray,
+            instrument=asset,
+            timeframe=timeframe,
+            begin=begin,
+            end=end,
+        )
+    ]
+    return BarArray.concat(batches)
+
+
+# }}}
+
 
 if __name__ == "__main__":
     ...
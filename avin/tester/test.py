@@ -14,12 +14,14 @@ from typing import Iterator, Optional
 
 from avin.core import (
     Asset,
+    AssetList,
     Strategy,
     Summary,
     TimeFrame,
     TradeList,
 )
 from avin.keeper import Keeper
+from avin.tester.equity import Equity
 from avin.utils import Cmd, Signal, logger
 
 
@@ -50,6 +52,7 @@ class Test:  # {{{
         self.__name = name
         self.__strategy: Optional[Strategy] = None
         self.__asset: Optional[Asset] = None
+        self.__asset_list: Optional[AssetList] = None
         self.__enable_long = True
         self.__enable_short = True
         self.__deposit = 100000.0
@@ -62,6 +65,7 @@ class Test:  # {{{
         self.__test_list = None
         self.__status = Test.Status.NEW
         self.__time_step = TimeFrame("1M")
+        self.__equity: Optional[Equity] = None
 
         # set owner
         self.__trade_list.setOwner(self)
@@ -102,6 +106,16 @@ class Test:  # {{{
     def asset(self, asset: Asset):
         self.__asset = asset
 
+    # }}}
+    @property  # asset_list  # {{{
+    def asset_list(self):
+        """Если задан - тест идет по всем активам списка за один проход"""
+        return self.__asset_list
+
+    @asset_list.setter
+    def asset_list(self, asset_list: Optional[AssetList]):
+        self.__asset_list = asset_list
+
     # }}}
     @property  # enable_long  # {{{
     def enable_long(self):
@@ -216,8 +230,30 @@ class Test:  # {{{
     def time_step(self, time_step: TimeFrame):
         self.__time_step = time_step
 
+    # }}}
+    @property  # equity  # {{{
+    def equity(self) -> Optional[Equity]:
+        """Equity curve of the last run, saved in config of test"""
+        return self.__equity
+
+    @equity.setter
+    def equity(self, equity: Optional[Equity]):
+        self.__equity = equity
+
     # }}}
 
+    def assets(self) -> list[Asset]:  # {{{
+        logger.debug(f"{self.__class__.__name__}.assets()")
+
+        if self.__asset_list is not None:
+            return list(self.__asset_list)
+
+        if self.__asset is not None:
+            return [self.__asset]
+
+        return list()
+
+    # }}}
     def summary(self) -> Summary:  # {{{
         logger.debug(f"{self.__class__.__name__}.summary()")
 
@@ -303,6 +339,7 @@ class Test:  # {{{
         copy = Test(new_name)
         copy.strategy = test.strategy
         copy.asset = test.asset
+        copy.asset_list = test.asset_list
         copy.enable_long = test.enable_long
         copy.enable_short = test.enable_short
         copy.deposit = test.deposit
@@ -353,6 +390,7 @@ class Test:  # {{{
         # а потом чистим в БД
         await TradeList.deleteTrades(test.__trade_list)
 
+        test.__equity = None
         test.__status = Test.Status.NEW
         await Test.update(test)
 
@@ -366,7 +404,8 @@ class Test:  # {{{
             "name": test.name,
             "strategy": test.strategy.name,
             "version": test.strategy.version,
-            "figi": test.asset.figi,
+            "figi": test.asset.figi if test.asset else None,
+            "asset_list": test.asset_list.name if test.asset_list else None,
             "enable_long": test.enable_long,
             "enable_short": test.enable_short,
             "deposit": test.deposit,
@@ -378,6 +417,7 @@ class Test:  # {{{
             "trade_list": test.trade_list.name,
             "status": test.status.name,
             "time_step": str(test.time_step),
+            "equity": Equity.toDict(test.equity) if test.equity else None,
         }
         string = Cmd.toJson(obj)
 
@@ -394,7 +434,10 @@ class Test:  # {{{
         logger.info(f"   - loading {test}")
 
         test.strategy = await Strategy.load(obj["strategy"], obj["version"])
-        test.asset = await Asset.fromFigi(obj["figi"])
+        if obj["figi"] is not None:
+            test.asset = await Asset.fromFigi(obj["figi"])
+        if obj.get("asset_list") is not None:
+            test.asset_list = await AssetList.load(obj["asset_list"])
         test.enable_long = obj["enable_long"]
         test.enable_short = obj["enable_short"]
         test.deposit = obj["deposit"]
@@ -406,6 +449,8 @@ class Test:  # {{{
         # test.trade_list = await TradeList.load(obj["trade_list"])
         test.status = Test.Status.fromStr(obj["status"])
         test.time_step = TimeFrame(obj["time_step"])
+        if obj.get("equity") is not None:
+            test.equity = Equity.fromDict(obj["equity"])
 
         # NOTE: при загрузке из БД не загружаем сразу трейд лист.
         # только по прямому вызову: await Test.loadTrades(test)
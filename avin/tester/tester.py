@@ -8,8 +8,22 @@
 
 from __future__ import annotations
 
-from avin.core import BarChangedEvent, Chart, NewHistoricalBarEvent
-from avin.tester.test import Test
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import UTC, datetime, time
+from typing import Optional
+
+from avin.core import (
+    Asset,
+    BarChangedEvent,
+    Chart,
+    NewHistoricalBarEvent,
+    TradeList,
+)
+from avin.keeper import Keeper
+from avin.tester.equity import Equity
+from avin.tester.test import Test, TestList
 from avin.tester.virtual_broker import VirtualBroker
 from avin.utils import logger
 
@@ -19,40 +33,104 @@ class Tester:
         logger.debug(f"{self.__class__.__name__}.__init__()")
 
         self.__test = None
+        self.__persist = True
         self.__broker = None
+        self.__equity = None
+        self.__assets: dict[str, Asset] = dict()  # figi -> asset
 
     # }}}
 
-    async def run(self, test: Test):  # {{{
+    async def run(self, test: Test, persist: bool = True):  # {{{
+        """Run test
+
+        Trades, orders and operations are kept in memory while test is
+        running, and are written to db in one bulk transaction after
+        strategy finish. With persist=False nothing is written at all,
+        result is only in test.trade_list - for throwaway runs.
+
+        Equity curve and drawdown are calculated on the fly, and saved
+        with test as test.equity.
+        """
+
         logger.debug(f"{self.__class__.__name__}.run()")
         assert test is not None
 
         logger.info(f":: Tester run {test}")
         self.__test = test
+        self.__persist = persist
+        self.__assets = {asset.figi: asset for asset in test.assets()}
 
         self.__loadBroker()
         self.__setAccount()
-        self.__createEmptyCharts()
-        self.__createBarStream()
-
-        await self.__clearTest()
-        await self.__setTradeList()
-        await self.__connectStrategy()
-        await self.__startStrategy()
-        await self.__runDataStream()
-        await self.__finishStrategy()
-        await self.__updateTestStatus()
+        self.__createEquity()
+
+        # NOTE: стратегия живет дольше тестера - слоты Equity
+        # отключаются и если тест упал
+        try:
+            self.__createEmptyCharts()
+            self.__createBarStream()
+
+            await self.__clearTest()
+            await self.__setTradeList()
+            async with Keeper.unitOfWork(persist):
+                await self.__connectStrategy()
+                await self.__startStrategy()
+                await self.__runDataStream()
+                await self.__finishStrategy()
+            self.__finishEquity()
+            await self.__updateTestStatus()
+
+            logger.info(f":: {self.__test} complete!")
+        finally:
+            self.__clearAll()
 
-        logger.info(f":: {self.__test} complete!")
-        self.__clearAll()
+    # }}}
+    @classmethod  # runMany  # {{{
+    async def runMany(
+        cls, test_list: TestList, workers: Optional[int] = None
+    ) -> TestList:
+        """Run all tests of test_list in a pool of processes
+
+        Every test runs in a separate process with its own Tester and
+        VirtualBroker. Worker loads test from db by name, so tests must
+        be saved before. Failed test does not stop others, error is
+        logged. Return TestList with tests reloaded after run.
+
+        workers - count of processes, default os.cpu_count()
+        """
+        logger.debug(f"{cls.__name__}.runMany()")
+        assert isinstance(test_list, TestList)
+
+        logger.info(f":: Tester run {test_list}")
+        names = [test.name for test in test_list]
+
+        # NOTE: spawn - в дочерний процесс не должны попасть
+        # event loop и пул соединений с БД родителя
+        loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            jobs = [
+                loop.run_in_executor(pool, _runTestProcess, name)
+                for name in names
+            ]
+            errors = await asyncio.gather(*jobs)
+
+        for name, error in zip(names, errors):
+            if error is not None:
+                logger.error(f"Tester: test '{name}' failed, {error}")
+
+        tests = await asyncio.gather(*[Test.load(name) for name in names])
+        tests = [test for test in tests if test is not None]
+
+        logger.info(f":: {test_list} complete!")
+        return TestList(test_list.name, tests)
 
     # }}}
 
     def __loadBroker(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.__loadBroker()")
 
-        self.__broker = VirtualBroker
-        self.__broker.setTest(self.__test)
+        self.__broker = VirtualBroker(self.__test)
         self.__broker.new_bar.aconnect(self.__onBarEvent)
         self.__broker.bar_changed.aconnect(self.__onBarEvent)
 
@@ -63,38 +141,77 @@ class Tester:
         account = self.__broker.getAccount(self.__test.account)
         self.__test.strategy.setAccount(account)
 
+    # }}}
+    def __createEquity(self) -> None:  # {{{
+        logger.debug(f"{self.__class__.__name__}.__createEquity()")
+
+        begin = datetime.combine(self.__test.begin, time(), UTC)
+        end = datetime.combine(self.__test.end, time(), UTC)
+        self.__equity = Equity(self.__test.deposit, begin, end)
+
+        strategy = self.__test.strategy
+        strategy.tradeClosed.aconnect(self.__equity.onTradeClosed)
+        self.__broker.new_transaction.aconnect(self.__equity.onTransaction)
+
+    # }}}
+    def __finishEquity(self) -> None:  # {{{
+        logger.debug(f"{self.__class__.__name__}.__finishEquity()")
+
+        self.__equity.finish()
+        self.__test.equity = self.__equity
+        logger.info(f":: {self.__test} {self.__equity}")
+
     # }}}
     def __createEmptyCharts(self) -> None:  # {{{
         logger.debug(f"{self.__class__.__name__}.__createEmptyCharts()")
 
         Chart.MAX_BARS_COUNT = 2000
-        for timeframe in self.__test.strategy.timeframes():
-            bars = list()
-            chart = Chart(self.__test.asset, timeframe, bars)
-            self.__test.asset.setChart(chart)
+        for asset in self.__assets.values():
+            for timeframe in self.__test.strategy.timeframes():
+                bars = list()
+                chart = Chart(asset, timeframe, bars)
+                asset.setChart(chart)
 
     # }}}
     def __createBarStream(self) -> None:  # {{{
         logger.debug(f"{self.__class__.__name__}.__createBarStream()")
 
         timeframe_list = self.__test.strategy.timeframes()
-        for timeframe in timeframe_list:
-            self.__broker.createBarStream(timeframe)
+        for asset in self.__assets.values():
+            for timeframe in timeframe_list:
+                self.__broker.createBarStream(asset, timeframe)
 
     # }}}
     def __clearAll(self) -> None:  # {{{
         logger.debug(f"{self.__class__.__name__}.__clearAll()")
 
         self.__broker.reset()  # clear orders, subscriptions...
-        self.__test.asset.clearCache()
+        for asset in self.__assets.values():
+            asset.clearCache()
+        strategy = self.__test.strategy
+        strategy.tradeClosed.adisconnect(self.__equity.onTradeClosed)
+        self.__broker.new_transaction.adisconnect(self.__equity.onTransaction)
         self.__broker = None
+        self.__equity = None
         self.__test = None
+        self.__assets = dict()
 
     # }}}
 
     async def __clearTest(self) -> None:  # {{{
         logger.debug(f"{self.__class__.__name__}.__clearTest()")
 
+        # NOTE: без сохранения в БД не трогаем, чистим только
+        # трейд лист в памяти
+        if not self.__persist:
+            if self.__test.trade_list is None:
+                name = f"{self.__test}-trade_list"
+                self.__test.trade_list = TradeList(name)
+            else:
+                self.__test.trade_list.clear()
+            self.__test.status = Test.Status.PROCESS
+            return
+
         await Test.deleteTrades(self.__test)
         self.__test.status = Test.Status.PROCESS
         await Test.update(self.__test)
@@ -111,11 +228,11 @@ class Tester:
         logger.debug(f"{self.__class__.__name__}.__connectStrategy()")
 
         strategy = self.__test.strategy
-        asset = self.__test.asset
         long = self.__test.enable_long
         short = self.__test.enable_short
 
-        await strategy.connect(asset, long, short)
+        for asset in self.__assets.values():
+            await strategy.connect(asset, long, short)
 
     # }}}
     async def __startStrategy(self) -> None:  # {{{
@@ -142,7 +259,8 @@ class Tester:
         logger.debug(f"{self.__class__.__name__}.__updateTestStatus()")
 
         self.__test.status = Test.Status.COMPLETE
-        await Test.update(self.__test)
+        if self.__persist:
+            await Test.update(self.__test)
 
     # }}}
 
@@ -151,10 +269,39 @@ class Tester:
     ) -> None:
         logger.debug(f"{self.__class__.__name__}.__onBarEvent()")
 
-        await self.__test.asset.receive(event)
+        asset = self.__assets[event.figi]
+        await asset.receive(event)
 
     # }}}
 
 
+def _runTestProcess(test_name: str) -> Optional[str]:  # {{{
+    """Entry point of worker process for Tester.runMany"""
+
+    return asyncio.run(_runTest(test_name))
+
+
+# }}}
+async def _runTest(test_name: str) -> Optional[str]:  # {{{
+    try:
+        test = await Test.load(test_name)
+        if test is None:
+            return "test not found"
+
+        tester = Tester()
+        await tester.run(test)
+        return None
+
+    except Exception as err:
+        logger.exception(err)
+        return f"{type(err).__name__}: {err}"
+
+    finally:
+        await Keeper.close()
+
+
+# }}}
+
+
 if __name__ == "__main__":
     ...
@@ -8,8 +8,12 @@
 
 from __future__ import annotations
 
+import bisect
+import itertools
+import math
 from typing import Optional, Union
 
+from avin.config import Cfg
 from avin.core import (
     Account,
     Asset,
@@ -30,7 +34,7 @@ from avin.core import (
     Transaction,
     TransactionEvent,
 )
-from avin.tester.stream import BarStream
+from avin.tester.stream import BarStream, BarStream2
 from avin.tester.test import Test
 from avin.utils import AsyncSignal, logger
 
@@ -38,63 +42,72 @@ from avin.utils import AsyncSignal, logger
 class VirtualBroker(Broker):
     name = "_VirtualBroker"
 
-    new_bar = AsyncSignal(NewHistoricalBarEvent)
-    bar_changed = AsyncSignal(BarChangedEvent)
-    new_transaction = AsyncSignal(TransactionEvent)
+    def __init__(self, test: Optional[Test] = None):  # {{{
+        logger.debug(f"{self.__class__.__name__}.__init__()")
 
-    __test: Optional[Test] = None
-    __account: Optional[Account] = None
-    __data_stream: Optional[BarStream] = None
-    __current_asset: Optional[Asset] = None
-    __market_orders: list[MarketOrder] = list()
-    __limit_orders: list[LimitOrder] = list()
-    __stop_orders: list[Union[StopOrder, StopLoss, TakeProfit]] = list()
+        # NOTE: все состояние у каждого брокера свое, поэтому
+        # несколько тестов могут идти одновременно в одном процессе
+        self.new_bar = AsyncSignal(NewHistoricalBarEvent)
+        self.bar_changed = AsyncSignal(BarChangedEvent)
+        self.new_transaction = AsyncSignal(TransactionEvent)
 
-    @classmethod  # setTest  # {{{
-    def setTest(cls, test: Test):
-        logger.debug(f"{cls.__name__}.setTest()")
-        cls.__test = test
-        cls.__current_asset = test.asset
+        self.__test: Optional[Test] = None
+        self.__account: Optional[Account] = None
+        self.__data_stream: Optional[Union[BarStream, BarStream2]] = None
+        self.__assets: dict[str, Asset] = dict()  # figi -> asset
+        # NOTE: Id не хешируется, ключи - str(order_id)
+        self.__market_orders: dict[str, MarketOrder] = dict()  # id -> order
+        self.__books: dict[tuple, _OrderBook] = dict()  # figi,group,rule
+        self.__pending: dict[str, tuple] = dict()  # id -> book, seq
+        self.__seq = itertools.count()
+
+        if test is not None:
+            self.setTest(test)
+
+    # }}}
+
+    def setTest(self, test: Test):  # {{{
+        logger.debug(f"{self.__class__.__name__}.setTest()")
+        self.__test = test
+        self.__assets = {asset.figi: asset for asset in test.assets()}
 
     # }}}
-    @classmethod  # reset  # {{{
-    def reset(cls):
-        logger.debug(f"{cls.__name__}.reset()")
-
-        cls.__test = None
-        cls.__account = None
-        cls.__data_stream = None
-        cls.__current_asset = None
-        cls.__market_orders = list()
-        cls.__limit_orders = list()
-        cls.__stop_orders = list()
+    def reset(self):  # {{{
+        logger.debug(f"{self.__class__.__name__}.reset()")
+
+        self.__test = None
+        self.__account = None
+        self.__data_stream = None
+        self.__assets = dict()
+        self.__market_orders = dict()
+        self.__books = dict()
+        self.__pending = dict()
+        self.__seq = itertools.count()
 
         # сброс конектов к сигналам...
         # TODO: а может сделать прямо new_bar.disconnect(slot) ??
         # и new_bar.disconnectAll() ??
-        cls.new_bar = AsyncSignal(NewHistoricalBarEvent)
-        cls.bar_changed = AsyncSignal(BarChangedEvent)
-        cls.new_transaction = AsyncSignal(TransactionEvent)
+        self.new_bar = AsyncSignal(NewHistoricalBarEvent)
+        self.bar_changed = AsyncSignal(BarChangedEvent)
+        self.new_transaction = AsyncSignal(TransactionEvent)
 
     # }}}
-    @classmethod  # getAccount  # {{{
-    def getAccount(cls, account_name: str) -> Account:
-        logger.debug(f"{cls.__name__}.getAccount({account_name})")
+    def getAccount(self, account_name: str) -> Account:  # {{{
+        logger.debug(f"{self.__class__.__name__}.getAccount({account_name})")
 
         # WARN: костыль
         # пока тестер работает только с одним аккаунтом,
         # так проще, потому если понадобится буду думать
         # как сделать работу с несколькими аккаунтами
         assert account_name == "_backtest"
-        cls.__account = Account(account_name, broker=cls, meta=None)
+        self.__account = Account(account_name, broker=self, meta=None)
 
-        return cls.__account
+        return self.__account
 
     # }}}
 
-    @classmethod  # syncOrder  # {{{
-    async def syncOrder(cls, account: Account, order: Order) -> bool:
-        logger.debug(f"{cls.__name__}.syncOrder({order})")
+    async def syncOrder(self, account: Account, order: Order) -> bool:  # {{{
+        logger.debug(f"{self.__class__.__name__}.syncOrder({order})")
 
         # Это метод заглушка, аккаунт использует вызов Broker.syncOrder
         # для синхронизации статуса ордера при торговле с Тинькофф
@@ -103,9 +116,12 @@ class VirtualBroker(Broker):
         return True
 
     # }}}
-    @classmethod  # postMarketOrder  # {{{
-    async def postMarketOrder(cls, account: Account, order: Order) -> bool:
-        logger.debug(f"{cls.__name__}.postMarketOrder({account}, {order})")
+    async def postMarketOrder(  # {{{
+        self, account: Account, order: Order
+    ) -> bool:
+        logger.debug(
+            f"{self.__class__.__name__}.postMarketOrder({account}, {order})"
+        )
 
         # TODO:
         # в методах выставления ордеров - ебана куча повторяющегося кода
@@ -121,86 +137,94 @@ class VirtualBroker(Broker):
         order.meta = "virtual posted"
         await order.setStatus(Order.Status.POSTED)
 
-        cls.__market_orders.append(order)
+        self.__market_orders[str(order.order_id)] = order
 
         return True
 
     # }}}
-    @classmethod  # postLimitOrder  # {{{
-    async def postLimitOrder(
-        cls, account: Account, order: LimitOrder
+    async def postLimitOrder(  # {{{
+        self, account: Account, order: LimitOrder
     ) -> bool:
-        logger.debug(f"{cls.__name__}.postLimitOrder({account}, {order})")
+        logger.debug(
+            f"{self.__class__.__name__}.postLimitOrder({account}, {order})"
+        )
 
         order.broker_id = order.order_id
         order.status = Order.Status.POSTED
         order.meta = "virtual posted"
         await order.setStatus(Order.Status.POSTED)
 
-        cls.__limit_orders.append(order)
+        self.__addOrder(order)
 
         return True
 
     # }}}
-    @classmethod  # postStopOrder  # {{{
-    async def postStopOrder(cls, account: Account, order: StopOrder) -> bool:
-        logger.debug(f"{cls.__name__}.postStopOrder({account}, {order})")
+    async def postStopOrder(  # {{{
+        self, account: Account, order: StopOrder
+    ) -> bool:
+        logger.debug(
+            f"{self.__class__.__name__}.postStopOrder({account}, {order})"
+        )
 
         order.broker_id = order.order_id
         order.status = Order.Status.POSTED
         order.meta = "virtual posted"
         await order.setStatus(Order.Status.POSTED)
 
-        cls.__stop_orders.append(order)
+        self.__addOrder(order)
 
         return True
 
     # }}}
-    @classmethod  # postStopLoss  # {{{
-    async def postStopLoss(cls, account: Account, order: StopLoss) -> bool:
-        logger.debug(f"{cls.__name__}.postStopLoss({account}, {order})")
+    async def postStopLoss(  # {{{
+        self, account: Account, order: StopLoss
+    ) -> bool:
+        logger.debug(
+            f"{self.__class__.__name__}.postStopLoss({account}, {order})"
+        )
 
         order.broker_id = order.order_id
         order.status = Order.Status.POSTED
         order.meta = "virtual posted"
         await order.setStatus(Order.Status.POSTED)
 
-        cls.__stop_orders.append(order)
+        self.__addOrder(order)
 
         return True
 
     # }}}
-    @classmethod  # postTakeProfit  # {{{
-    async def postTakeProfit(
-        cls, account: Account, order: TakeProfit
+    async def postTakeProfit(  # {{{
+        self, account: Account, order: TakeProfit
     ) -> bool:
-        logger.debug(f"{cls.__name__}.postTakeProfit({account}, {order})")
+        logger.debug(
+            f"{self.__class__.__name__}.postTakeProfit({account}, {order})"
+        )
 
         order.broker_id = order.order_id
         order.status = Order.Status.POSTED
         order.meta = "virtual posted"
         await order.setStatus(Order.Status.POSTED)
 
-        cls.__stop_orders.append(order)
+        self.__addOrder(order)
 
         return True
 
     # }}}
-    @classmethod  # cancelLimitOrder  # {{{
-    async def cancelLimitOrder(
-        cls, account: Account, order: LimitOrder
+    async def cancelLimitOrder(  # {{{
+        self, account: Account, order: LimitOrder
     ) -> bool:
-        logger.debug(f"{cls.__name__}.cancelLimitOrder({account}, {order})")
+        logger.debug(
+            f"{self.__class__.__name__}.cancelLimitOrder({account}, {order})"
+        )
 
         # TODO: а что если ордер частично исполнен?
         # ну пока такое не возможно, но в будущем в тестере это надо
         # учесть..
 
-        for posted_order in cls.__limit_orders:
-            if posted_order.order_id == order.order_id:
-                cls.__limit_orders.remove(posted_order)
-                await order.setStatus(Order.Status.CANCELED)
-                return True
+        if str(order.order_id) in self.__pending:
+            self.__removeOrder(order)
+            await order.setStatus(Order.Status.CANCELED)
+            return True
 
         logger.warning(
             f"VirtualBroker.cancelLimitOrder() - not found {order}"
@@ -208,35 +232,35 @@ class VirtualBroker(Broker):
         return True
 
     # }}}
-    @classmethod  # cancelStopOrder  # {{{
-    async def cancelStopOrder(
-        cls, account: Account, order: StopOrder
+    async def cancelStopOrder(  # {{{
+        self, account: Account, order: StopOrder
     ) -> bool:
-        logger.debug(f"{cls.__name__}.cancelStopOrder({account}, {order})")
-
-        for posted_order in cls.__stop_orders:
-            if posted_order.order_id == order.order_id:
-                cls.__stop_orders.remove(posted_order)
-                await order.setStatus(Order.Status.CANCELED)
+        logger.debug(
+            f"{self.__class__.__name__}.cancelStopOrder({account}, {order})"
+        )
 
-                return True
+        if str(order.order_id) in self.__pending:
+            self.__removeOrder(order)
+            await order.setStatus(Order.Status.CANCELED)
+            return True
 
         logger.warning(f"VirtualBroker.cancelStopOrder() - not found {order}")
         return True
 
     # }}}
 
-    @classmethod  # getOrderOperation  # {{{
-    async def getOrderOperation(
-        cls, account: Account, order: Order
+    async def getOrderOperation(  # {{{
+        self, account: Account, order: Order
     ) -> Operation:
-        logger.debug(f"{cls.__name__}.getOrderOperation({account}, {order})")
-        assert cls.__test is not None
+        logger.debug(
+            f"{self.__class__.__name__}.getOrderOperation({account}, {order})"
+        )
+        assert self.__test is not None
 
         dt = order.transactions.last.dt
         price = order.transactions.average()
         amount = order.transactions.amount()
-        commission = amount * cls.__test.commission
+        commission = amount * self.__test.commission
 
         operation = Operation(
             account_name=account.name,
@@ -258,26 +282,30 @@ class VirtualBroker(Broker):
 
     # }}}
 
-    @classmethod  # createBarStream  # {{{
-    def createBarStream(cls, timeframe: TimeFrame) -> None:
-        logger.debug(f"{cls.__name__}.createBarStream({asset}, {timeframe})")
+    def createBarStream(  # {{{
+        self, asset: Asset, timeframe: TimeFrame
+    ) -> None:
+        logger.debug(
+            f"{self.__class__.__name__}.createBarStream({asset}, {timeframe})"
+        )
 
-        if not cls.__data_stream:
-            cls.__data_stream = BarStream()
-            cls.__data_stream.setAsset(self.__current_asset)
+        if not self.__data_stream:
+            if Cfg.Tester.RESAMPLE_FROM_1M:
+                self.__data_stream = BarStream2()
+            else:
+                self.__data_stream = BarStream()
 
-        cls.__data_stream.subscribe(timeframe)
+        self.__data_stream.subscribe(asset, timeframe)
 
     # }}}
-    @classmethod  # runDataStream  # {{{
-    async def runDataStream(cls):
-        logger.debug(f"{cls.__name__}.runDataStream()")
+    async def runDataStream(self):  # {{{
+        logger.debug(f"{self.__class__.__name__}.runDataStream()")
 
-        await cls.__data_stream.loadData(cls.__test.begin, cls.__test.end)
+        await self.__data_stream.loadData(self.__test.begin, self.__test.end)
 
-        for event in cls.__data_stream:
+        for event in self.__data_stream:
             if event.type == Event.Type.NEW_HISTORICAL_BAR:
-                await cls.new_bar.aemit(event)
+                await self.new_bar.aemit(event)
             if event.type == Event.Type.BAR_CHANGED:
                 # NOTE:
                 # перед приходом нового реал тайм бара, до отправки
@@ -300,119 +328,77 @@ class VirtualBroker(Broker):
                 # А если 1М то беру бар из текущего графика, а не новый
                 # из эвента.
                 if event.timeframe == "1M":
-                    bar = cls.__current_asset.chart("1M").now
-                    await cls.__checkOrders(bar)
+                    asset = self.__assets[event.figi]
+                    bar = asset.chart("1M").now
+                    await self.__checkOrders(bar, event.figi)
                 # Теперь отправляем новый реал тайм бар всем.
-                await cls.bar_changed.aemit(event)
+                await self.bar_changed.aemit(event)
 
     # }}}
 
-    @classmethod  # __checkOrders  # {{{
-    async def __checkOrders(cls, bar: Bar) -> None:
-        logger.debug(f"{cls.__name__}.__checkOrders()")
+    async def __checkOrders(self, bar: Bar, figi: str) -> None:  # {{{
+        logger.debug(f"{self.__class__.__name__}.__checkOrders()")
 
-        await cls.__checkOrdersMarket(bar)
-        await cls.__checkOrdersLimit(bar)
-        await cls.__checkOrdersStop(bar)
+        # bar of asset 'figi' - check only orders of this asset
+        await self.__checkOrdersMarket(bar, figi)
+        await self.__checkOrdersBooks(bar, figi, _OrderBook.LIMIT)
+        await self.__checkOrdersBooks(bar, figi, _OrderBook.STOP)
 
     # }}}
-    @classmethod  # __checkOrdersMarket  # {{{
-    async def __checkOrdersMarket(cls, bar: Bar):
-        logger.debug(f"{cls.__name__}.__checkOrdersMarket()")
+    async def __checkOrdersMarket(self, bar: Bar, figi: str):  # {{{
+        logger.debug(f"{self.__class__.__name__}.__checkOrdersMarket()")
+
+        # NOTE: пока исполняем, стратегия может выставить новые
+        # маркет ордера - они исполняются в этом же баре
+        while True:
+            orders = [
+                order
+                for order in self.__market_orders.values()
+                if order.instrument.figi == figi
+            ]
+            if not orders:
+                return
 
-        i = 0
-        while i < len(cls.__market_orders):
-            m_order = cls.__market_orders[i]
-            await cls.__executeOrder(m_order, bar.dt, bar.open)
+            for order in orders:
+                if str(order.order_id) in self.__market_orders:
+                    await self.__executeOrder(order, bar.dt, bar.open)
 
     # }}}
-    @classmethod  # __checkOrdersLimit  # {{{
-    async def __checkOrdersLimit(cls, bar: Bar):
-        logger.debug(f"{cls.__name__}.__checkOrdersLimit()")
-
-        i = 0
-        while i < len(cls.__limit_orders):
-            order = cls.__limit_orders[i]
-            if order.price in bar:
-                await cls.__executeOrder(order, bar.dt, order.price)
-                continue
-
-            # если бар открылся под лимиткой на покупку -
-            # выполняем лимитку по цене открытия бара
-            if order.direction == Direction.BUY:
-                if bar.open < order.price:
-                    await cls.__executeOrder(order, bar.dt, bar.open)
-                    continue
+    async def __checkOrdersBooks(self, bar: Bar, figi: str, group):  # {{{
+        logger.debug(f"{self.__class__.__name__}.__checkOrdersBooks()")
+
+        # NOTE: книги только отбирают сработавшие ордера по диапазону
+        # бара, исполняем их в порядке выставления, как раньше при
+        # проходе по списку. Если во время исполнения стратегия
+        # выставила новый ордер, и он тоже попадает в бар - исполняем
+        # его в этом же проходе, seq у него больше всех уже
+        # проверенных. Отмененные за время прохода - пропускаем.
+        last_seq = -1
+        while True:
+            triggered = list()
+            for (book_figi, book_group, _), book in self.__books.items():
+                if book_figi == figi and book_group == group:
+                    triggered.extend(book.triggered(bar, after=last_seq))
+            if not triggered:
+                return
 
-            # если бар открылся над лимиткой на продажу -
-            # выполняем лимитку по цене открытия бара
-            if order.direction == Direction.BUY:
-                if bar.open > order.price:
-                    await cls.__executeOrder(order, bar.dt, bar.open)
+            triggered.sort(key=lambda item: item[0])
+            for seq, order in triggered:
+                last_seq = seq
+                if str(order.order_id) not in self.__pending:
                     continue
-            i += 1
 
-    # }}}
-    @classmethod  # __checkOrdersStop  # {{{
-    async def __checkOrdersStop(cls, bar: Bar):
-        logger.debug(f"{cls.__name__}.__checkOrdersStop()")
-
-        i = 0
-        while i < len(cls.__stop_orders):
-            order = cls.__stop_orders[i]
-
-            # TODO: пока не парюсь с exec_price
-            # если exec_price=None - значит выполнение по рынку у stop loss
-            # иначе exec_price=stop_price, не делаю тейки с разной ценой
-            # активации и исполнения, понадобится - сделаю и логику их
-            # выполнения, а пока чем проще тем лучше.
-            if order.exec_price is not None:
-                assert order.exec_price == order.stop_price
-            price = order.stop_price
-            if price in bar:
-                await cls.__executeOrder(order, bar.dt, price)
-                continue
-
-            if order.type == Order.Type.STOP_LOSS:
-                # Трейд в лонг.
-                # Если цена открылась ниже стоп прайса, то стоп лосс
-                # срабатывает по цене открытия бара
-                if order.direction == Direction.SELL:
-                    if bar.open < order.stop_price:
-                        await cls.__executeOrder(order, bar.dt, bar.open)
-                        continue
-
-                # Трейд в шорт.
-                # Если цена открылась выше стоп прайса, то стоп лосс
-                # срабатывает по цене открытия бара
-                if order.direction == Direction.BUY:
-                    if bar.open > order.stop_price:
-                        await cls.__executeOrder(order, bar.dt, bar.open)
-                        continue
-
-            if order.type == Order.Type.TAKE_PROFIT:
-                # Трейд в лонг.
-                # Если цена открылась выше стоп прайса, то тейк профит
-                # срабатывает по цене открытия бара
-                if order.direction == Direction.SELL:
-                    if bar.open > order.stop_price:
-                        await cls.__executeOrder(order, bar.dt, bar.open)
-                        continue
-
-                # Трейд в шорт.
-                # Если цена открылась ниже стоп прайса, то тейк профит
-                # срабатывает по цене открытия бара
-                if order.direction == Direction.BUY:
-                    if bar.open < order.stop_price:
-                        await cls.__executeOrder(order, bar.dt, bar.open)
-                        continue
-
-            i += 1
+                # если цена ордера внутри бара - исполняем по ней,
+                # иначе бар открылся гэпом за ордером - по цене
+                # открытия бара
+                price = _OrderBook.price(order)
+                if price not in bar:
+                    price = bar.open
+                await self.__executeOrder(order, bar.dt, price)
 
     # }}}
-    @classmethod  # __executeOrder  # {{{
-    async def __executeOrder(cls, order, dt, price):
-        logger.debug(f"{cls.__name__}.__executeOrder()")
+    async def __executeOrder(self, order, dt, price):  # {{{
+        logger.debug(f"{self.__class__.__name__}.__executeOrder()")
 
         # # recognise execution price
         # match order.type:
@@ -438,45 +424,178 @@ class VirtualBroker(Broker):
         await order.attachTransaction(transaction)
         order.meta = "virtual executed"
         await order.setStatus(Order.Status.FILLED)
-        cls.__removeOrder(order)
+        self.__removeOrder(order)
 
         # create and send TransactionEvent
         event = TransactionEvent(
-            account_name=cls.__account.name,
+            account_name=self.__account.name,
             figi=order.instrument.figi,
             direction=order.direction,
             order_broker_id=order.broker_id,
             transaction=transaction,
         )
-        await cls.new_transaction.aemit(event)
-        await cls.__account.receive(event)
+        await self.new_transaction.aemit(event)
+        await self.__account.receive(event)
+
+    # }}}
+    def __addOrder(self, order: Order):  # {{{
+        logger.debug(f"{self.__class__.__name__}.__addOrder()")
+
+        group, rule = _OrderBook.classify(order)
+        key = (order.instrument.figi, group, rule)
+        book = self.__books.get(key)
+        if book is None:
+            book = _OrderBook(rule)
+            self.__books[key] = book
+
+        seq = next(self.__seq)
+        book.add(seq, order)
+        self.__pending[str(order.order_id)] = (book, seq)
+
+    # }}}
+    def __removeOrder(self, order: Order):  # {{{
+        logger.debug(f"{self.__class__.__name__}.__removeOrder()")
+
+        if order.type == Order.Type.MARKET:
+            self.__market_orders.pop(str(order.order_id), None)
+            return
+
+        item = self.__pending.pop(str(order.order_id), None)
+        if item is not None:
+            book, seq = item
+            book.remove(seq)
+
+    # }}}
+
+
+class _OrderBook:  # {{{
+    """Pending orders of one instrument, sorted by price
+
+    Every order lies in the book of its fill rule:
+    DOWN  - filled when bar goes down to price: low <= price
+    UP    - filled when bar goes up to price: high >= price
+    TOUCH - filled only when price inside the bar
+
+    So orders triggered by bar [low, high] is a slice of sorted prices,
+    search O(log n + k). Removal O(1) - order just forgotten, its key
+    is dropped from sorted list later, when stale keys become too many.
+    """
+
+    LIMIT = "LIMIT"
+    STOP = "STOP"
+
+    DOWN = "DOWN"
+    UP = "UP"
+    TOUCH = "TOUCH"
+
+    def __init__(self, rule: str):  # {{{
+        self.rule = rule
+        self.__keys: list[tuple[float, int]] = list()  # sorted price, seq
+        self.__orders: dict[int, Order] = dict()  # seq -> order
+
+    # }}}
+    def __len__(self):  # {{{
+        return len(self.__orders)
+
+    # }}}
+    def add(self, seq: int, order: Order) -> None:  # {{{
+        bisect.insort(self.__keys, (self.price(order), seq))
+        self.__orders[seq] = order
+
+    # }}}
+    def remove(self, seq: int) -> None:  # {{{
+        del self.__orders[seq]
+
+        stale = len(self.__keys) - len(self.__orders)
+        if stale > 64 and stale > len(self.__orders):
+            self.__keys = [i for i in self.__keys if i[1] in self.__orders]
 
     # }}}
-    @classmethod  # __removeOrder  #{{{
-    def __removeOrder(cls, order: Order):
-        logger.debug(f"{cls.__name__}.__executeOrder()")
+    def triggered(self, bar: Bar, after: int = -1) -> list:  # {{{
+        """Return list of (seq, order) triggered by bar, seq > after"""
+
+        match self.rule:
+            case _OrderBook.DOWN:
+                begin = bisect.bisect_left(self.__keys, (bar.low,))
+                end = len(self.__keys)
+            case _OrderBook.UP:
+                begin = 0
+                end = bisect.bisect_right(self.__keys, (bar.high, math.inf))
+            case _OrderBook.TOUCH:
+                begin = bisect.bisect_left(self.__keys, (bar.low,))
+                end = bisect.bisect_right(self.__keys, (bar.high, math.inf))
+
+        orders = self.__orders
+        return [
+            (seq, orders[seq])
+            for _, seq in self.__keys[begin:end]
+            if seq > after and seq in orders
+        ]
 
+    # }}}
+
+    @staticmethod  # price  # {{{
+    def price(order: Order) -> float:
+        if order.type == Order.Type.LIMIT:
+            return order.price
+
+        return order.stop_price
+
+    # }}}
+    @staticmethod  # classify  # {{{
+    def classify(order: Order) -> tuple[str, str]:
+        """Return (group, rule) of order
+
+        Rules follow the gap logic of tester: if price of order is not
+        inside the bar, but the bar opened behind it - order is filled
+        by bar.open. For example, bar opened under buy limit - limit is
+        filled, so buy limit is filled by any bar with low <= price.
+        """
+
+        buy = order.direction == Direction.BUY
         match order.type:
-            case Order.Type.MARKET:
-                all_orders = cls.__market_orders
             case Order.Type.LIMIT:
-                all_orders = cls.__limit_orders
+                # бар открылся под лимиткой на покупку, или над
+                # лимиткой на продажу - исполняем по цене открытия
+                rule = _OrderBook.DOWN if buy else _OrderBook.UP
+                return _OrderBook.LIMIT, rule
+
             case Order.Type.STOP:
-                all_orders = cls.__stop_orders
+                return _OrderBook.STOP, _OrderBook.TOUCH
+
             case Order.Type.STOP_LOSS:
-                all_orders = cls.__stop_orders
+                # TODO: пока не парюсь с exec_price
+                # если exec_price=None - значит выполнение по рынку у
+                # stop loss иначе exec_price=stop_price, не делаю тейки
+                # с разной ценой активации и исполнения, понадобится -
+                # сделаю и логику их выполнения, а пока чем проще тем
+                # лучше.
+                if order.exec_price is not None:
+                    assert order.exec_price == order.stop_price
+
+                # Трейд в лонг (стоп на продажу) - если цена открылась
+                # ниже стоп прайса, срабатывает по цене открытия бара.
+                # Трейд в шорт - если открылась выше.
+                rule = _OrderBook.UP if buy else _OrderBook.DOWN
+                return _OrderBook.STOP, rule
+
             case Order.Type.TAKE_PROFIT:
-                all_orders = cls.__stop_orders
+                if order.exec_price is not None:
+                    assert order.exec_price == order.stop_price
+
+                # Трейд в лонг (тейк на продажу) - если цена открылась
+                # выше стоп прайса, срабатывает по цене открытия бара.
+                # Трейд в шорт - если открылась ниже.
+                rule = _OrderBook.DOWN if buy else _OrderBook.UP
+                return _OrderBook.STOP, rule
+
             case _:
                 assert False, f"че за ордер? {order}"
 
-        for i in all_orders:
-            if i.order_id == order.order_id:
-                all_orders.remove(i)
-                return
-
     # }}}
 
 
+# }}}
+
 if __name__ == "__main__":
     ...
@@ -29,6 +29,7 @@ from avin.utils.misc import (
     now,
     round_price,
 )
+from avin.utils.rate_limiter import RateLimiter
 from avin.utils.signal import AsyncSignal, Signal
 
 __all__ = (
@@ -54,6 +55,7 @@ __all__ = (
     "now",
     "round_price",
     "break_point",
+    "RateLimiter",
     "Signal",
     "AsyncSignal",
 )
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# ============================================================================
+# URL:          http://arsvincere.com
+# AUTHOR:       Alex Avin
+# E-MAIL:       mr.alexavin@gmail.com
+# LICENSE:      GNU GPLv3
+# ============================================================================
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+
+class RateLimiter:  # {{{
+    """Limit of concurrent requests and requests per second
+
+    Coroutines enter the limiter one after another not faster than
+    'rate' per second, and not more than 'concurrency' are inside at the
+    same time.
+
+        limiter = RateLimiter(concurrency=4, rate=5)
+        async with limiter:
+            response = await request()
+    """
+
+    def __init__(self, concurrency: int, rate: float):  # {{{
+        assert concurrency > 0
+        assert rate > 0
+
+        self.concurrency = concurrency
+        self.rate = rate
+
+        self.__semaphore = asyncio.Semaphore(concurrency)
+        self.__lock = asyncio.Lock()
+        self.__interval = 1.0 / rate
+        self.__next_time = 0.0
+
+    # }}}
+    async def __aenter__(self) -> RateLimiter:  # {{{
+        await self.__semaphore.acquire()
+        try:
+            await self.__wait()
+        except BaseException:
+            self.__semaphore.release()
+            raise
+
+        return self
+
+    # }}}
+    async def __aexit__(self, exc_type, exc, tb) -> None:  # {{{
+        self.__semaphore.release()
+
+    # }}}
+
+    async def __wait(self) -> None:  # {{{
+        # NOTE: время следующего разрешенного запроса сдвигается
+        # под локом, а спим уже без него - так очередь не блокируется
+        async with self.__lock:
+            current = time.monotonic()
+            start = max(current, self.__next_time)
+            self.__next_time = start + self.__interval
+
+        delay = start - current
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    # }}}
+
+
+# }}}
+
+
+if __name__ == "__main__":
+    ...
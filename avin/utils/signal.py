@@ -43,6 +43,10 @@ class AsyncSignal:  # {{{
     def aconnect(self, async_slot):  # {{{
         self.__async_slots.append(async_slot)
 
+    # }}}
+    def adisconnect(self, async_slot):  # {{{
+        self.__async_slots.remove(async_slot)
+
     # }}}
     async def aemit(self, *args):  # {{{
         all_task = list()
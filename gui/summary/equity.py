@@ -0,0 +1,135 @@
+#!/usr/bin/env  python3
+# ============================================================================
+# URL:          http://arsvincere.com
+# AUTHOR:       Alex Avin
+# E-MAIL:       mr.alexavin@gmail.com
+# LICENSE:      GNU GPLv3
+# ============================================================================
+
+import sys
+from typing import Optional
+
+import numpy as np
+from PyQt6 import QtCore, QtGui, QtWidgets
+
+from avin import Equity, logger
+from gui.custom import Color, Css
+
+
+class EquityWidget(QtWidgets.QWidget):  # {{{
+    """Equity curve and drawdown of test
+
+    Draws test.equity saved by Tester, trades are not loaded.
+    """
+
+    HEIGHT = 120
+
+    def __init__(self, parent=None):  # {{{
+        logger.debug(f"{self.__class__.__name__}.__init__()")
+        QtWidgets.QWidget.__init__(self, parent)
+
+        self.__equity: Optional[Equity] = None
+
+        self.__createWidgets()
+        self.__createLayots()
+
+    # }}}
+
+    def setEquity(self, equity: Optional[Equity]) -> None:  # {{{
+        logger.debug(f"{self.__class__.__name__}.setEquity()")
+
+        self.__equity = equity
+        if equity is None:
+            self.__label.setText("Equity: test was not run")
+        else:
+            self.__label.setText(
+                f"Equity: {equity.last}  "
+                f"profit: {equity.profit}  "
+                f"max drawdown: {equity.max_drawdown} "
+                f"({equity.max_drawdown_percent}%)  "
+                f"exposure: {equity.exposure}%"
+            )
+        self.__curve.update()
+
+    # }}}
+
+    def __createWidgets(self):  # {{{
+        logger.debug(f"{self.__class__.__name__}.__createWidgets()")
+
+        self.__label = QtWidgets.QLabel("Equity: test was not run")
+        self.__label.setStyleSheet(Css.LABEL)
+        self.__curve = _EquityCurve(self)
+        self.__curve.setFixedHeight(self.HEIGHT)
+
+    # }}}
+    def __createLayots(self):  # {{{
+        logger.debug(f"{self.__class__.__name__}.__createLayots()")
+
+        vbox = QtWidgets.QVBoxLayout()
+        vbox.setContentsMargins(0, 0, 0, 0)
+        vbox.addWidget(self.__label)
+        vbox.addWidget(self.__curve)
+        self.setLayout(vbox)
+
+    # }}}
+
+    @property  # equity  # {{{
+    def equity(self) -> Optional[Equity]:
+        return self.__equity
+
+    # }}}
+
+
+# }}}
+class _EquityCurve(QtWidgets.QWidget):  # {{{
+    def __init__(self, parent: EquityWidget):  # {{{
+        QtWidgets.QWidget.__init__(self, parent)
+
+        self.__parent = parent
+
+    # }}}
+    def paintEvent(self, e: QtGui.QPaintEvent):  # {{{
+        p = QtGui.QPainter(self)
+        p.fillRect(self.rect(), QtGui.QColor(Color.nord0))
+
+        equity = self.__parent.equity
+        if equity is None or len(equity) == 0:
+            return
+
+        # equity starts from deposit, drawdown from 0
+        values = np.concatenate(([equity.deposit], equity.equity))
+        drawdown = np.concatenate(([0.0], equity.drawdown))
+
+        p.setRenderHint(QtGui.QPainter.RenderHint.Antialiasing, True)
+        p.setPen(QtGui.QPen(QtGui.QColor(Color.nord11), 1))
+        p.drawPolyline(self.__polygon(drawdown))
+        p.setPen(QtGui.QPen(QtGui.QColor(Color.nord14), 2))
+        p.drawPolyline(self.__polygon(values))
+
+    # }}}
+
+    def __polygon(self, values: np.ndarray) -> QtGui.QPolygonF:  # {{{
+        width = self.width() - 1
+        height = self.height() - 1
+        low = values.min()
+        high = values.max()
+        span = high - low if high > low else 1.0
+
+        x = np.linspace(0, width, len(values))
+        y = height - (values - low) / span * height
+
+        return QtGui.QPolygonF(
+            [QtCore.QPointF(i, j) for i, j in zip(x.tolist(), y.tolist())]
+        )
+
+    # }}}
+
+
+# }}}
+
+
+if __name__ == "__main__":
+    app = QtWidgets.QApplication(sys.argv)
+    w = EquityWidget()
+    w.show()
+    sys.exit(app.exec())
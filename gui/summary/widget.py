@@ -14,6 +14,7 @@ from PyQt6.QtCore import Qt
 from avin import Test, TradeList
 from avin.utils import logger
 from gui.custom import Css, Dialog
+from gui.summary.equity import EquityWidget
 from gui.summary.thread import TLoadTrades
 from gui.summary.tree import TradeListTree
 
@@ -72,6 +73,7 @@ class SummaryWidget(QtWidgets.QWidget):  # {{{
         logger.debug(f"{self.__class__.__name__}.setTest()")
 
         self.__test = test
+        self.__equity.setEquity(test.equity)
         if test.trade_list is not None:
             self.__showSummary()
         else:
@@ -90,6 +92,7 @@ class SummaryWidget(QtWidgets.QWidget):  # {{{
     def __createWidgets(self):  # {{{
         logger.debug(f"{self.__class__.__name__}.__createWidgets()")
 
+        self.__equity = EquityWidget(self)
         self.__tree = TradeListTree(self)
         self.__load_btn = QtWidgets.QPushButton("Load trades")
 
@@ -99,6 +102,7 @@ class SummaryWidget(QtWidgets.QWidget):  # {{{
 
         vbox = QtWidgets.QVBoxLayout()
         vbox.setContentsMargins(0, 0, 0, 0)
+        vbox.addWidget(self.__equity)
         vbox.addWidget(self.__tree)
         vbox.addWidget(self.__load_btn)
         self.setLayout(vbox)
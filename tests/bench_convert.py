@@ -0,0 +1,229 @@
+#!/usr/bin/env  python3
+# ============================================================================
+# URL:          http://arsvincere.com
+# AUTHOR:       Alex Avin
+# E-MAIL:       mr.alexavin@gmail.com
+# LICENSE:      GNU GPLv3
+# ============================================================================
+
+"""Benchmark: vectorized _Converter vs old pure python conversion
+
+Old implementation (fill void bars, join, remove void bars) is copied
+here as reference. Both run on the same synthetic data, results are
+compared bar by bar. Database is not needed.
+
+    python3 bench_convert.py [years]
+"""
+
+import random
+import sys
+import time
+from datetime import UTC, datetime, timedelta
+
+from avin.const import DAY_BEGIN, DAY_END, WeekDays
+from avin.data import BarArray, DataType
+from avin.data.bar import _Bar
+from avin.data.converter import _Converter
+
+
+class VoidBar:  # {{{
+    def __init__(self, dt: datetime):
+        self.dt = dt
+
+
+# }}}
+def fill_void(bars, data_type):  # {{{
+    time = datetime.combine(bars[0].dt.date(), DAY_BEGIN)
+    end = datetime.combine(bars[-1].dt.date(), DAY_END)
+    step = data_type.toTimeDelta()
+
+    i = 0
+    filled = list()
+    while time <= end:
+        if i < len(bars) and time == bars[i].dt:
+            filled.append(bars[i])
+            i += 1
+        else:
+            filled.append(VoidBar(time))
+        time += step
+
+    return filled
+
+
+# }}}
+def remove_void(bars):  # {{{
+    i = 0
+    while i < len(bars):
+        if isinstance(bars[i], VoidBar):
+            bars.pop(i)
+        else:
+            i += 1
+
+    return bars
+
+
+# }}}
+def join(bars):  # {{{
+    if len(bars) == 0:
+        return None
+
+    dt_first_bar = bars[0].dt
+    bars = remove_void(bars)
+    if len(bars) > 0:
+        opn = bars[0].open
+        hgh = max([bar.high for bar in bars])
+        low = min([bar.low for bar in bars])
+        close = bars[-1].close
+        volume = sum([bar.vol for bar in bars])
+        return _Bar(dt_first_bar, opn, hgh, low, close, volume)
+
+    return None
+
+
+# }}}
+def old_small(bars, in_type, out_type):  # {{{
+    bars = fill_void(bars, in_type)
+    period = out_type.toTimeDelta()
+
+    converted = list()
+    i = 0
+    while i < len(bars):
+        first = i
+        last = i
+        while last < len(bars):
+            if bars[last].dt - bars[first].dt < period:
+                last += 1
+            else:
+                break
+        new_bar = join(bars[first:last])
+        if new_bar is not None:
+            converted.append(new_bar)
+        i = last
+
+    return converted
+
+
+# }}}
+def old_calendar(bars, in_type, is_begin):  # {{{
+    bars = fill_void(bars, in_type)
+    first = 0
+    last = 0
+    converted = list()
+    while last < len(bars):
+        while last < len(bars):
+            if is_begin(bars[last].dt):
+                break
+            last += 1
+        new_bar = join(bars[first:last])
+        if new_bar is not None:
+            converted.append(new_bar)
+        first = last
+        last += 1
+
+    return converted
+
+
+# }}}
+def make_bars(days, step, seed=1):  # {{{
+    rnd = random.Random(seed)
+    begin = datetime(2020, 1, 1, tzinfo=UTC)
+    bars = list()
+    for d in range(days):
+        day = begin + timedelta(days=d)
+        if day.weekday() >= 5:
+            continue
+        if step == timedelta(days=1):
+            times = [day]
+        else:
+            t = day + timedelta(hours=6, minutes=59)
+            times = list()
+            while t < day + timedelta(hours=20, minutes=50):
+                times.append(t)
+                t += step
+        for t in times:
+            if rnd.random() < 0.1:  # no trades this minute
+                continue
+            o = round(100 + rnd.random() * 10, 2)
+            bars.append(
+                _Bar(
+                    t,
+                    o,
+                    round(o + rnd.random(), 2),
+                    round(o - rnd.random(), 2),
+                    round(o + rnd.random() - 0.5, 2),
+                    rnd.randint(1, 10_000),
+                )
+            )
+
+    return bars
+
+
+# }}}
+def same(a, b) -> bool:  # {{{
+    ta = [(i.dt, i.open, i.high, i.low, i.close, i.vol) for i in a]
+    tb = [(i.dt, i.open, i.high, i.low, i.close, i.vol) for i in b]
+    return ta == tb
+
+
+# }}}
+def bench(name, old_func, bars, in_type, out_type):  # {{{
+    array = BarArray.fromBars(bars)
+
+    begin = time.perf_counter()
+    old = old_func(list(bars))
+    old_sec = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    new = _Converter.convert(array, in_type, out_type)
+    new_sec = time.perf_counter() - begin
+
+    assert same(old, new), f"{name}: results differ"
+    print(
+        f"{name:<8} {len(bars):>9} bars  "
+        f"old {old_sec:8.3f} sec  new {new_sec:8.4f} sec  "
+        f"x{old_sec / new_sec:,.0f}"
+    )
+
+
+# }}}
+
+
+def main():  # {{{
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    m1, d = DataType.BAR_1M, DataType.BAR_D
+
+    bars = make_bars(365 * years, timedelta(minutes=1))
+    for tf in ("5M", "10M", "1H", "D"):
+        out_type = DataType.fromStr(tf)
+        bench(
+            f"1M->{tf}",
+            lambda b: old_small(b, m1, out_type),
+            bars,
+            m1,
+            out_type,
+        )
+
+    bars = make_bars(365 * years * 10, timedelta(days=1))
+    bench(
+        "D->W",
+        lambda b: old_calendar(
+            b, d, lambda dt: dt.weekday() == WeekDays.Mon.value
+        ),
+        bars,
+        d,
+        DataType.fromStr("W"),
+    )
+    bench(
+        "D->M",
+        lambda b: old_calendar(b, d, lambda dt: dt.day == 1),
+        bars,
+        d,
+        DataType.fromStr("M"),
+    )
+
+
+# }}}
+
+
+if __name__ == "__main__":
+    main()
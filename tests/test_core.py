@@ -406,6 +406,118 @@ async def test_Chart(event_loop):
     assert bars[-1].vol == 5000
 
 
+# }}}
+def test_Chart_array():  # {{{
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": "SBER",
+        "figi": "BBG004730N88",
+        "name": "Сбер Банк",
+        "lot": "10",
+        "min_price_step": "0.01",
+    }
+    sber = Instrument(info)
+    tf = TimeFrame("1H")
+
+    # 2 days by 3 hour bars
+    bars = list()
+    for day in (1, 2):
+        for hour in (7, 8, 9):
+            dt = DateTime(2023, 8, day, hour, tzinfo=UTC)
+            price = day * 10 + hour
+            bars.append(Bar(dt, price, price + 1, price - 1, price, 100))
+    array = BarArray.fromBars(bars)
+
+    chart = Chart(sber, tf, array)
+    assert len(chart) == 6
+    assert chart.first.dt == bars[0].dt
+    assert chart[1].dt == bars[-1].dt
+    assert chart[1].chart is chart
+    assert chart.highestHigh() == 30
+    assert chart.lowestLow() == 16
+
+    day = DateTime(2023, 8, 2, tzinfo=UTC)
+    assert len(chart.getBarsOfDay(day)) == 3
+    assert len(chart.getBarsOfMonth(day)) == 6
+    assert len(chart.getBarsOfYear(day)) == 6
+
+    chart.setHeadDatetime(DateTime(2023, 8, 2, 8, 30, tzinfo=UTC))
+    assert chart.now.dt == DateTime(2023, 8, 2, 8, tzinfo=UTC)
+    assert chart.todayOpen() == 27
+    assert chart.yesterdayHigh() == 20
+    assert chart.yesterdayClose() == 19
+
+    # add new bars over capacity
+    chart.resetHead()
+    dt = bars[-1].dt
+    for i in range(1, 101):
+        chart.addHistoricalBar(Bar(dt + ONE_HOUR * i, 1, 2, 0.5, 1, 1))
+    assert len(chart) == 106
+    assert chart[1].dt == dt + ONE_HOUR * 100
+    assert chart.lowestLow() == 0.5
+
+
+# }}}
+@pytest.mark.asyncio  # test_ChartCache  # {{{
+async def test_ChartCache(monkeypatch):
+    from avin.core.chart import _ChartCache
+
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": "SBER",
+        "figi": "BBG004730N88",
+        "name": "Сбер Банк",
+        "lot": "10",
+        "min_price_step": "0.01",
+    }
+    sber = Instrument(info)
+    tf = TimeFrame("1H")
+    first = DateTime(2023, 8, 1, tzinfo=UTC)
+    bars = [Bar(first + ONE_HOUR * i, i, i, i, i, i) for i in range(100)]
+
+    # fake db: count requests, return bars of [begin, end)
+    requests = list()
+
+    async def get(Class, instrument, timeframe, begin, end):
+        requests.append((begin, end))
+        return BarArray.fromBars([b for b in bars if begin <= b.dt < end])
+
+    monkeypatch.setattr(Keeper, "get", get)
+    _ChartCache.clear()
+
+    # expected trades period - one request for all windows
+    _ChartCache.expect(sber, first + ONE_HOUR * 50, first + ONE_HOUR * 90)
+    charts = list()
+    for i in range(40, 80):
+        begin = first + ONE_HOUR * i
+        end = begin + ONE_HOUR * 10
+        charts.append(await _ChartCache.chart(sber, tf, begin, end))
+    assert len(requests) == 1
+    assert len(charts[0]) == 10
+    assert charts[0].first.dt == first + ONE_HOUR * 40
+    assert charts[-1][1].dt == first + ONE_HOUR * 88
+
+    # out of cached period - new request
+    await _ChartCache.chart(sber, tf, first, first + ONE_HOUR * 10)
+    assert len(requests) == 2
+
+    # bars of (instrument, timeframe) changed in db - entry is reloaded
+    from avin.data.bar import _BarsData
+
+    bars[45] = Bar(first + ONE_HOUR * 45, 0, 0, 0, 0, 0)
+    _BarsData.changed(sber, DataType.BAR_D)  # other timeframe
+    await _ChartCache.chart(sber, tf, begin, end)
+    assert len(requests) == 2
+    _BarsData.changed(sber, DataType.BAR_1H)
+    chart = await _ChartCache.chart(sber, tf, first + ONE_HOUR * 45, end)
+    assert len(requests) == 3
+    assert chart.first.close == 0
+
+    _ChartCache.clear()
+
+
 # }}}
 @pytest.mark.asyncio  # test_Asset  # {{{
 async def test_Asset(event_loop):
@@ -845,6 +957,222 @@ async def test_TradeList():
     await TradeList.delete(tlist)  # del in db tlist & del trades too
 
 
+# }}}
+def test_Summary():  # {{{
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": "SBER",
+        "figi": "BBG004730N88",
+        "name": "Сбер Банк",
+        "lot": "10",
+        "min_price_step": "0.01",
+    }
+    sber = Instrument(info)
+    dt = DateTime(2023, 8, 1, tzinfo=UTC)
+
+    def closedTrade(buy, sell):
+        trade = Trade(
+            dt, "s", "v1", Trade.Type.LONG, sber, Trade.Status.CLOSED
+        )
+        for direction, price in ((Direction.BUY, buy), (Direction.SELL, sell)):
+            operation = Operation(
+                account_name="_unittest",
+                dt=dt,
+                direction=direction,
+                instrument=sber,
+                price=price,
+                lots=1,
+                quantity=10,
+                amount=price * 10,
+                commission=0,
+                operation_id=Id.newId(),
+                order_id=None,
+                meta=None,
+            )
+            trade.operations.append(operation)
+        return trade
+
+    prices = [(100, 110), (100, 90), (100, 95), (100, 100), (100, 120)]
+    trades = [closedTrade(b, s) for b, s in prices]  # 100 -100 -50 0 200
+    tlist = TradeList("_unittest", trades)
+
+    summary = Summary(tlist)
+    assert summary.name == "_unittest"
+    assert summary.profit == 150.0
+    assert summary.accuracy == 40.0
+    assert summary.trades == 5
+    assert summary.win == 2
+    assert summary.loss == 2
+    assert summary.ratio == 2.0
+    assert summary.avg == 30.0
+    assert summary.gross_profit == 300.0
+    assert summary.gross_loss == -150.0
+    assert summary.wseq == 2  # 0 is not a loss
+    assert summary.lseq == 2
+    assert summary.avg_win == 150.0
+    assert summary.avg_loss == -75.0
+    assert summary.max_win == 200.0
+    assert summary.max_loss == -100.0
+    assert Summary.percentProfitable(tlist) == 40.0
+
+    # cache is invalidated, when list or trades changed
+    tlist.remove(trades[-1])
+    assert Summary(tlist).profit == -50.0
+    trades[0].setBlocked(True)
+    assert Summary(tlist).profit == -150.0
+    trades[1].status = Trade.Status.CANCELED
+    assert Summary(tlist).trades == 2
+
+    tlist.createChild(trades[:2], "child")
+    df = Summary(tlist).data_frame
+    assert list(df.columns) == Summary.header()
+    assert list(df["name"]) == ["_unittest", "child"]
+
+    # empty list
+    summary = Summary(TradeList("_empty"))
+    assert summary.trades == 0
+    assert summary.accuracy == 0
+    assert summary.ratio == 100.0
+    assert summary.wseq == 0
+
+
+# }}}
+def test_TradeList_index():  # {{{
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": "SBER",
+        "figi": "BBG004730N88",
+        "name": "Сбер Банк",
+        "lot": "10",
+        "min_price_step": "0.01",
+    }
+    sber = Instrument(info)
+    dt = DateTime(2023, 8, 1, tzinfo=UTC)
+    long, short = Trade.Type.LONG, Trade.Type.SHORT
+
+    def newTrade(trade_type, version, sell):
+        trade = Trade(dt, "s", version, trade_type, sber)
+        for direction, price in ((Direction.BUY, 100), (Direction.SELL, sell)):
+            operation = Operation(
+                account_name="_unittest",
+                dt=dt,
+                direction=direction,
+                instrument=sber,
+                price=price,
+                lots=1,
+                quantity=10,
+                amount=price * 10,
+                commission=0,
+                operation_id=Id.newId(),
+                order_id=None,
+                meta=None,
+            )
+            trade.operations.append(operation)
+        return trade
+
+    t1 = newTrade(long, "v1", 110)
+    t2 = newTrade(short, "v2", 90)
+    t3 = newTrade(long, "v1", 90)
+    tlist = TradeList("_unittest", [t1, t2])
+    tlist.add(t3)
+
+    assert tlist.selectLong().trades == (t1, t3)
+    assert tlist.selectStrategy("s", "v1").trades == (t1, t3)
+    assert [i.subname for i in tlist.selectStrategys()] == ["s-v1", "s-v2"]
+    assert len(tlist.selectYear(2023)) == 3
+    assert len(tlist.selectWin()) == 0  # not closed
+
+    # status changed - indexes updated
+    for trade in (t3, t2, t1):
+        trade.status = Trade.Status.CLOSED
+    assert tlist.selectStatus(Trade.Status.CLOSED).trades == (t1, t2, t3)
+    assert tlist.selectWin().trades == (t1,)
+    assert tlist.selectLoss().trades == (t2, t3)
+    t2.status = Trade.Status.CANCELED
+    assert tlist.selectLoss().trades == (t3,)
+
+    # combined select
+    child = tlist.select(strategy=("s", "v1"), outcome="loss")
+    assert child.trades == (t3,)
+    assert child.subname == "s-v1 loss"
+
+    tlist.remove(t3)
+    assert tlist.selectLoss().trades == ()
+    assert child.selectLong().trades == (t3,)  # child has own index
+
+    # read only - changes only through add/remove
+    with pytest.raises(AttributeError):
+        tlist.trades.append(t3)
+
+
+# }}}
+@pytest.mark.asyncio  # test_Keeper_unitOfWork_delete  # {{{
+async def test_Keeper_unitOfWork_delete(monkeypatch):
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": "SBER",
+        "figi": "BBG004730N88",
+        "name": "Сбер Банк",
+        "lot": "10",
+        "min_price_step": "0.01",
+    }
+    sber = Instrument(info)
+    dt = DateTime(2023, 8, 1, tzinfo=UTC)
+
+    async def deleteFromDb(cls, obj, kwargs):
+        pass
+
+    for name in ("__deleteTrade", "__deleteOrder"):
+        monkeypatch.setattr(
+            Keeper, f"_Keeper{name}", classmethod(deleteFromDb)
+        )
+
+    def newTrade():
+        trade_id = Id.newId()
+        trade = Trade(dt, "s", "v1", Trade.Type.LONG, sber, trade_id=trade_id)
+        order = MarketOrder(
+            "_unittest", Direction.BUY, sber, 1, 10, order_id=Id.newId()
+        )
+        order.trade_id = trade.trade_id
+        operation = Operation(
+            account_name="_unittest",
+            dt=dt,
+            direction=Direction.BUY,
+            instrument=sber,
+            price=100,
+            lots=1,
+            quantity=10,
+            amount=1000,
+            commission=0,
+            operation_id=Id.newId(),
+            order_id=order.order_id,
+            trade_id=trade.trade_id,
+            meta=None,
+        )
+        return trade, order, operation
+
+    async with Keeper.unitOfWork(persist=False) as work:
+        t1, o1, op1 = newTrade()
+        t2, o2, op2 = newTrade()
+        for obj in (t1, o1, op1, t2, o2, op2):
+            await Keeper.add(obj)
+
+        # delete trade - its orders and operations are forgotten too
+        await Keeper.delete(t1)
+        assert list(work["Trade"]) == [str(t2.trade_id)]
+        assert list(work["Order"]) == [str(o2.order_id)]
+        assert list(work["Operation"]) == [str(op2.operation_id)]
+
+        # delete order - its operations are forgotten
+        await Keeper.delete(o2)
+        assert list(work["Trade"]) == [str(t2.trade_id)]
+        assert work["Order"] == {}
+        assert work["Operation"] == {}
+
+
 # }}}
 @pytest.mark.asyncio  # test_Order  # {{{
 async def test_Order(event_loop):
@@ -1011,6 +1339,95 @@ async def conditionTrade(trade: Trade) -> bool:
 
 
 # }}}
+@pytest.mark.asyncio  # test_Filter_memo  # {{{
+async def test_Filter_memo(tmp_path, monkeypatch):
+    from avin.data.bar import _BarsData
+
+    monkeypatch.setattr(Usr, "DATA", str(tmp_path))
+    monkeypatch.setattr(Auto, "FILTER_WORKERS", 1)
+    monkeypatch.setattr(Keeper, "BAR_STORE", "arrow")
+    monkeypatch.setattr(Keeper, "BAR_DIR", str(tmp_path / "bars"))
+
+    code = """# {{{
+from avin import *
+
+async def conditionChart(chart: Chart) -> bool:
+    assert False
+
+async def conditionAsset(asset: Asset) -> bool:
+    assert False
+
+async def conditionTrade(trade: Trade) -> bool:
+    trade.info["checked"] = trade.info.get("checked", 0) + 1
+    return trade.type == Trade.Type.LONG
+
+"""  # }}}
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": "SBER",
+        "figi": "BBG004730N88",
+        "name": "Сбер Банк",
+        "lot": "10",
+        "min_price_step": "0.01",
+    }
+    sber = Instrument(info)
+    dt = DateTime(2023, 8, 1, tzinfo=UTC)
+    types = [Trade.Type.LONG, Trade.Type.SHORT, Trade.Type.LONG]
+    trades = [
+        Trade(dt, "s", "v1", t, sber, Trade.Status.CLOSED, Id.newId())
+        for t in types
+    ]
+
+    # data version - counter of changes of bars of asset
+    bars = [Bar(dt + i * ONE_DAY, i, i, i, i, i, chart=None) for i in range(3)]
+    data = _BarsData(DataSource.MOEX, sber, DataType.BAR_D, bars)
+    await _BarsData.save(data)
+
+    f = Filter("_long", code)
+    assert await f.acheckMany(trades) == [True, False, True]
+    assert [t.info["checked"] for t in trades] == [1, 1, 1]
+
+    # second time - from memo, filter is not called
+    assert await f.acheckMany(trades) == [True, False, True]
+    assert [t.info["checked"] for t in trades] == [1, 1, 1]
+
+    # new trade status - new key
+    trades[0].status = Trade.Status.CANCELED
+    assert await f.acheckMany(trades) == [False, False, True]
+
+    # changed code - new memo
+    f2 = Filter("_long", code + "\n")
+    assert f2.code_hash != f.code_hash
+    assert await f2.acheckMany(trades[1:]) == [False, True]
+    assert [t.info["checked"] for t in trades] == [1, 2, 2]
+
+    filter_list = FilterList("_unittest")
+    filter_list.add(f)
+    filter_list.add(f2)
+    results = await filter_list.acheckMany(trades)
+    assert results == [[False, False], [False, False], [True, True]]
+    assert [t.info["checked"] for t in trades] == [1, 2, 2]
+
+    # bars rewritten inside of the same period - new data version,
+    # checked again
+    bars[1] = Bar(dt + ONE_DAY, 9, 9, 9, 9, 99, chart=None)
+    data = _BarsData(DataSource.MOEX, sber, DataType.BAR_D, bars[1:2])
+    await _BarsData.save(data)
+    assert await f.acheckMany(trades) == [False, False, True]
+    assert [t.info["checked"] for t in trades] == [1, 3, 3]
+
+    # the same after delete of bars
+    await _BarsData.delete(sber, DataType.BAR_D, dt, dt + ONE_DAY)
+    assert await f.acheckMany(trades) == [False, False, True]
+    assert [t.info["checked"] for t in trades] == [1, 4, 4]
+
+    # all bars deleted - counter goes on, old keys don't come back
+    await _BarsData.delete(sber, DataType.BAR_D)
+    assert await _BarsData.dataVersion(sber) == 4
+    assert await _BarsData.dataVersion(sber, DataType.BAR_D) == 4
+
+
 @pytest.mark.asyncio  # test_FilterList  # {{{
 async def test_FilterList():
     filter_list = FilterList("_unittest")
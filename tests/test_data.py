@@ -6,6 +6,8 @@
 # LICENSE:      GNU GPLv3
 # ============================================================================
 
+import asyncio
+
 import pytest
 from avin import *
 
@@ -32,6 +34,384 @@ def test_DataType():  # {{{
     assert from_str_data_type.value == "1M"
 
 
+# }}}
+def test_BarArray():  # {{{
+    dt = DateTime(2023, 8, 1, 7, 0, tzinfo=UTC)
+    bars = [
+        Bar(dt, 10, 12, 9, 11, 1000, chart=None),
+        Bar(dt + ONE_MINUTE, 11, 13, 10, 12, 2000, chart=None),
+        Bar(dt + 2 * ONE_MINUTE, 12, 14, 11, 13, 3000, chart=None),
+    ]
+    array = BarArray.fromBars(bars)
+    assert len(array) == 3
+    assert array.dt.dtype == "datetime64[ns]"
+    assert array.open.dtype == "float64"
+    assert array.vol.dtype == "int64"
+    assert array.high.max() == 14
+    assert array.vol.sum() == 6000
+
+    # item -> bar with offset-aware datetime
+    bar = array[1]
+    assert bar.dt == dt + ONE_MINUTE
+    assert bar.close == 12
+    assert bar.vol == 2000
+
+    # slice -> BarArray
+    part = array[1:]
+    assert isinstance(part, BarArray)
+    assert len(part) == 2
+    assert part[0].dt == bar.dt
+
+    assert len(BarArray.empty()) == 0
+
+
+# }}}
+def test_Converter():  # {{{
+    from avin.data.converter import _Converter
+
+    # 07:03 07:04 | 07:05 | 07:11  ->  5M bars 07:00, 07:05, 07:10
+    dt = DateTime(2023, 8, 1, 7, 3, tzinfo=UTC)
+    bars = [
+        Bar(dt, 10, 12, 9, 11, 1000, chart=None),
+        Bar(dt + ONE_MINUTE, 11, 15, 10, 12, 2000, chart=None),
+        Bar(dt + 2 * ONE_MINUTE, 12, 14, 11, 13, 3000, chart=None),
+        Bar(dt + 8 * ONE_MINUTE, 13, 14, 8, 9, 4000, chart=None),
+    ]
+    array = BarArray.fromBars(bars)
+    converted = _Converter.convert(array, DataType.BAR_1M, DataType.BAR_5M)
+    assert len(converted) == 3
+
+    bar = converted[0]
+    assert bar.dt == DateTime(2023, 8, 1, 7, 0, tzinfo=UTC)
+    assert bar.open == 10
+    assert bar.high == 15
+    assert bar.low == 9
+    assert bar.close == 12
+    assert bar.vol == 3000
+    assert converted[1].dt == DateTime(2023, 8, 1, 7, 5, tzinfo=UTC)
+    assert converted[2].dt == DateTime(2023, 8, 1, 7, 10, tzinfo=UTC)
+
+    # by chunks - the same result
+    converter = _Converter(DataType.BAR_1M, DataType.BAR_5M)
+    parts = [converter.push(array[i : i + 1]) for i in range(len(array))]
+    parts.append(converter.finish())
+    chunked = BarArray.concat(parts)
+    assert list(chunked) == list(converted)
+
+    # D -> W: first week begins from the first bar date
+    dt = DateTime(2023, 8, 2, tzinfo=UTC)  # Wednesday
+    bars = [Bar(dt + i * ONE_DAY, 1, 2, 1, 2, 1, chart=None) for i in range(7)]
+    array = BarArray.fromBars(bars)
+    weeks = _Converter.convert(array, DataType.BAR_D, DataType.BAR_W)
+    assert len(weeks) == 2
+    assert weeks[0].dt == dt
+    assert weeks[0].vol == 5
+    assert weeks[1].dt == DateTime(2023, 8, 7, tzinfo=UTC)  # Monday
+
+
+# }}}
+@pytest.mark.asyncio  # test_MoexDownloader  # {{{
+async def test_MoexDownloader():
+    import json
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs, urlparse
+
+    from avin.data.moex_downloader import _MoexDownloader
+
+    # fake ISS: 1M candles 10:00-18:59 every day, the first request fails
+    requests = list()
+
+    class FakeIss(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {k: v[0] for k, v in parse_qs(url.query).items()}
+            requests.append((url.path, query))
+            if len(requests) == 1:
+                self.send_response(503)
+                self.end_headers()
+                return
+
+            begin = DateTime.fromisoformat(query["from"])
+            till = DateTime.fromisoformat(query["till"])
+            rows = list()
+            dt = max(begin, begin.replace(hour=10, minute=0))
+            while dt <= till and dt.hour < 19:
+                end = dt + TimeDelta(seconds=59)
+                rows.append([1, 2, 3, 0.5, 100, 10, str(dt), str(end)])
+                dt += ONE_MINUTE
+            start = int(query["start"])
+            columns = "open close high low value volume begin end"
+            body = {
+                "candles": {
+                    "columns": columns.split(),
+                    "data": rows[start : start + 500],
+                }
+            }
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(json.dumps(body).encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeIss)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": "SBER",
+        "figi": "BBG004730N88",
+        "name": "Сбер Банк",
+        "lot": 10,
+        "min_price_step": 0.01,
+    }
+    sber = Instrument(info)
+    progress = list()
+    downloader = _MoexDownloader(
+        concurrency=4,
+        rate=100,
+        backoff=0.01,
+        base_url=f"http://127.0.0.1:{server.server_port}",
+        progress=lambda task, done, total: progress.append((done, total)),
+    )
+    try:
+        candles = await downloader.candles(
+            sber,
+            DataType.BAR_1M,
+            DateTime(2024, 1, 1, 12, 0),
+            DateTime(2024, 1, 4, 11, 0),
+        )
+    finally:
+        server.shutdown()
+
+    # 12:00-18:59 + 2 full days + 10:00-10:59, 540 per day - 2 pages
+    assert len(candles) == 420 + 540 * 2 + 60
+    assert candles[0].begin == DateTime(2024, 1, 1, 12, 0)
+    assert candles[-1].begin == DateTime(2024, 1, 4, 10, 59)
+    assert candles[0].high == 3
+    assert candles[0].volume == 10
+    assert all(i.begin < j.begin for i, j in zip(candles, candles[1:]))
+
+    # one window per day, one retry, pages requested by 'start'
+    path = "/engines/stock/markets/shares/securities/SBER/candles.json"
+    assert all(url == path for url, _ in requests)
+    assert sorted(progress) == [(1, 4), (2, 4), (3, 4), (4, 4)]
+    assert len(requests) == 1 + 1 + 2 + 2 + 1
+
+
+# }}}
+def test_DownloadManifest():  # {{{
+    from avin.data.download_manifest import _DownloadManifest
+
+    dt = DateTime(2023, 8, 1, 7, 0, tzinfo=UTC)
+    bars = [
+        Bar(dt + i * ONE_MINUTE, 1, 2, 1, 2, i, chart=None) for i in range(3)
+    ]
+    array = BarArray.fromBars(bars)
+    assert array.checksum() == BarArray.fromBars(bars).checksum()
+    assert array.checksum() != array[0:2].checksum()
+
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": "SBER",
+        "figi": "BBG004730N88",
+        "name": "Сбер Банк",
+        "lot": 10,
+        "min_price_step": 0.01,
+    }
+    sber = Instrument(info)
+    manifest = _DownloadManifest(DataSource.MOEX, sber, DataType.BAR_1M)
+    aug = DateTime(2023, 8, 1, tzinfo=UTC)
+    sep = DateTime(2023, 9, 1, tzinfo=UTC)
+    oct = DateTime(2023, 10, 1, tzinfo=UTC)
+    assert not manifest.isDone(aug, sep)
+
+    manifest.add(aug, sep, array)
+    assert manifest.isDone(aug, sep)
+    assert not manifest.isDone(aug, oct)
+    assert not manifest.isDone(sep, oct)
+    record = manifest.find(aug, sep)
+    assert record["count"] == 3
+    assert record["checksum"] == array.checksum()
+
+    # the same interval again - replace record
+    manifest.add(aug, sep, array[0:2])
+    assert len(manifest.records) == 1
+    assert manifest.find(aug, sep)["count"] == 2
+
+    manifest.remove(aug, oct)
+    assert manifest.records == []
+
+
+# }}}
+def test_ArrowBarStore(tmp_path):  # {{{
+    from avin.data.bar import _BarsData
+    from avin.keeper._bar_store import _ArrowBarStore
+
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": "SBER",
+        "figi": "BBG004730N88",
+        "name": "Сбер Банк",
+        "lot": 10,
+        "min_price_step": 0.01,
+    }
+    sber = Instrument(info)
+    store = _ArrowBarStore(str(tmp_path))
+
+    # 4 days over new year - 2 files
+    dt = DateTime(2022, 12, 30, tzinfo=UTC)
+    bars = [Bar(dt + i * ONE_DAY, i, i, i, i, i, chart=None) for i in range(4)]
+    data = _BarsData(DataSource.MOEX, sber, DataType.BAR_D, bars)
+    store.save(data)
+    assert (tmp_path / "MOEX_SHARE_SBER" / "D" / "2022.arrow").exists()
+    assert (tmp_path / "MOEX_SHARE_SBER" / "D" / "2023.arrow").exists()
+
+    columns = store.load(sber, DataType.BAR_D)
+    array = BarArray(*columns)
+    assert list(array) == list(BarArray.fromBars(bars))
+
+    # period inside one year - view on memory mapped file, no copy
+    begin = DateTime(2023, 1, 1, tzinfo=UTC)
+    columns = store.load(sber, DataType.BAR_D, begin=begin)
+    assert len(columns[0]) == 2
+    assert not columns[0].flags.owndata
+    assert columns[1].tolist() == [2, 3]
+
+    records = store.records(sber, DataType.BAR_D, end=begin)
+    assert [i["volume"] for i in records] == [0, 1]
+    assert records[0]["dt"] == dt
+
+    records = store.info()
+    assert len(records) == 1
+    assert records[0]["data_source"] == "MOEX"
+    assert records[0]["data_type"] == "BAR_D"
+    assert records[0]["first_dt"] == dt
+    assert records[0]["last_dt"] == dt + 3 * ONE_DAY
+
+    # save again the same period - replace bars
+    bars[1] = Bar(dt + ONE_DAY, 9, 9, 9, 9, 99, chart=None)
+    data = _BarsData(DataSource.MOEX, sber, DataType.BAR_D, bars[1:3])
+    store.save(data)
+    array = BarArray(*store.load(sber, DataType.BAR_D))
+    assert array.vol.tolist() == [0, 99, 2, 3]
+
+    # delete 2022 bars
+    store.delete(sber, DataType.BAR_D, dt, begin)
+    assert not (tmp_path / "MOEX_SHARE_SBER" / "D" / "2022.arrow").exists()
+    assert store.info(sber, DataType.BAR_D)[0]["first_dt"] == begin
+
+    store.delete(sber, DataType.BAR_D)
+    assert store.info() == []
+    assert len(store.load(sber, DataType.BAR_D)[0]) == 0
+
+
+# }}}
+@pytest.mark.asyncio  # test_ArrowBarStore_stream  # {{{
+async def test_ArrowBarStore_stream(tmp_path, monkeypatch):
+    from avin.data.bar import _BarsData
+    from avin.keeper._bar_store import _ArrowBarStore
+
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": "SBER",
+        "figi": "BBG004730N88",
+        "name": "Сбер Банк",
+        "lot": 10,
+        "min_price_step": 0.01,
+    }
+    sber = Instrument(info)
+    monkeypatch.setattr(Keeper, "BAR_STORE", "arrow")
+    monkeypatch.setattr(Keeper, "BAR_DIR", str(tmp_path))
+
+    dt = DateTime(2022, 12, 30, tzinfo=UTC)
+    bars = [Bar(dt + i * ONE_DAY, i, i, i, i, i, chart=None) for i in range(4)]
+    data = _BarsData(DataSource.MOEX, sber, DataType.BAR_D, bars)
+    _ArrowBarStore(str(tmp_path)).save(data)
+
+    # period as dates, like BarStream.loadData gives
+    batches = [
+        i
+        async for i in Keeper.stream(
+            BarArray,
+            batch=1,
+            instrument=sber,
+            data_type=DataType.BAR_D,
+            begin=Date(2022, 12, 31),
+            end=Date(2023, 1, 2),
+        )
+    ]
+    assert len(batches) == 2
+    assert batches[0].datetime(0) == DateTime(2022, 12, 31, tzinfo=UTC)
+    assert batches[1].datetime(0) == DateTime(2023, 1, 1, tzinfo=UTC)
+
+
+# }}}
+@pytest.mark.asyncio  # test_Keeper_stream  # {{{
+async def test_Keeper_stream(tmp_path, monkeypatch):
+    from avin.data.bar import _Bar, _BarsData
+    from avin.keeper._bar_store import _ArrowBarStore
+
+    monkeypatch.setattr(Keeper, "BAR_STORE", "arrow")
+    monkeypatch.setattr(Keeper, "BAR_DIR", str(tmp_path))
+
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": "SBER",
+        "figi": "BBG004730N88",
+        "name": "Сбер Банк",
+        "lot": 10,
+        "min_price_step": 0.01,
+    }
+    sber = Instrument(info)
+    dt = DateTime(2022, 12, 30, tzinfo=UTC)
+    bars = [Bar(dt + i * ONE_DAY, i, i, i, i, i, chart=None) for i in range(5)]
+    data = _BarsData(DataSource.MOEX, sber, DataType.BAR_D, bars)
+    _ArrowBarStore(str(tmp_path)).save(data)
+
+    # BarArray by 2 bars, period [begin, end)
+    batches = [
+        i
+        async for i in Keeper.stream(
+            BarArray,
+            batch=2,
+            instrument=sber,
+            timeframe=TimeFrame("D"),
+            begin=dt + ONE_DAY,
+            end=dt + 5 * ONE_DAY,
+        )
+    ]
+    assert [len(i) for i in batches] == [2, 2]
+    assert BarArray.concat(batches).vol.tolist() == [1, 2, 3, 4]
+
+    # records and bars
+    batches = [
+        i
+        async for i in Keeper.stream(
+            _Bar, batch=3, instrument=sber, data_type=DataType.BAR_D
+        )
+    ]
+    assert [len(i) for i in batches] == [3, 2]
+    assert batches[0][0]["dt"] == dt
+    assert batches[1][1]["volume"] == 4
+
+    batches = [
+        i
+        async for i in Keeper.stream(
+            Bar, instrument=sber, timeframe=TimeFrame("D")
+        )
+    ]
+    assert len(batches) == 1
+    assert batches[0][4].dt == dt + 4 * ONE_DAY
+    assert batches[0][4].close == 4
+
+
 # }}}
 def test_Exchange():  # {{{
     moex = Exchange.MOEX
@@ -260,6 +640,181 @@ async def test_Data_convert():
     await Data.convert(convert_task)
 
 
+# }}}
+def test_TinkoffData_readArchive(tmp_path, monkeypatch):  # {{{
+    import zipfile
+
+    import numpy as np
+    from avin.data.source_tinkoff import _TinkoffData
+
+    uid = "53b67587-96eb-4b41-8e0c-d2e3c0bdd234"
+    files = {
+        # files in archive not in order of dates
+        f"{uid}_20230807.csv": (
+            f"{uid};2023-08-07T07:01:00Z;103;104;105;102;30;\n"
+            f"{uid};2023-08-07T07:00:00Z;101;102;103;100;20;\n"
+        ),
+        f"{uid}_20230804.csv": (
+            f"{uid};2023-08-04T07:00:00Z;99;100;101;98;10;\n"
+            # time with offset -> UTC 2023-08-04 07:01
+            f"{uid};2023-08-04T10:01:00+03:00;100;101;102;99;11;"
+        ),
+        # weekend, dropped
+        f"{uid}_20230805.csv": f"{uid};2023-08-05T07:00:00Z;1;1;1;1;1;\n",
+        # duplicate of bar
+        f"{uid}_20230808.csv": (
+            f"{uid};2023-08-07T07:00:00Z;101;102;103;100;20;\n"
+        ),
+        "readme.txt": "not csv",
+    }
+    archive_path = tmp_path / "archive.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        for name, text in files.items():
+            archive.writestr(name, text)
+
+    monkeypatch.setattr(_TinkoffData, "EXCLUDE_HOLIDAYS", True)
+    bars = _TinkoffData._TinkoffData__readArchive(str(archive_path))
+
+    assert len(bars) == 4
+    assert bars.dt.dtype == np.dtype("datetime64[ns]")
+    assert bars.datetime(0) == DateTime(2023, 8, 4, 7, 0, tzinfo=UTC)
+    assert bars.datetime(1) == DateTime(2023, 8, 4, 7, 1, tzinfo=UTC)
+    assert bars.datetime(2) == DateTime(2023, 8, 7, 7, 0, tzinfo=UTC)
+    assert bars.datetime(3) == DateTime(2023, 8, 7, 7, 1, tzinfo=UTC)
+
+    # columns of file: open, close, high, low
+    bar = bars[3]
+    assert (bar.open, bar.high, bar.low, bar.close) == (103, 105, 102, 104)
+    assert bar.vol == 30
+
+    # empty archive
+    empty_path = tmp_path / "empty.zip"
+    with zipfile.ZipFile(empty_path, "w") as archive:
+        archive.writestr(f"{uid}_20230807.csv", "")
+    assert len(_TinkoffData._TinkoffData__readArchive(str(empty_path))) == 0
+
+
+# }}}
+@pytest.mark.asyncio  # test_DataManager_download_save_lock  # {{{
+async def test_DataManager_download_save_lock(monkeypatch):
+    from avin.data import data_manager
+    from avin.data.bar import _Bar, _BarsData
+    from avin.data.download_manifest import _DownloadManifest
+    from avin.data.source_moex import _MoexData
+
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": "SBER",
+        "figi": "BBG004730N88",
+        "name": "Сбер Банк",
+        "lot": "10",
+        "min_price_step": "0.01",
+    }
+    sber = Instrument(info)
+
+    async def getHistoricalBars(instr, data_type, begin, end):
+        await asyncio.sleep(0)
+        return [_Bar(begin, 1.0, 1.0, 1.0, 1.0, 1)]
+
+    # requests of months go in parallel, saves must not overlap
+    active = list()
+    saved = list()
+
+    async def save(data):
+        active.append(data)
+        assert len(active) == 1
+        await asyncio.sleep(0.01)
+        saved.append(data.first_dt)
+        active.remove(data)
+
+    monkeypatch.setattr(_MoexData, "getHistoricalBars", getHistoricalBars)
+    monkeypatch.setattr(_BarsData, "save", save)
+    monkeypatch.setattr(
+        _DownloadManifest,
+        "load",
+        lambda source, instr, data_type: _DownloadManifest(
+            source, instr, data_type
+        ),
+    )
+    monkeypatch.setattr(_DownloadManifest, "save", lambda manifest: None)
+
+    await data_manager._DataManager.download(
+        DataSource.MOEX, sber, DataType.BAR_1H, 2023
+    )
+    assert len(saved) == 12
+
+
+# }}}
+@pytest.mark.asyncio  # test_DataManager_convertAll_chain  # {{{
+async def test_DataManager_convertAll_chain(monkeypatch):
+    from avin.data import data_manager
+    from avin.data.bar import _Bar
+    from avin.data.converter import _Converter
+
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": "SBER",
+        "figi": "BBG004730N88",
+        "name": "Сбер Банк",
+        "lot": "10",
+        "min_price_step": "0.01",
+    }
+    sber = Instrument(info)
+
+    # 1M bars of 3 weeks, 30 minutes a day, weekends skipped
+    bars = list()
+    for day in range(1, 22):
+        dt = DateTime(2023, 8, day, 7, 0, tzinfo=UTC)
+        if dt.weekday() > 4:
+            continue
+        for minute in range(30):
+            price = 100.0 + day + minute / 100
+            bars.append(_Bar(dt, price, price + 1, price - 1, price, 10))
+            dt += ONE_MINUTE
+
+    # in memory storage instead of database
+    store = {"1M": BarArray.fromBars(bars)}
+
+    async def fakeConvertGroup(figi, in_type, out_types):
+        if in_type not in store:
+            return [(f"{figi}-{in_type} -> {i}", 0.0, "no input data")]
+        for out_type in out_types:
+            store[out_type] = _Converter.convert(
+                store[in_type],
+                DataType.fromStr(in_type),
+                DataType.fromStr(out_type),
+            )
+        return [(f"{figi}-{in_type} -> {i}", 0.0, None) for i in out_types]
+
+    monkeypatch.setattr(data_manager, "_convertGroup", fakeConvertGroup)
+
+    # D -> W listed before 1M -> D, must run after it
+    clist = ConvertTaskList("_unittest")
+    clist.add(ConvertTask(sber, DataType.BAR_D, DataType.BAR_W))
+    clist.add(ConvertTask(sber, DataType.BAR_1M, DataType.BAR_D))
+    await data_manager._DataManager.convertAll(clist, workers=1)
+
+    day = store["D"]
+    week = store["W"]
+    assert len(day) == 15
+    assert len(week) == 4
+    expected = _Converter.convert(day, DataType.BAR_D, DataType.BAR_W)
+    assert (week.dt == expected.dt).all()
+    assert (week.close == expected.close).all()
+    assert (week.vol == expected.vol).all()
+
+    # waves for the process pool: W after D, other asset is independent
+    groups = {
+        ("A", "D"): ["W", "M"],
+        ("A", "1M"): ["D", "1H"],
+        ("B", "1M"): ["D"],
+    }
+    waves = data_manager._convertWaves(groups)
+    assert waves == [[("A", "1M"), ("B", "1M")], [("A", "D")]]
+
+
 # }}}
 @pytest.mark.asyncio  # test_Data_request  # {{{
 async def test_Data_request():
@@ -6,9 +6,123 @@
 # LICENSE:      GNU GPLv3
 # ============================================================================
 
+import random
+
+import numpy as np
 import pytest
 from avin import *
-from avin.tester.stream import BarStream
+from avin.data.bar import _Bar
+from avin.data.converter import _Converter
+from avin.tester import stream as stream_module
+from avin.tester.stream import BarStream, BarStream2
+from avin.tester.virtual_broker import VirtualBroker
+
+
+def syntheticBars(seed: int) -> BarArray:  # {{{
+    """1M bars 2023-08-03 .. 2023-08-07: nights, weekend and holes"""
+
+    rnd = random.Random(seed)
+    bars = list()
+    for day in (3, 4, 7):  # 5, 6 - weekend
+        dt = DateTime(2023, 8, day, 7, 0, tzinfo=UTC)
+        while dt.hour < 10:
+            if rnd.random() > 0.2:  # 20% of minutes - holes
+                o = round(100 + rnd.random(), 2)
+                bars.append(_Bar(dt, o, o + 1, o - 1, o, rnd.randint(1, 99)))
+            dt += ONE_MINUTE
+
+    return BarArray.fromBars(bars)
+
+
+# }}}
+def referenceStream(bars: dict, begin: DateTime, end: DateTime):  # {{{
+    """Old BarStream: step by minute and bars.pop(0)
+
+    bars - {(figi, timeframe): BarArray}, return list of tuples
+    (event type, figi, timeframe, bar dt)
+    """
+
+    bars = {key: list(array) for key, array in bars.items()}
+    keys = sorted(bars, key=lambda k: (k[1], k[0]))  # timeframe, figi
+
+    events = list()
+    time = begin
+    while time < end:
+        for figi, timeframe in keys:
+            queue = bars[(figi, timeframe)]
+            if not queue or time < queue[0].dt + timeframe:
+                continue
+
+            last_bar = queue.pop(0)
+            events.append(("NEW", figi, timeframe, last_bar.dt))
+            if queue:
+                events.append(("CHANGED", figi, timeframe, queue[0].dt))
+
+        time += ONE_MINUTE
+
+    return events
+
+
+# }}}
+def streamEvents(stream) -> list[tuple]:  # {{{
+    names = {
+        Event.Type.NEW_HISTORICAL_BAR: "NEW",
+        Event.Type.BAR_CHANGED: "CHANGED",
+    }
+    return [(names[e.type], e.figi, e.timeframe, e.bar.dt) for e in stream]
+
+
+# }}}
+def syntheticAsset(ticker: str, figi: str) -> Asset:  # {{{
+    info = {
+        "exchange": "MOEX",
+        "type": "SHARE",
+        "ticker": ticker,
+        "figi": figi,
+        "name": ticker,
+        "lot": "10",
+        "min_price_step": "0.01",
+    }
+    return Asset.fromInstrument(Instrument(info))
+
+
+# }}}
+async def loadSyntheticStream(monkeypatch, assets) -> tuple:  # {{{
+    """BarStream over synthetic bars, return (stream, bars, begin, end)
+
+    Stream begin is 2023-08-04: bars of 08-03 are before it and
+    are clamped to begin. End is 2023-08-07, bars of 08-07 are cut.
+    """
+
+    in_type = DataType.BAR_1M
+    bars = dict()
+    for n, asset in enumerate(assets):
+        bars_1m = syntheticBars(seed=n)
+        for tf in ("1M", "5M", "1H", "D"):
+            out_type = DataType.fromStr(tf)
+            if out_type == in_type:
+                converted = bars_1m
+            else:
+                converted = _Converter.convert(bars_1m, in_type, out_type)
+            bars[(asset.figi, TimeFrame(tf))] = converted
+
+    async def fakeLoadBars(asset, timeframe, begin, end):
+        return bars[(asset.figi, timeframe)]
+
+    monkeypatch.setattr(stream_module, "_loadBars", fakeLoadBars)
+
+    stream = BarStream()
+    for asset in assets:
+        for tf in ("1M", "5M", "1H", "D"):
+            stream.subscribe(asset, TimeFrame(tf))
+
+    await stream.loadData(Date(2023, 8, 4), Date(2023, 8, 7))
+    begin = DateTime(2023, 8, 4, tzinfo=UTC)
+    end = DateTime(2023, 8, 7, tzinfo=UTC)
+    return stream, bars, begin, end
+
+
+# }}}
 
 
 @pytest.mark.asyncio  # test_BarStream  # {{{
@@ -21,13 +135,510 @@ async def test_BarStream():
     stream.subscribe(afks, TimeFrame("1M"))
     stream.subscribe(afks, TimeFrame("D"))
     stream.subscribe(afks, TimeFrame("5M"))
+    stream.subscribe(aflt, TimeFrame("1M"))
+    stream.subscribe(alrs, TimeFrame("5M"))
 
     begin = Date(2023, 8, 1)
     end = Date(2023, 8, 2)
     await stream.loadData(begin, end)
 
+    figis = set()
     for i in stream:
-        isinstance(i, Event)
+        assert isinstance(i, Event)
+        figis.add(i.figi)
+    assert figis == {afks.figi, aflt.figi, alrs.figi}
+
+
+# }}}
+@pytest.mark.asyncio  # test_BarStream_synthetic  # {{{
+async def test_BarStream_synthetic(monkeypatch):
+    asset = syntheticAsset("AAA", "FIGI_A")
+    stream, bars, begin, end = await loadSyntheticStream(monkeypatch, [asset])
+
+    events = streamEvents(stream)
+    assert events == referenceStream(bars, begin, end)
+
+    # bars of 08-03 closed before begin - clamped, sent from begin
+    first = [e for e in events if e[0] == "NEW"][0]
+    assert first[3] < begin
+
+    # end cutoff - no bars of 08-07
+    assert all(e[3] < end for e in events if e[0] == "NEW")
+
+    # every bar before end is sent once
+    sent = [(e[1], e[2], e[3]) for e in events if e[0] == "NEW"]
+    assert len(sent) == len(set(sent))
+    np_end = np.datetime64(end.replace(tzinfo=None), "ns")
+    assert len(sent) == sum(
+        int((array.dt < np_end).sum()) for array in bars.values()
+    )
+
+
+# }}}
+@pytest.mark.asyncio  # test_BarStream_many_assets  # {{{
+async def test_BarStream_many_assets(monkeypatch):
+    assets = [
+        syntheticAsset("BBB", "FIGI_B"),
+        syntheticAsset("AAA", "FIGI_A"),
+    ]
+    stream, bars, begin, end = await loadSyntheticStream(monkeypatch, assets)
+
+    events = list(stream)
+    assert streamEvents(events) == referenceStream(bars, begin, end)
+    assert {e.figi for e in events} == {"FIGI_A", "FIGI_B"}
+
+    # every NEW_HISTORICAL_BAR is followed by BAR_CHANGED of the same
+    # (figi, timeframe) with the next bar, except the last bar
+    last_dt = {k: a.datetime(len(a) - 1) for k, a in bars.items()}
+    i = 0
+    while i < len(events):
+        event = events[i]
+        assert event.type == Event.Type.NEW_HISTORICAL_BAR
+        key = (event.figi, event.timeframe)
+        if event.bar.dt == last_dt[key]:
+            i += 1
+            continue
+
+        changed = events[i + 1]
+        assert changed.type == Event.Type.BAR_CHANGED
+        assert (changed.figi, changed.timeframe) == key
+        assert changed.bar.dt > event.bar.dt
+        i += 2
+
+    # order by (time, timeframe, figi), time of bar - close time,
+    # clamped to begin and not more than one bar of key per minute
+    order = list()
+    sent = dict()
+    for e in events:
+        if e.type != Event.Type.NEW_HISTORICAL_BAR:
+            continue
+        key = (e.figi, e.timeframe)
+        time = max(e.bar.dt + e.timeframe, begin)
+        if key in sent:
+            time = max(time, sent[key] + ONE_MINUTE)
+        sent[key] = time
+        order.append((time, e.timeframe, e.figi))
+    assert order == sorted(order)
+
+
+# }}}
+class FakeAccount:  # {{{
+    """Account for VirtualBroker - remembers fills, may post new order
+
+    spawn(order) -> new order or None, it is called on every fill,
+    that is like strategy, which posts orders while they are executed.
+    """
+
+    name = "_backtest"
+
+    def __init__(self, broker, spawn):
+        self.broker = broker
+        self.spawn = spawn
+        self.fills = list()
+
+    async def receive(self, event):
+        transaction = event.transaction
+        order_id = str(transaction.order_id)
+        self.fills.append((order_id, transaction.dt, transaction.price))
+
+        child = self.spawn(order_id)
+        if child is not None:
+            await postOrder(self.broker, self, child)
+
+
+# }}}
+async def postOrder(broker, account, order) -> None:  # {{{
+    methods = {
+        Order.Type.MARKET: broker.postMarketOrder,
+        Order.Type.LIMIT: broker.postLimitOrder,
+        Order.Type.STOP: broker.postStopOrder,
+        Order.Type.STOP_LOSS: broker.postStopLoss,
+        Order.Type.TAKE_PROFIT: broker.postTakeProfit,
+    }
+    await methods[order.type](account, order)
+
+
+# }}}
+async def cancelOrder(broker, account, order) -> None:  # {{{
+    if order.type == Order.Type.LIMIT:
+        await broker.cancelLimitOrder(account, order)
+    else:
+        await broker.cancelStopOrder(account, order)
+
+
+# }}}
+def newOrder(order_type, direction, price, n=[0]) -> Order:  # {{{
+    n[0] += 1
+    order_id = Id(f"order-{n[0]}")
+    sber = syntheticAsset("SBER", "BBG004730N88")
+    args = ("_backtest", direction, sber, 1, 10)
+    match order_type:
+        case Order.Type.MARKET:
+            return MarketOrder(*args, order_id=order_id)
+        case Order.Type.LIMIT:
+            return LimitOrder(*args, price, order_id=order_id)
+        case Order.Type.STOP:
+            return StopOrder(*args, price, price, order_id=order_id)
+        case Order.Type.STOP_LOSS:
+            return StopLoss(*args, price, None, order_id=order_id)
+        case Order.Type.TAKE_PROFIT:
+            return TakeProfit(*args, price, price, order_id=order_id)
+
+
+# }}}
+def referenceFills(bars, flow, spawn) -> list[tuple]:  # {{{
+    """Old VirtualBroker: scan of lists of orders
+
+    Copy of __checkOrdersMarket, __checkOrdersLimit, __checkOrdersStop
+    before order books, with fixed sell limit branch (it tested BUY
+    twice, so sell limit was never filled by gap).
+    flow[k] - (orders posted, orders canceled) before bar k.
+    """
+
+    market, limit, stop = list(), list(), list()
+    fills = list()
+
+    def post(order):
+        match order.type:
+            case Order.Type.MARKET:
+                market.append(order)
+            case Order.Type.LIMIT:
+                limit.append(order)
+            case _:
+                stop.append(order)
+
+    def execute(orders, order, dt, price):
+        fills.append((str(order.order_id), dt, price))
+        orders.remove(order)
+        child = spawn(str(order.order_id))
+        if child is not None:
+            post(child)
+
+    for bar, (posted, canceled) in zip(bars, flow):
+        for order in posted:
+            post(order)
+        for order in canceled:
+            for orders in (limit, stop):
+                if order in orders:
+                    orders.remove(order)
+
+        i = 0
+        while i < len(market):
+            execute(market, market[i], bar.dt, bar.open)
+
+        i = 0
+        while i < len(limit):
+            order = limit[i]
+            if order.price in bar:
+                execute(limit, order, bar.dt, order.price)
+                continue
+            if order.direction == Direction.BUY:
+                if bar.open < order.price:
+                    execute(limit, order, bar.dt, bar.open)
+                    continue
+            if order.direction == Direction.SELL:
+                if bar.open > order.price:
+                    execute(limit, order, bar.dt, bar.open)
+                    continue
+            i += 1
+
+        i = 0
+        while i < len(stop):
+            order = stop[i]
+            price = order.stop_price
+            if price in bar:
+                execute(stop, order, bar.dt, price)
+                continue
+            if order.type == Order.Type.STOP_LOSS:
+                if order.direction == Direction.SELL:
+                    if bar.open < order.stop_price:
+                        execute(stop, order, bar.dt, bar.open)
+                        continue
+                if order.direction == Direction.BUY:
+                    if bar.open > order.stop_price:
+                        execute(stop, order, bar.dt, bar.open)
+                        continue
+            if order.type == Order.Type.TAKE_PROFIT:
+                if order.direction == Direction.SELL:
+                    if bar.open > order.stop_price:
+                        execute(stop, order, bar.dt, bar.open)
+                        continue
+                if order.direction == Direction.BUY:
+                    if bar.open < order.stop_price:
+                        execute(stop, order, bar.dt, bar.open)
+                        continue
+            i += 1
+
+    return fills
+
+
+# }}}
+async def brokerFills(bars, flow, spawn) -> list[tuple]:  # {{{
+    broker = VirtualBroker()
+    account = FakeAccount(broker, spawn)
+    broker._VirtualBroker__account = account
+    check = broker._VirtualBroker__checkOrders
+
+    async with Keeper.unitOfWork(persist=False):
+        for bar, (posted, canceled) in zip(bars, flow):
+            for order in posted:
+                await postOrder(broker, account, order)
+            for order in canceled:
+                await cancelOrder(broker, account, order)
+            await check(bar, "BBG004730N88")
+
+    return account.fills
+
+
+# }}}
+async def checkOneBar(order, bar) -> float | None:  # {{{
+    """Post order, check it on one bar, return price of fill"""
+
+    fills = await brokerFills([bar], [([order], [])], lambda _: None)
+    assert fills == referenceFills([bar], [([order], [])], lambda _: None)
+    if not fills:
+        return None
+
+    assert order.status == Order.Status.FILLED
+    return fills[0][2]
+
+
+# }}}
+def oneBar(o, h, l, c) -> Bar:  # {{{
+    return Bar(DateTime(2023, 8, 1, 7, tzinfo=UTC), o, h, l, c, 1)
+
+
+# }}}
+@pytest.mark.asyncio  # test_VirtualBroker_gaps  # {{{
+async def test_VirtualBroker_gaps():
+    BUY, SELL = Direction.BUY, Direction.SELL
+    T = Order.Type
+
+    # price inside the bar - filled by price of order
+    inside = oneBar(99, 101, 98, 100)
+    for order_type in (T.LIMIT, T.STOP, T.STOP_LOSS, T.TAKE_PROFIT):
+        for direction in (BUY, SELL):
+            order = newOrder(order_type, direction, 100)
+            assert await checkOneBar(order, inside) == 100
+
+    # market - by open
+    order = newOrder(T.MARKET, BUY, 0)
+    assert await checkOneBar(order, inside) == 99
+
+    below = oneBar(97, 98, 95, 96)  # bar opened under price 100
+    above = oneBar(103, 105, 102, 104)  # bar opened above price 100
+    cases = [
+        # buy limit: bar under - by open, bar above - not filled
+        (T.LIMIT, BUY, below, 97),
+        (T.LIMIT, BUY, above, None),
+        # sell limit: bar above - by open (fixed branch), under - not
+        (T.LIMIT, SELL, above, 103),
+        (T.LIMIT, SELL, below, None),
+        # plain stop - only price inside the bar
+        (T.STOP, BUY, above, None),
+        (T.STOP, BUY, below, None),
+        (T.STOP, SELL, above, None),
+        (T.STOP, SELL, below, None),
+        # stop loss of long (sell): opened under - by open
+        (T.STOP_LOSS, SELL, below, 97),
+        (T.STOP_LOSS, SELL, above, None),
+        # stop loss of short (buy): opened above - by open
+        (T.STOP_LOSS, BUY, above, 103),
+        (T.STOP_LOSS, BUY, below, None),
+        # take profit of long (sell): opened above - by open
+        (T.TAKE_PROFIT, SELL, above, 103),
+        (T.TAKE_PROFIT, SELL, below, None),
+        # take profit of short (buy): opened under - by open
+        (T.TAKE_PROFIT, BUY, below, 97),
+        (T.TAKE_PROFIT, BUY, above, None),
+    ]
+    for order_type, direction, bar, expected in cases:
+        order = newOrder(order_type, direction, 100)
+        assert await checkOneBar(order, bar) == expected, (
+            order_type,
+            direction,
+        )
+
+
+# }}}
+@pytest.mark.asyncio  # test_VirtualBroker_cancel  # {{{
+async def test_VirtualBroker_cancel():
+    bar = oneBar(99, 101, 98, 100)
+    limit = newOrder(Order.Type.LIMIT, Direction.BUY, 100)
+    stop = newOrder(Order.Type.STOP_LOSS, Direction.SELL, 100)
+    other = newOrder(Order.Type.LIMIT, Direction.BUY, 100)
+
+    # canceled by id - not filled, other order of the same price is
+    flow = [([limit, stop, other], []), ([], [limit, stop])]
+    bars = [oneBar(110, 111, 109, 110), bar]
+    fills = await brokerFills(bars, flow, lambda _: None)
+    assert fills == [(str(other.order_id), bar.dt, 100)]
+    assert limit.status == Order.Status.CANCELED
+    assert stop.status == Order.Status.CANCELED
+
+
+# }}}
+@pytest.mark.asyncio  # test_VirtualBroker_post_while_execute  # {{{
+async def test_VirtualBroker_post_while_execute():
+    bar = oneBar(99, 101, 98, 100)
+    first = newOrder(Order.Type.LIMIT, Direction.BUY, 100)
+    late = newOrder(Order.Type.LIMIT, Direction.BUY, 99)
+    take = newOrder(Order.Type.TAKE_PROFIT, Direction.SELL, 101)
+
+    # fill of first posts late limit, fill of late posts take profit,
+    # both are inside of the bar - filled in the same bar
+    children = {str(first.order_id): late, str(late.order_id): take}
+    spawn = children.get
+
+    fills = await brokerFills([bar], [([first], [])], spawn)
+    assert fills == referenceFills([bar], [([first], [])], spawn)
+    assert fills == [
+        (str(first.order_id), bar.dt, 100),
+        (str(late.order_id), bar.dt, 99),
+        (str(take.order_id), bar.dt, 101),
+    ]
+
+
+# }}}
+@pytest.mark.asyncio  # test_VirtualBroker_random  # {{{
+async def test_VirtualBroker_random():
+    """New order books against old scan of lists, random bars/orders"""
+
+    T = Order.Type
+    types = [T.MARKET, T.LIMIT, T.STOP, T.STOP_LOSS, T.TAKE_PROFIT]
+    directions = [Direction.BUY, Direction.SELL]
+    for seed in range(20):
+        rnd = random.Random(seed)
+
+        # random walk of integer prices, with gaps between bars
+        bars = list()
+        dt = DateTime(2023, 8, 1, 7, tzinfo=UTC)
+        close = 100
+        for _ in range(60):
+            o = close + rnd.choice([0, 0, 0, -3, 3, -1, 1])
+            h = o + rnd.randint(0, 3)
+            l = o - rnd.randint(0, 3)
+            close = rnd.randint(l, h)
+            bars.append(Bar(dt, o, h, l, close, 1))
+            dt += ONE_MINUTE
+
+        # flow of orders, posted before every bar, some canceled
+        flow = list()
+        posted = list()
+        for bar in bars:
+            new = [
+                newOrder(
+                    rnd.choice(types),
+                    rnd.choice(directions),
+                    bar.open + rnd.randint(-4, 4),
+                )
+                for _ in range(rnd.randint(0, 4))
+            ]
+            posted += new
+            canceled = rnd.sample(posted, min(len(posted), rnd.randint(0, 1)))
+            canceled = [i for i in canceled if i.type != Order.Type.MARKET]
+            flow.append((new, canceled))
+
+        # every third fill posts one more order - strategy reacts
+        def makeSpawn():
+            count = [0]
+            made = dict()
+
+            def spawn(order_id):
+                if order_id not in made:
+                    count[0] += 1
+                    made[order_id] = None
+                    if count[0] % 3 == 0:
+                        made[order_id] = newOrder(
+                            rnd.choice(types[1:]),
+                            rnd.choice(directions),
+                            100 + rnd.randint(-6, 6),
+                        )
+                return made[order_id]
+
+            return spawn
+
+        # the same children for both: spawn is called in order of fills
+        spawn = makeSpawn()
+        expected = referenceFills(bars, flow, spawn)
+        fills = await brokerFills(bars, flow, spawn)
+        assert fills == expected, seed
+        assert len(fills) > 50
+
+
+# }}}
+@pytest.mark.asyncio  # test_BarStream2  # {{{
+async def test_BarStream2():
+    stream = BarStream2()
+
+    sber = await Asset.fromTicker(Exchange.MOEX, Asset.Type.SHARE, "SBER")
+    stream.subscribe(sber, TimeFrame("1M"))
+    stream.subscribe(sber, TimeFrame("5M"))
+
+    begin = Date(2023, 8, 1)
+    end = Date(2023, 8, 2)
+    await stream.loadData(begin, end)
+
+    bars_5m = list()
+    for e in stream:
+        assert isinstance(e, Event)
+        if (
+            e.type == Event.Type.NEW_HISTORICAL_BAR
+            and e.timeframe == TimeFrame("5M")
+        ):
+            bars_5m.append(e.bar)
+
+    # собранные из 1M бары совпадают с конвертированными в базе
+    expected = await Keeper.get(
+        Bar,
+        instrument=sber,
+        timeframe=TimeFrame("5M"),
+        begin=begin,
+        end=end,
+    )
+    assert len(bars_5m) == len(expected)
+    for i, j in zip(bars_5m, expected):
+        assert i.dt == j.dt
+        assert i.open == j.open
+        assert i.high == j.high
+        assert i.low == j.low
+        assert i.close == j.close
+        assert i.vol == j.vol
+
+
+# }}}
+@pytest.mark.asyncio  # test_BarStream2_last_day  # {{{
+async def test_BarStream2_last_day(monkeypatch):
+    # минутные бары 08-07 за концом потока - на первом из них цикл
+    # прерывается, но дневной бар 08-04 все равно должен прийти
+    asset = syntheticAsset("AAAA", "FIGI_AAAA")
+    begin = DateTime(2023, 8, 4, tzinfo=UTC)
+    bars_1m = syntheticBars(seed=0)
+    bars_1m = BarArray.fromBars([i for i in bars_1m if i.dt >= begin])
+
+    async def fakeLoadBars(asset, timeframe, begin, end):
+        return bars_1m
+
+    monkeypatch.setattr(stream_module, "_loadBars", fakeLoadBars)
+
+    stream = BarStream2()
+    stream.subscribe(asset, TimeFrame("1M"))
+    stream.subscribe(asset, TimeFrame("D"))
+    await stream.loadData(Date(2023, 8, 4), Date(2023, 8, 7))
+
+    bars_d = [
+        e.bar
+        for e in stream
+        if e.type == Event.Type.NEW_HISTORICAL_BAR
+        and e.timeframe == TimeFrame("D")
+    ]
+
+    expected = _Converter.convert(bars_1m, DataType.BAR_1M, DataType.BAR_D)
+    assert len(bars_d) == 1
+    assert bars_d[0].dt == begin == expected[0].dt
+    assert bars_d[0].open == expected[0].open
+    assert bars_d[0].close == expected[0].close
+    assert bars_d[0].vol == expected[0].vol
 
 
 # }}}
@@ -52,6 +663,8 @@ async def test_Test():
     assert test.account == "_backtest"
     assert test.time_step == ONE_MINUTE
     assert test.status == Test.Status.NEW
+    assert test.asset_list is None
+    assert test.assets() == [asset]
 
     # save
     await Test.save(test)
@@ -108,6 +721,48 @@ async def test_TestList():
     await TestList.delete(test_list)
 
 
+# }}}
+@pytest.mark.asyncio  # test_Equity  # {{{
+async def test_Equity():
+    begin = DateTime(2023, 8, 1, tzinfo=UTC)
+    end = DateTime(2023, 8, 3, tzinfo=UTC)
+    equity = Equity(1000.0, begin, end)
+    assert len(equity) == 0
+    assert equity.last == 1000.0
+
+    # position is open 12 hours of 48 - exposure 25%
+    for hours, direction in ((6, Direction.BUY), (18, Direction.SELL)):
+        transaction = Transaction("o", begin + ONE_HOUR * hours, 10, 100, "b")
+        event = TransactionEvent("a", "figi", direction, "b", transaction)
+        await equity.onTransaction(event)
+    assert equity.exposure == 25.0
+
+    day = begin + ONE_HOUR * 18
+    for result in (100.0, -220.0, 20.0):
+        equity.add(day, result)
+    equity.add(day + ONE_DAY, 200.0)
+
+    assert list(equity.equity) == [1100.0, 880.0, 900.0, 1100.0]
+    assert list(equity.drawdown) == [0.0, -220.0, -200.0, 0.0]
+    assert equity.max_drawdown == -220.0
+    assert equity.max_drawdown_percent == -20.0
+    assert equity.profit == 100.0
+
+    days, returns = equity.dailyReturns()
+    assert len(days) == 2
+    assert list(returns) == [-10.0, 22.22]
+
+    # capacity grows, saved and loaded series are the same
+    for _ in range(Equity.CAPACITY):
+        equity.add(day + ONE_DAY, 1.0)
+    loaded = Equity.fromDict(Equity.toDict(equity))
+    assert len(loaded) == len(equity) == Equity.CAPACITY + 4
+    assert (loaded.dt == equity.dt).all()
+    assert (loaded.drawdown == equity.drawdown).all()
+    assert loaded.max_drawdown_percent == equity.max_drawdown_percent
+    assert loaded.exposure == equity.exposure
+
+
 # }}}
 @pytest.mark.asyncio  # test_Tester  # {{{
 async def test_Tester():
@@ -124,10 +779,95 @@ async def test_Tester():
 
     tester = Tester()
     await tester.run(test)
+    assert test.equity is not None
+
+    # equity curve is saved with test
+    loaded = await Test.load("_unittest_test")
+    assert len(loaded.equity) == len(test.equity)
+    assert loaded.equity.max_drawdown == test.equity.max_drawdown
+
+    await Test.delete(test)
+
+
+# }}}
+@pytest.mark.asyncio  # test_Tester_no_persist  # {{{
+async def test_Tester_no_persist():
+    asset = await Asset.fromStr("MOEX-SHARE-SBER")
+    strategy = await Strategy.load("Every", "day")
+
+    test = Test("_unittest_test")
+    test.strategy = strategy
+    test.asset = asset
+    test.begin = Date(2023, 8, 1)
+    test.end = Date(2023, 8, 2)
+    await Test.save(test)
+
+    tester = Tester()
+    await tester.run(test, persist=False)
+    assert test.status == Test.Status.COMPLETE
+    assert len(test.trade_list) > 0
+
+    # nothing written in db
+    loaded = await Test.load("_unittest_test")
+    assert loaded.status == Test.Status.NEW
+    await Test.loadTrades(loaded)
+    assert len(loaded.trade_list) == 0
 
     await Test.delete(test)
 
 
+# }}}
+@pytest.mark.asyncio  # test_Tester_failed  # {{{
+async def test_Tester_failed(monkeypatch):
+    asset = await Asset.fromStr("MOEX-SHARE-SBER")
+    strategy = await Strategy.load("Every", "day")
+
+    test = Test("_unittest_test")
+    test.strategy = strategy
+    test.asset = asset
+    test.begin = Date(2023, 8, 1)
+    test.end = Date(2023, 8, 2)
+
+    async def failedStream(self):
+        raise RuntimeError("data stream failed")
+
+    monkeypatch.setattr(VirtualBroker, "runDataStream", failedStream)
+
+    tester = Tester()
+    with pytest.raises(RuntimeError):
+        await tester.run(test, persist=False)
+
+    # slots of Equity are disconnected from strategy
+    assert strategy.tradeClosed._AsyncSignal__async_slots == []
+
+
+# }}}
+@pytest.mark.asyncio  # test_Tester_runMany  # {{{
+async def test_Tester_runMany():
+    strategy = await Strategy.load("Every", "day")
+
+    tests = list()
+    for ticker in ("SBER", "GAZP"):
+        asset = await Asset.fromTicker(Exchange.MOEX, Asset.Type.SHARE, ticker)
+        test = Test(f"_unittest_test_{ticker}")
+        test.strategy = strategy
+        test.asset = asset
+        test.begin = Date(2023, 8, 1)
+        test.end = Date(2023, 8, 2)
+        test.description = "unit test <Tester.runMany>"
+        await Test.save(test)
+        tests.append(test)
+    test_list = TestList("_unittest_test_list", tests)
+
+    result = await Tester.runMany(test_list, workers=2)
+    assert len(result) == 2
+    for test in result:
+        assert test.status == Test.Status.COMPLETE
+
+    for test in tests:
+        await Test.delete(test)
+
+
 # }}}
 
 
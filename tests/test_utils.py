@@ -6,8 +6,12 @@
 # LICENSE:      GNU GPLv3
 # ============================================================================
 
+import asyncio
+import time
 from datetime import datetime
 
+import pytest
+
 from avin.utils import *
 
 
@@ -58,6 +62,39 @@ def test_next_month():  # {{{
     assert dt == datetime(2024, 1, 1)
 
 
+# }}}
+@pytest.mark.asyncio  # test_RateLimiter  # {{{
+async def test_RateLimiter():
+    limiter = RateLimiter(concurrency=2, rate=50)
+    inside = 0
+    max_inside = 0
+    starts = list()
+
+    async def request():
+        nonlocal inside, max_inside
+        async with limiter:
+            starts.append(time.monotonic())
+            inside += 1
+            max_inside = max(max_inside, inside)
+            await asyncio.sleep(0.05)
+            inside -= 1
+
+    await asyncio.gather(*[request() for _ in range(10)])
+    assert max_inside == 2
+    assert len(starts) == 10
+
+    # not faster than 50 requests per second
+    starts.sort()
+    for i, j in zip(starts, starts[1:]):
+        assert j - i > 0.015
+
+    # the slot is released on exception
+    with pytest.raises(ValueError):
+        async with limiter:
+            raise ValueError("request failed")
+    await asyncio.wait_for(request(), timeout=1)
+
+
 # }}}
 
 